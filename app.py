@@ -1,19 +1,51 @@
+import time
+
 import streamlit as st
+import database as db
 
 #Congfiguração da página principal
 st.set_page_config(page_title="Calculadora de Orçamento", layout="wide")
 
-# Inicia banco de dados
-# init_db()
+# Inicia banco de dados (WAL + PRAGMAs: várias sessões editando ao mesmo tempo)
+db.init_db(desempenho=True)
 
 #Definição das páginas
 
-mao_de_obra = st.Page("pages/1_Mao_de_obra.py", title="Mão de Obra", icon="👷🏾")
+mao_de_obra = st.Page("pages/1_Mao_de_obra.py", title="Mão de Obra e Preço", icon="👷🏾")
 materiais = st.Page("pages/2_Materiais.py", title="Materiais", icon="🧱")
 tecidos = st.Page("pages/3_Tecidos.py", title="Tecidos", icon="🧵")
 pecas = st.Page("pages/4_Pecas.py", title="Peças", icon="🧩")
+producao = st.Page("pages/5_Producao.py", title="Produção", icon="🏭")
+estoque = st.Page("pages/6_Estoque.py", title="Estoque", icon="📦")
 
-pg = st.navigation(pages=[materiais, tecidos, pecas])
+pg = st.navigation(pages=[mao_de_obra, materiais, tecidos, pecas, producao, estoque])
 st.sidebar.caption("Calculadora de Orçamento")
 
-pg.run()
\ No newline at end of file
+# Depuração: mede as chamadas ao banco feitas neste rerun
+depurar = st.sidebar.toggle("🐞 Depurar banco de dados", help="Chamadas, consultas e tempo gastos no banco neste rerun")
+if depurar:
+    db.iniciar_medicao(lento_ms=50)
+
+inicio = time.perf_counter()
+try:
+    pg.run()
+finally:
+    medicao = db.encerrar_medicao() if depurar else None
+
+if medicao:
+    with st.sidebar.expander("Banco de dados — este rerun", expanded=True):
+        funcoes = medicao["funcoes"]
+        st.markdown(
+            f"**{medicao['consultas']}** consultas SQL · **{medicao['conexoes']}** conexões abertas  \n"
+            f"rerun em {(time.perf_counter() - inicio) * 1000:.0f} ms "
+            "(o tempo de cada função inclui o das que ela chama)"
+        )
+        st.dataframe(
+            [{"função": nome, "chamadas": f["chamadas"], "tempo (ms)": round(f["tempo_s"] * 1000, 2),
+              "linhas": f["linhas"]}
+             for nome, f in sorted(funcoes.items(), key=lambda item: -item[1]["tempo_s"])],
+            hide_index=True,
+        )
+        for sql, ms in medicao["lentas"]:
+            st.caption(f"🐢 {ms:.1f} ms")
+            st.code(sql, language="sql")
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""Benchmark de conexões: uma conexão por chamada x pool de conexao().
+
+Uso: python benchmarks/bench_conexoes.py [repeticoes]
+Roda sobre um banco temporário; o database.db do projeto não é tocado.
+"""
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+
+db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+
+
+# Versões "uma conexão por chamada", como o módulo fazia antes do pool
+def listar_materiais_avulso():
+    conn = sqlite3.connect(db.DB_PATH)
+    rows = conn.execute("""
+        SELECT id_material, nome_material, unidade, quantidade_adquirida, custo_total
+        FROM materiais ORDER BY nome_material ASC
+    """).fetchall()
+    conn.close()
+    return rows
+
+
+def get_peca_avulso(peca_id):
+    conn = sqlite3.connect(db.DB_PATH)
+    row = conn.execute("""
+        SELECT id_peca, nome_peca, tempo_producao_horas, preco_sugerido
+        FROM pecas WHERE id_peca=?
+    """, (peca_id,)).fetchone()
+    conn.close()
+    return row
+
+
+def compute_peca_cost_avulso(peca_id):
+    # get_peca + carregar_configuracoes + materiais + tecidos + cálculo:
+    # cinco conexões por peça
+    get_peca_avulso(peca_id)
+    for sql in (
+        "SELECT valor_hora, margem_lucro FROM configuracoes WHERE id=1",
+        "SELECT material_id, quantidade_usada FROM pecas_materiais WHERE peca_id=?",
+        "SELECT tecido_id, area_usada_cm2 FROM pecas_tecidos WHERE peca_id=?",
+    ):
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.execute(sql, () if "configuracoes" in sql else (peca_id,)).fetchall()
+        conn.close()
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.close()
+
+
+def popular():
+    for i in range(50):
+        db.inserir_material(f"Material {i}", "peças", 10 + i, 5 + i)
+    peca_id = db.inserir_peca("Peça benchmark", 1.5)
+    for mid, *_ in db.listar_materiais()[:10]:
+        db.adicionar_material_na_peca(peca_id, mid, 2)
+    return peca_id
+
+
+def medir(func, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        func()
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def main(repeticoes):
+    peca_id = popular()
+    casos = [
+        ("listar_materiais", listar_materiais_avulso, db.listar_materiais),
+        ("get_peca", lambda: get_peca_avulso(peca_id), lambda: db.get_peca(peca_id)),
+        ("compute_peca_cost", lambda: compute_peca_cost_avulso(peca_id), lambda: db.compute_peca_cost(peca_id)),
+    ]
+    print(f"{'função':<20} {'avulsa (µs)':>12} {'pool (µs)':>10} {'ganho':>7}")
+    for nome, avulsa, pool in casos:
+        t_avulsa = medir(avulsa, repeticoes)
+        t_pool = medir(pool, repeticoes)
+        print(f"{nome:<20} {t_avulsa:>12.1f} {t_pool:>10.1f} {t_avulsa / t_pool:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,83 @@
+"""Benchmark do encaixe de moldes (encaixe.py) e do custo de tecido por encaixe.
+
+1. Tempo e desperdício de encaixar N moldes aleatórios num rolo de 150 cm,
+   por heurística e no resultado final (o melhor das duas).
+2. Num catálogo sintético: custo dos tecidos por área x pelo encaixe de uma
+   peça por vez, e o consumo de um lote com várias peças encaixadas juntas.
+
+Uso: python benchmarks/bench_encaixe.py [moldes ...] [--pecas N]
+Roda sobre um banco temporário; o database.db do projeto não é tocado.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+import encaixe  # noqa: E402
+import gerar_dados  # noqa: E402
+
+LARGURA = 150
+
+
+def moldes(n, seed=42):
+    rnd = random.Random(seed)
+    return [(rnd.uniform(5, 80), rnd.uniform(5, 120)) for _ in range(n)]
+
+
+def bench_heuristicas(tamanhos):
+    area = lambda rs: sum(w * h for w, h in rs)  # noqa: E731
+    print(f"{'moldes':>8} {'heurística':<12} {'tempo (ms)':>11} {'desperdício':>12}")
+    for n in tamanhos:
+        rs = moldes(n)
+        for nome, heuristica in encaixe._HEURISTICAS.items():
+            inicio = time.perf_counter()
+            comprimento, _ = heuristica(rs, LARGURA, True)
+            ms = (time.perf_counter() - inicio) * 1000
+            print(f"{n:>8} {nome:<12} {ms:>11.1f} {1 - area(rs) / (comprimento * LARGURA):>11.1%}")
+        inicio = time.perf_counter()
+        r = encaixe.encaixar(rs, LARGURA)
+        ms = (time.perf_counter() - inicio) * 1000
+        print(f"{n:>8} {'encaixar':<12} {ms:>11.1f} {r['desperdicio']:>11.1%}")
+
+
+def bench_catalogo(n_pecas):
+    db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+    db.init_db()
+    gerar_dados.gerar(n_pecas, seed=42, precificar=False)
+
+    for rotulo, encaixar in (("por área", False), ("por encaixe", True)):
+        inicio = time.perf_counter()
+        custos = db.compute_costs_bulk(encaixe=encaixar)
+        s = time.perf_counter() - inicio
+        total = sum(c["custo_tecidos"] for c in custos.values())
+        print(f"tecidos {rotulo:<12} R$ {total:>14,.2f}   ({s:.2f} s para {len(custos)} peças)")
+
+    lote = {peca_id: 20 for peca_id in range(1, 51)}
+    inicio = time.perf_counter()
+    consumo = db.consumo_tecidos(lote)
+    s = time.perf_counter() - inicio
+    cortes = sum(c["cortes"] for c in consumo.values())
+    area = sum(c["custo_area"] for c in consumo.values())
+    encaixado = sum(c["custo_encaixe"] for c in consumo.values())
+    print(f"lote de 50 peças × 20: {cortes} cortes em {len(consumo)} tecidos, {s * 1000:.0f} ms — "
+          f"R$ {area:,.2f} por área, R$ {encaixado:,.2f} encaixados juntos")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("moldes", type=int, nargs="*", default=[100, 1_000, 5_000, 20_000])
+    parser.add_argument("--pecas", type=int, default=2_000)
+    args = parser.parse_args(argv)
+    bench_heuristicas(args.moldes)
+    print()
+    bench_catalogo(args.pecas)
+
+
+if __name__ == "__main__":
+    main()
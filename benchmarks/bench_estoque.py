@@ -0,0 +1,82 @@
+"""Benchmark do estoque: saldo pela tabela de saldos (busca pela chave) x
+SUM sobre o razão de movimentos, lançamento em lote e peças produzíveis.
+
+Uso: python benchmarks/bench_estoque.py [movimentos ...] [--pecas N]
+Roda sobre um banco temporário; o database.db do projeto não é tocado.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+import gerar_dados  # noqa: E402
+import producao  # noqa: E402
+
+CONSULTAS = 2_000
+
+
+def por_soma(conn, item_id):
+    return conn.execute("""
+        SELECT COALESCE(SUM(quantidade), 0) FROM movimentos_estoque WHERE item_tipo='material' AND item_id=?
+    """, (item_id,)).fetchone()[0]
+
+
+def por_saldo(conn, item_id):
+    return conn.execute("""
+        SELECT saldo FROM saldos_estoque WHERE item_tipo='material' AND item_id=?
+    """, (item_id,)).fetchone()[0]
+
+
+def media_us(func, conn, ids):
+    inicio = time.perf_counter()
+    for item_id in ids:
+        func(conn, item_id)
+    return (time.perf_counter() - inicio) / len(ids) * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("movimentos", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--pecas", type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+    db.init_db()
+    gerar_dados.gerar(args.pecas, seed=42, precificar=False)
+    db.abrir_estoque_pelas_compras()
+    ids = [m[0] for m in db.listar_materiais()]
+    rnd = random.Random(42)
+
+    print(f"{'movimentos':>11} {'lançar (s)':>11} {'SUM µs':>8} {'saldo µs':>9}")
+    lancados = 0
+    for alvo in args.movimentos:
+        novos = [("material", rnd.choice(ids), rnd.choice(["compra", "consumo"]), rnd.uniform(1, 10))
+                 for _ in range(alvo - lancados)]
+        inicio = time.perf_counter()
+        db.lancar_movimentos(novos)
+        t_lancar = time.perf_counter() - inicio
+        lancados = alvo
+        amostra = [rnd.choice(ids) for _ in range(CONSULTAS)]
+        with db.conexao() as conn:
+            t_soma = media_us(por_soma, conn, amostra)
+            t_saldo = media_us(por_saldo, conn, amostra)
+        print(f"{alvo:>11} {t_lancar:>11.2f} {t_soma:>8.1f} {t_saldo:>9.1f}")
+
+    pedidos = [(rnd.randint(1, args.pecas), rnd.randint(1, 50)) for _ in range(1_000)]
+    inicio = time.perf_counter()
+    producao.baixar_estoque(pedidos, "bench", permitir_negativo=True)
+    print(f"\nbaixa de 1000 linhas de pedido: {time.perf_counter() - inicio:.3f} s")
+
+    inicio = time.perf_counter()
+    produziveis = db.pecas_produziveis()
+    print(f"peças produzíveis ({len(produziveis)} peças): {time.perf_counter() - inicio:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
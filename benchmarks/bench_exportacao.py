@@ -0,0 +1,63 @@
+"""Benchmark da exportação: tempo e pico de memória (tracemalloc) de
+exportacao.exportar em CSV para tabelas de tamanhos crescentes, comparado
+com ler tudo com fetchall() antes de escrever.
+
+Uso: python benchmarks/bench_exportacao.py [tamanho ...]
+Roda sobre um banco temporário; o database.db do projeto não é tocado.
+"""
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+import exportacao  # noqa: E402
+from bench_precos import popular  # noqa: E402
+
+db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+
+
+def exportar_fetchall(destino):
+    # como a página fazia: todas as linhas na memória antes de escrever
+    with db.conexao() as conn:
+        rows = conn.execute(exportacao.EXPORTACOES["pecas_materiais"][2].format(where="")).fetchall()
+    texto = io.TextIOWrapper(destino, encoding="utf-8", newline="")
+    csv.writer(texto).writerows(rows)
+    texto.detach()
+    return len(rows)
+
+
+def medir(func):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    with open(os.devnull, "wb") as destino:
+        linhas = func(destino)
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return linhas, duracao, pico / 2**20
+
+
+def main(tamanhos):
+    print(f"{'peças':>8} {'exportação':<20} {'linhas':>9} {'tempo (s)':>10} {'pico (MiB)':>11}")
+    for n in tamanhos:
+        popular(n)
+        casos = [
+            ("fetchall (BOM)", exportar_fetchall),
+            ("streaming (BOM)", lambda d: exportacao.exportar("pecas_materiais", d)),
+            ("pecas_precificadas", lambda d: exportacao.exportar("pecas_precificadas", d)),
+        ]
+        for nome, func in casos:
+            linhas, duracao, pico = medir(func)
+            print(f"{n:>8} {nome:<20} {linhas:>9} {duracao:>10.2f} {pico:>11.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 50_000])
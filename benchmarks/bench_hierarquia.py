@@ -0,0 +1,92 @@
+"""Benchmark do custo de peças com subconjuntos: recursão ingênua x
+compute_costs_bulk (pós-ordem memoizada).
+
+Monta uma hierarquia em camadas: cada peça de uma camada usa RAMOS peças da
+camada de baixo, que são compartilhadas por vários conjuntos. Sem memoização
+o número de visitas cresce como RAMOS ** profundidade; com ela, cada peça e
+cada relação é visitada uma vez.
+
+Uso: python benchmarks/bench_hierarquia.py [profundidade ...] [--pecas N]
+Roda sobre um banco temporário; o database.db do projeto não é tocado.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+import gerar_dados  # noqa: E402
+
+db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+
+RAMOS = 3
+
+
+def montar_camadas(n_pecas, profundidade, seed=42):
+    """Divide as peças em profundidade+1 camadas e liga cada peça à camada de
+    baixo. Retorna as peças da camada de topo."""
+    rnd = random.Random(seed)
+    gerar_dados.gerar(n_pecas, seed=seed, precificar=False)
+    ids = [p[0] for p in db.listar_pecas()]
+    tamanho = len(ids) // (profundidade + 1)
+    camadas = [ids[i * tamanho:(i + 1) * tamanho] for i in range(profundidade + 1)]
+    with db.conexao(escrita=True) as conn:
+        conn.executemany(
+            "INSERT INTO pecas_componentes (peca_id, componente_id, quantidade) VALUES (?, ?, ?)",
+            [(pai, filho, rnd.randint(1, 4))
+             for de_baixo, de_cima in zip(camadas, camadas[1:])
+             for pai in de_cima
+             for filho in rnd.sample(de_baixo, RAMOS)],
+        )
+    db.limpar_cache()
+    return camadas[-1]
+
+
+def recursao_ingenua(pecas):
+    """Custo total de cada peça descendo a árvore sem memoização (os custos
+    próprios já estão num dicionário: só a travessia é medida)."""
+    proprios = {i: c["custo_materiais"] + c["custo_tecidos"] for i, c in db.compute_costs_bulk().items()}
+    with db.conexao() as conn:
+        filhos = {}
+        for pai, filho, qtd in conn.execute("SELECT peca_id, componente_id, quantidade FROM pecas_componentes"):
+            filhos.setdefault(pai, []).append((filho, qtd))
+    visitas = 0
+
+    def custo(peca):
+        nonlocal visitas
+        visitas += 1
+        return proprios[peca] + sum(qtd * custo(filho) for filho, qtd in filhos.get(peca, ()))
+
+    inicio = time.perf_counter()
+    for peca in pecas:
+        custo(peca)
+    return time.perf_counter() - inicio, visitas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("profundidades", type=int, nargs="*", default=[2, 4, 6, 8])
+    parser.add_argument("--pecas", type=int, default=9_000)
+    args = parser.parse_args(argv)
+
+    print(f"{'profundidade':>12} {'topo':>6} {'ingênua (s)':>12} {'visitas':>10} {'bulk (s)':>10}")
+    for profundidade in args.profundidades:
+        topo = montar_camadas(args.pecas, profundidade)
+        # a ingênua é amostrada: com profundidade alta cada peça custa RAMOS ** profundidade
+        amostra = topo[:max(1, 10_000 // RAMOS ** profundidade)]
+        t_ingenua, visitas = recursao_ingenua(amostra)
+        t_ingenua *= len(topo) / len(amostra)
+        visitas = visitas * len(topo) // len(amostra)
+        inicio = time.perf_counter()
+        db.compute_costs_bulk(topo)
+        t_bulk = time.perf_counter() - inicio
+        print(f"{profundidade:>12} {len(topo):>6} {t_ingenua:>12.3f} {visitas:>10} {t_bulk:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark da importação em lote: tempo e pico de memória (tracemalloc)
+ao importar um CSV de materiais, primeiro com inserções novas e depois
+atualizando os mesmos nomes (upsert).
+
+Uso: python benchmarks/bench_importacao.py [linhas]
+Roda sobre um banco temporário; o database.db do projeto não é tocado.
+"""
+import csv
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+import importacao  # noqa: E402
+
+db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+
+
+def gerar_csv(caminho, linhas, seed=42):
+    rnd = random.Random(seed)
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["nome_material", "unidade", "quantidade_adquirida", "custo_total"])
+        for i in range(linhas):
+            escritor.writerow([f"Material {i}", "peças", round(rnd.uniform(1, 100), 2), round(rnd.uniform(1, 500), 2)])
+
+
+def cronometrar(caminho):
+    inicio = time.perf_counter()
+    relatorio = importacao.importar_materiais(caminho)
+    return relatorio, time.perf_counter() - inicio
+
+
+def pico_memoria(caminho):
+    # medido numa passada à parte: o tracemalloc deixa o Python bem mais lento
+    tracemalloc.start()
+    importacao.importar_materiais(caminho)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pico
+
+
+def main(linhas):
+    caminho = Path(tempfile.mkdtemp()) / "materiais.csv"
+    gerar_csv(caminho, linhas)
+    print(f"{'passada':<12} {'linhas':>8} {'tempo (s)':>10} {'linhas/s':>10} {'erros':>6}")
+    for nome in ("inserção", "upsert"):
+        relatorio, duracao = cronometrar(caminho)
+        print(f"{nome:<12} {relatorio['importados']:>8} {duracao:>10.2f} {linhas / duracao:>10.0f} "
+              f"{len(relatorio['erros']):>6}")
+    print(f"pico de memória: {pico_memoria(caminho) / 2**20:.1f} MiB "
+          f"(lotes de {importacao.TAMANHO_LOTE} linhas)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
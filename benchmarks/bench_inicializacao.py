@@ -0,0 +1,54 @@
+"""Benchmark de inicialização: tempo de `import database` e latência da
+primeira consulta, cada medição num processo Python novo.
+
+Mede três situações: banco novo (schema criado na primeira conexão), banco
+já na versão atual (só a checagem rápida de PRAGMA user_version) e uma
+segunda consulta no mesmo processo.
+
+Uso: python benchmarks/bench_inicializacao.py [repeticoes]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+SONDA = """
+import json, time
+t0 = time.perf_counter()
+import database as db
+t1 = time.perf_counter()
+db.listar_pecas()
+t2 = time.perf_counter()
+db.listar_materiais()
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "primeira": t2 - t1, "segunda": t3 - t2}))
+"""
+
+
+def medir(caminho_db):
+    env = dict(os.environ, CALCULA_ORCAMENTOS_DB=str(caminho_db), PYTHONPATH=str(RAIZ))
+    saida = subprocess.run([sys.executable, "-c", SONDA], env=env, capture_output=True,
+                           text=True, check=True).stdout
+    return json.loads(saida)
+
+
+def main(repeticoes):
+    pasta = Path(tempfile.mkdtemp())
+    novos = [medir(pasta / f"novo_{i}.db") for i in range(repeticoes)]
+    existente = pasta / "existente.db"
+    medir(existente)
+    atuais = [medir(existente) for _ in range(repeticoes)]
+
+    print(f"{'situação':<16} {'import (ms)':>12} {'1ª consulta (ms)':>17} {'2ª consulta (ms)':>17}")
+    for nome, amostras in (("banco novo", novos), ("banco atual", atuais)):
+        med = {k: statistics.median(a[k] for a in amostras) * 1e3 for k in amostras[0]}
+        print(f"{nome:<16} {med['import']:>12.2f} {med['primeira']:>17.2f} {med['segunda']:>17.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,67 @@
+"""Benchmark da listagem de materiais: carregar tudo e filtrar/paginar em
+Python (como a página fazia) x busca e paginação no SQLite.
+
+Uso: python benchmarks/bench_paginacao.py [tamanho ...]
+Roda sobre um banco temporário; o database.db do projeto não é tocado.
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+
+db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+
+SILABAS = ["ta", "po", "li", "ne", "ca", "ro", "mi", "su", "ve", "zo"]
+POR_PAGINA = 20
+
+
+def popular(n, seed=42):
+    rnd = random.Random(seed)
+    conn = db.get_connection()
+    conn.execute("DELETE FROM materiais")
+    conn.executemany(
+        "INSERT INTO materiais (nome_material, unidade, quantidade_adquirida, custo_total) VALUES (?, 'peças', ?, ?)",
+        ((f"{''.join(rnd.choices(SILABAS, k=4))} {i}", rnd.uniform(1, 100), rnd.uniform(1, 500)) for i in range(n)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def em_python(busca, pagina):
+    # sem o cache: mede o custo real de trazer a tabela toda
+    rows = db.listar_materiais.__wrapped__()
+    if busca:
+        rows = [r for r in rows if busca.lower() in r[1].lower()]
+    inicio = (pagina - 1) * POR_PAGINA
+    return len(rows), rows[inicio:inicio + POR_PAGINA]
+
+
+def no_sqlite(busca, pagina):
+    total = db.contar_materiais.__wrapped__(busca)
+    return total, db.buscar_materiais.__wrapped__(busca, POR_PAGINA, (pagina - 1) * POR_PAGINA)
+
+
+def medir(func, *args, repeticoes=5):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        func(*args)
+    return (time.perf_counter() - inicio) / repeticoes * 1e3
+
+
+def main(tamanhos):
+    print(f"{'linhas':>9} {'busca':>7} {'python (ms)':>12} {'sqlite (ms)':>12}")
+    for n in tamanhos:
+        popular(n)
+        for busca in ("", "tapo"):
+            assert em_python(busca, 3) == no_sqlite(busca, 3)
+            print(f"{n:>9} {busca or '-':>7} {medir(em_python, busca, 3):>12.1f} {medir(no_sqlite, busca, 3):>12.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
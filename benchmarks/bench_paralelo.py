@@ -0,0 +1,68 @@
+"""Benchmark do repreciamento paralelo: repreciar_catalogo com 1 processo
+(lotes na própria thread) x trabalhadores = 2, 4, ... até o número de núcleos.
+
+Uso: python benchmarks/bench_paralelo.py [pecas] [trabalhadores ...]
+Roda sobre um banco temporário; o database.db do projeto não é tocado.
+Os preços são zerados antes de cada medida, para todas gravarem o catálogo
+inteiro, e conferidos contra os da execução com 1 processo. O mínimo de
+peças para paralelizar (db.MINIMO_PARALELO) é desligado durante a medida.
+
+Medido numa máquina de 1 núcleo (o ganho vem só do UPDATE único no fim;
+com mais núcleos o cálculo também se divide):
+
+     peças   1 processo   2 processos   4 processos
+    20.000      0,57 s        0,70 s          -
+    50.000      1,32 s        1,29 s        2,05 s
+   100.000      2,57 s        2,10 s          -
+
+Subir os processos (spawn) custa por volta de 0,3 s; abaixo de ~50 mil
+peças o repreciamento em série é mais rápido, daí MINIMO_PARALELO.
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+import gerar_dados  # noqa: E402
+
+
+def _precos():
+    with db.conexao() as conn:
+        return dict(conn.execute("SELECT id_peca, preco_sugerido FROM pecas"))
+
+
+def medir(trabalhadores):
+    with db.conexao(escrita=True) as conn:
+        conn.execute("UPDATE pecas SET preco_sugerido=0")
+    inicio = time.perf_counter()
+    db.repreciar_catalogo(trabalhadores=trabalhadores)
+    return time.perf_counter() - inicio
+
+
+def main(n_pecas, contagens):
+    db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+    gerar_dados.gerar(n_pecas, precificar=False)
+    db.init_db(desempenho=True)
+    db.MINIMO_PARALELO = 0
+
+    base = medir(1)
+    referencia = _precos()
+    print(f"{n_pecas} peças, {os.cpu_count()} núcleo(s)")
+    print(f"{'processos':>10} {'tempo (s)':>10} {'aceleração':>11} {'eficiência':>11}")
+    print(f"{1:>10} {base:>10.3f} {1:>10.2f}x {1:>10.0%}")
+    for n in contagens:
+        tempo = medir(n)
+        assert _precos() == referencia, f"preços diferentes com {n} processos"
+        print(f"{n:>10} {tempo:>10.3f} {base / tempo:>10.2f}x {base / tempo / n:>10.0%}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    nucleos = os.cpu_count() or 1
+    contagens = [int(a) for a in sys.argv[2:]] or [c for c in (2, 4, 8, 16) if c <= max(2, nucleos)]
+    main(n, contagens)
@@ -0,0 +1,45 @@
+"""Benchmark do cálculo de custos: compute_peca_cost por peça x compute_costs_bulk,
+e a troca de uma regra de preço (salvar_configuracoes recalcula o catálogo inteiro).
+
+Uso: python benchmarks/bench_precos.py [tamanho ...]
+Roda sobre um banco temporário; o database.db do projeto não é tocado.
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+import gerar_dados  # noqa: E402
+
+db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+
+
+def popular(n_pecas, n_materiais=200, n_tecidos=50, seed=42):
+    gerar_dados.gerar(n_pecas, n_materiais, n_tecidos, seed, precificar=False)
+
+
+def cronometrar(func):
+    inicio = time.perf_counter()
+    func()
+    return time.perf_counter() - inicio
+
+
+def main(tamanhos):
+    print(f"{'peças':>8} {'por peça (s)':>14} {'bulk (s)':>10} {'bulk µs/peça':>14} {'regra (s)':>10}")
+    for n in tamanhos:
+        popular(n)
+        ids = [p[0] for p in db.listar_pecas()]
+        # A versão por peça é amostrada para não dominar o tempo do benchmark
+        amostra = ids[:min(len(ids), 1000)]
+        t_unit = cronometrar(lambda: [db.compute_peca_cost(i) for i in amostra]) * len(ids) / len(amostra)
+        t_bulk = cronometrar(lambda: db.compute_costs_bulk())
+        t_regra = cronometrar(lambda: db.salvar_configuracoes(25.0, 120.0, "markup"))
+        print(f"{n:>8} {t_unit:>14.3f} {t_bulk:>10.3f} {t_bulk / n * 1e6:>14.1f} {t_regra:>10.3f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 50_000])
@@ -0,0 +1,58 @@
+"""Benchmark do planejamento de produção: ficha técnica lida peça a peça
+(materiais_da_peca / tecidos_da_peca) x producao.planejar (consulta agrupada).
+
+Uso: python benchmarks/bench_producao.py [linhas ...] [--pecas N]
+Roda sobre um banco temporário; o database.db do projeto não é tocado.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+import gerar_dados  # noqa: E402
+import producao  # noqa: E402
+
+
+def peca_a_peca(pedidos):
+    """Como era feito à mão: soma a ficha técnica de cada linha do pedido."""
+    materiais, tecidos = {}, {}
+    for peca_id, quantidade in pedidos:
+        for mid, qtd, *_ in db.materiais_da_peca(peca_id):
+            materiais[mid] = materiais.get(mid, 0) + qtd * quantidade
+        for tid, area, *_ in db.tecidos_da_peca(peca_id):
+            tecidos[tid] = tecidos.get(tid, 0) + area * quantidade
+    return materiais, tecidos
+
+
+def cronometrar(func, *args):
+    db.limpar_cache()
+    inicio = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - inicio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("linhas", type=int, nargs="*", default=[100, 1_000, 5_000, 20_000])
+    parser.add_argument("--pecas", type=int, default=50_000)
+    args = parser.parse_args(argv)
+
+    db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+    db.init_db()
+    gerar_dados.gerar(args.pecas, seed=42, precificar=False)
+    rnd = random.Random(42)
+
+    print(f"{'linhas':>8} {'peça a peça (s)':>16} {'planejar (s)':>13}")
+    for n in args.linhas:
+        pedidos = [(rnd.randint(1, args.pecas), rnd.randint(1, 200)) for _ in range(n)]
+        print(f"{n:>8} {cronometrar(peca_a_peca, pedidos):>16.3f} {cronometrar(producao.planejar, pedidos):>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
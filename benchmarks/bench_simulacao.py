@@ -0,0 +1,66 @@
+"""Benchmark das simulações vetorizadas (simulacao.py).
+
+Confere o resultado contra compute_costs_bulk e mede o tempo para avaliar
+vários cenários de custo sobre o catálogo inteiro, com um catálogo de
+materiais do tamanho padrão e um largo (o produto esparso não deve
+depender do número de materiais, só das entradas da BOM).
+
+Uso: python benchmarks/bench_simulacao.py [pecas] [cenarios] [materiais ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from bench_precos import db, popular
+
+import simulacao  # noqa: E402  (bench_precos já colocou a raiz no sys.path)
+
+
+def medir(n_pecas, n_cenarios, n_materiais):
+    popular(n_pecas, n_materiais)
+
+    inicio = time.perf_counter()
+    bom = simulacao.carregar_bom()
+    t_carga = time.perf_counter() - inicio
+
+    # conferência: cenário neutro == preço calculado pelo banco (tecido pela área)
+    atual = simulacao.simular(bom)["preco_sugerido"][:, 0]
+    esperado = db.compute_costs_bulk(encaixe=False)
+    assert np.allclose(atual, [esperado[int(p)]["preco_sugerido"] for p in bom["pecas"]])
+
+    rnd = np.random.default_rng(42)
+    fm = rnd.uniform(0.8, 1.5, (n_cenarios, bom["materiais"].size))
+    ft = rnd.uniform(0.8, 1.5, (n_cenarios, bom["tecidos"].size))
+
+    inicio = time.perf_counter()
+    res = simulacao.simular(bom, fm, ft)
+    t_sim = time.perf_counter() - inicio
+
+    # conferência: um cenário qualquer contra o produto denso
+    k = n_cenarios // 2
+    direto = np.zeros(bom["pecas"].size)
+    for chave, fat in (("materiais", fm), ("tecidos", ft)):
+        m = bom[f"bom_{chave}"]
+        linhas = np.repeat(np.arange(m["n_linhas"]), np.diff(m["indptr"]))
+        np.add.at(direto, linhas, m["valores"] * (bom[f"custo_{chave}"] * fat[k])[m["colunas"]])
+    sem_componentes = bom["componentes"]["nivel_pecas"] == 0
+    direto = (direto + bom["mao_de_obra"]) * (1 + bom["percentual_indireto"]) + bom["valor_indireto"]
+    assert np.allclose(res["custo_total"][sem_componentes, k], direto[sem_componentes])
+
+    entradas = bom["bom_materiais"]["valores"].size + bom["bom_tecidos"]["valores"].size
+    print(f"{n_pecas:>8} {n_materiais:>10} {entradas:>10} {n_cenarios:>9} "
+          f"{t_carga * 1e3:>10.1f} {t_sim * 1e3:>12.1f}")
+
+
+def main(n_pecas, n_cenarios, catalogos):
+    print(f"{'peças':>8} {'materiais':>10} {'entradas':>10} {'cenários':>9} "
+          f"{'carga (ms)':>10} {'simular (ms)':>12}")
+    for n_materiais in catalogos:
+        medir(n_pecas, n_cenarios, n_materiais)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    n_pecas, n_cenarios = (args[:2] + [10_000, 2_000][len(args[:2]):])
+    main(n_pecas, n_cenarios, args[2:] or [200, 20_000])
@@ -0,0 +1,132 @@
+"""Gerador de dados sintéticos (com semente) para benchmarks.
+
+Preenche materiais, tecidos, peças e as duas tabelas de relação numa escala
+configurável. A ficha técnica imita um catálogo real: cada peça usa de 2 a
+20 materiais (a maioria perto de 6) e de 1 a 4 tecidos, e alguns itens
+(linha, botões, entretela...) aparecem em muito mais peças que outros.
+
+As linhas são geradas sob demanda e gravadas em lotes, então 1M de peças
+não precisa caber na memória.
+
+Uso: python benchmarks/gerar_dados.py PECAS [--db arquivo.db] [--seed 42]
+                                            [--materiais N] [--tecidos N]
+Sem --db grava num banco temporário e mostra o caminho.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from itertools import islice
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+
+LOTE = 50_000
+UNIDADES = ["metros", "centímetros", "quilogramas", "gramas", "mililitros", "litros", "peças"]
+
+
+def escala_padrao(n_pecas):
+    """(n_materiais, n_tecidos) proporcionais ao número de peças."""
+    return min(50_000, max(50, n_pecas // 20)), min(5_000, max(20, n_pecas // 100))
+
+
+def _em_lotes(conn, sql, linhas):
+    linhas = iter(linhas)
+    while True:
+        lote = list(islice(linhas, LOTE))
+        if not lote:
+            return
+        conn.executemany(sql, lote)
+
+
+def _componentes(rnd, n_itens, minimo, moda, maximo):
+    # Itens com id baixo são sorteados com mais frequência (random() ** 2)
+    k = min(n_itens, round(rnd.triangular(minimo, maximo, moda)))
+    escolhidos = set()
+    while len(escolhidos) < k:
+        escolhidos.add(1 + int(n_itens * rnd.random() ** 2))
+    return sorted(escolhidos)
+
+
+def _com_molde(rnd, peca_id, tecido_id, area):
+    # retângulo de área `area` com proporção entre 1:2 e 2:1
+    comprimento = (area * rnd.uniform(0.5, 2)) ** 0.5
+    return peca_id, tecido_id, area, round(comprimento, 2), round(area / comprimento, 2)
+
+
+def gerar(n_pecas, n_materiais=None, n_tecidos=None, seed=42, precificar=True):
+    """Apaga o catálogo do banco atual (db.DB_PATH) e gera um novo.
+
+    Com precificar=True grava o preco_sugerido de todas as peças ao final.
+    Retorna a contagem de linhas por tabela.
+    """
+    padrao_materiais, padrao_tecidos = escala_padrao(n_pecas)
+    n_materiais = n_materiais or padrao_materiais
+    n_tecidos = n_tecidos or padrao_tecidos
+    rnd = random.Random(seed)
+
+    conn = db.get_connection()
+    conn.execute("PRAGMA synchronous=OFF")
+    for tabela in ("pecas_componentes", "pecas_materiais", "pecas_tecidos", "pecas", "materiais", "tecidos"):
+        conn.execute(f"DELETE FROM {tabela}")
+
+    _em_lotes(conn, """
+        INSERT INTO materiais (id_material, nome_material, unidade, quantidade_adquirida, custo_total)
+        VALUES (?, ?, ?, ?, ?)
+    """, ((i, f"Material {i}", rnd.choice(UNIDADES), round(rnd.uniform(1, 100), 2),
+           round(rnd.uniform(1, 500), 2)) for i in range(1, n_materiais + 1)))
+    _em_lotes(conn, """
+        INSERT INTO tecidos (id_tecido, nome_tecido, comprimento_total, largura_total, custo_total)
+        VALUES (?, ?, ?, ?, ?)
+    """, ((i, f"Tecido {i}", round(rnd.uniform(100, 1000)), rnd.choice([140, 150, 160]),
+           round(rnd.uniform(10, 300), 2)) for i in range(1, n_tecidos + 1)))
+    _em_lotes(conn, """
+        INSERT INTO pecas (id_peca, nome_peca, tempo_producao_horas) VALUES (?, ?, ?)
+    """, ((i, f"Peça {i}", round(rnd.uniform(0.5, 8), 1)) for i in range(1, n_pecas + 1)))
+    _em_lotes(conn, """
+        INSERT INTO pecas_materiais (peca_id, material_id, quantidade_usada) VALUES (?, ?, ?)
+    """, ((p, m, round(rnd.uniform(0.1, 5), 2)) for p in range(1, n_pecas + 1)
+          for m in _componentes(rnd, n_materiais, 2, 6, 20)))
+    # medidas do molde com sorteio próprio: a área (e o resto do catálogo) não
+    # muda em relação a catálogos gerados antes de existirem as medidas
+    rnd_moldes = random.Random(seed + 1)
+    _em_lotes(conn, """
+        INSERT INTO pecas_tecidos (peca_id, tecido_id, area_usada_cm2, comprimento_cm, largura_cm)
+        VALUES (?, ?, ?, ?, ?)
+    """, (_com_molde(rnd_moldes, p, t, round(rnd.uniform(100, 5000))) for p in range(1, n_pecas + 1)
+          for t in _componentes(rnd, n_tecidos, 1, 1, 4)))
+    conn.commit()
+
+    contagem = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                for t in ("materiais", "tecidos", "pecas", "pecas_materiais", "pecas_tecidos")}
+    conn.close()
+    db.limpar_cache()
+
+    if precificar:
+        db.repreciar_catalogo()
+    return contagem
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pecas", type=int)
+    parser.add_argument("--db", help="banco de destino (padrão: temporário)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--materiais", type=int)
+    parser.add_argument("--tecidos", type=int)
+    args = parser.parse_args(argv)
+
+    db.configurar(args.db or Path(tempfile.mkdtemp()) / "sintetico.db")
+    inicio = time.perf_counter()
+    contagem = gerar(args.pecas, args.materiais, args.tecidos, args.seed)
+    for tabela, total in contagem.items():
+        print(f"{tabela:<16} {total:>10}")
+    print(f"{db.DB_PATH} gerado em {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
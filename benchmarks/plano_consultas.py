@@ -0,0 +1,95 @@
+"""Verificação de regressão dos planos de consulta (EXPLAIN QUERY PLAN).
+
+Executa as funções quentes de database.py, captura o SQL que elas realmente
+enviam ao SQLite e falha (código de saída 1) se algum plano fizer SCAN de
+tabela em vez de usar índice (menos nas tabelas de LEITURA_COMPLETA).
+
+Uso: python benchmarks/plano_consultas.py
+"""
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+
+db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+
+CONTROLE = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+# Tabelas pequenas de regras lidas inteiras de propósito (uma vez, e depois
+# do cache de regras_preco): o SCAN delas não é regressão
+LEITURA_COMPLETA = ("categorias",)
+
+
+def _scans(plano):
+    return [p for p in plano
+            if p.startswith("SCAN") and p.split()[1] not in LEITURA_COMPLETA]
+
+
+def popular():
+    db.inserir_material("Zíper", "peças", 20, 15)
+    db.inserir_tecido("Florido", 500, 100, 52)
+    peca_id = db.inserir_peca("Peça", 1.0)
+    mid = db.listar_materiais()[0][0]
+    tid = db.listar_tecidos()[0][0]
+    db.adicionar_material_na_peca(peca_id, mid, 2)
+    db.adicionar_tecido_na_peca(peca_id, tid, 100)
+    return peca_id, mid, tid
+
+
+def capturar_sql(func, *args):
+    """SQL (com parâmetros expandidos) executado por func(*args)."""
+    comandos = []
+    with db.conexao() as conn:
+        conn.set_trace_callback(comandos.append)
+        try:
+            func(*args)
+        finally:
+            conn.set_trace_callback(None)
+    # "-- TRIGGER ..." são os comandos internos de triggers, não consultas
+    return [c for c in comandos
+            if not c.lstrip().upper().startswith(CONTROLE) and not c.lstrip().startswith("--")]
+
+
+def main():
+    peca_id, mid, tid = popular()
+    casos = [
+        ("materiais_da_peca", db.materiais_da_peca, peca_id),
+        ("tecidos_da_peca", db.tecidos_da_peca, peca_id),
+        ("compute_peca_cost", db.compute_peca_cost, peca_id),
+        ("limpar_relacoes_peca", db.limpar_relacoes_peca, peca_id),
+        ("excluir_peca", db.excluir_peca, peca_id),
+    ]
+
+    falhas = 0
+    conn = db.get_connection()
+    for nome, func, *args in casos:
+        for sql in capturar_sql(func, *args):
+            plano = [linha[3] for linha in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            scans = _scans(plano)
+            status = "FALHA" if scans else "ok"
+            falhas += bool(scans)
+            print(f"[{status}] {nome}: {' | '.join(plano)}")
+    conn.close()
+
+    # Consultas reversas (peças que usam um material/tecido)
+    conn = db.get_connection()
+    for sql, param in (
+        ("SELECT peca_id FROM pecas_materiais WHERE material_id=?", mid),
+        ("SELECT peca_id FROM pecas_tecidos WHERE tecido_id=?", tid),
+    ):
+        plano = [linha[3] for linha in conn.execute("EXPLAIN QUERY PLAN " + sql, (param,))]
+        scans = _scans(plano)
+        falhas += bool(scans)
+        print(f"[{'FALHA' if scans else 'ok'}] {sql}: {' | '.join(plano)}")
+    conn.close()
+
+    if falhas:
+        print(f"{falhas} consulta(s) sem índice")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
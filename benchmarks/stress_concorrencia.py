@@ -0,0 +1,108 @@
+"""Teste de estresse: escritores e leitores concorrentes no mesmo banco.
+
+Escritores chamam inserir_material/atualizar_peca enquanto leitores chamam
+listar_pecas. Roda com o journal padrão e com o perfil de desempenho (WAL)
+e mostra vazão e erros de lock de cada um.
+
+Falha (código de saída 1) se alguma chamada levantar outra exceção, se o
+perfil de desempenho tiver qualquer erro de lock (WAL + retentativas) ou se
+o número de materiais gravados não bater com o de inserções confirmadas
+(uma retentativa que repete uma escrita já confirmada, por exemplo).
+
+Uso: python benchmarks/stress_concorrencia.py [segundos] [escritores] [leitores]
+"""
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+
+db.configurar(Path(tempfile.mkdtemp()) / "bench.db")
+
+
+def rodar(segundos, n_escritores, n_leitores):
+    for i in range(200):
+        db.inserir_peca(f"Peça {i}", 1.0)
+    ids_pecas = [p[0] for p in db.listar_pecas()]
+
+    fim = time.perf_counter() + segundos
+    contagem = {"escritas": 0, "leituras": 0, "erros_lock": 0, "insercoes": 0, "outros_erros": 0}
+    excecoes = []
+    trava = threading.Lock()
+
+    def somar(chave):
+        with trava:
+            contagem[chave] += 1
+
+    def falhar(erro):
+        with trava:
+            contagem["outros_erros"] += 1
+            excecoes.append(repr(erro))
+
+    def escritor(n):
+        i = 0
+        while time.perf_counter() < fim:
+            try:
+                if i % 2:
+                    db.inserir_material(f"Material {n}-{i}", "peças", 10, 5)
+                    somar("insercoes")
+                else:
+                    pid = ids_pecas[(n * 7 + i) % len(ids_pecas)]
+                    db.atualizar_peca(pid, f"Peça {pid - 1}", 1.0 + i % 5)
+                somar("escritas")
+            except sqlite3.OperationalError:
+                somar("erros_lock")
+            except Exception as erro:
+                falhar(erro)
+            i += 1
+
+    def leitor():
+        while time.perf_counter() < fim:
+            try:
+                db.listar_pecas()
+                somar("leituras")
+            except sqlite3.OperationalError:
+                somar("erros_lock")
+            except Exception as erro:
+                falhar(erro)
+
+    threads = [threading.Thread(target=escritor, args=(n,)) for n in range(n_escritores)]
+    threads += [threading.Thread(target=leitor) for _ in range(n_leitores)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    contagem["materiais"] = len(db.listar_materiais())
+    return contagem, excecoes
+
+
+def main(segundos, n_escritores, n_leitores):
+    print(f"{'perfil':<12} {'escritas/s':>11} {'leituras/s':>11} {'erros lock':>11} {'outros erros':>13}")
+    falhas = []
+    for nome, desempenho in (("padrão", False), ("desempenho", True)):
+        db.configurar(Path(tempfile.mkdtemp()) / "stress.db")
+        db.init_db(desempenho=desempenho)
+        c, excecoes = rodar(segundos, n_escritores, n_leitores)
+        print(f"{nome:<12} {c['escritas'] / segundos:>11.0f} {c['leituras'] / segundos:>11.0f} "
+              f"{c['erros_lock']:>11} {c['outros_erros']:>13}")
+        falhas += [f"{nome}: {e}" for e in sorted(set(excecoes))]
+        if desempenho and c["erros_lock"]:
+            falhas.append(f"{nome}: {c['erros_lock']} erro(s) de lock com WAL e retentativas")
+        if c["materiais"] != c["insercoes"]:
+            falhas.append(f"{nome}: {c['materiais']} materiais gravados para {c['insercoes']} inserções")
+
+    for falha in falhas:
+        print(f"[FALHA] {falha}")
+    if falhas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [5, 4, 4][len(args):]))
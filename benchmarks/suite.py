@@ -0,0 +1,197 @@
+"""Suíte de benchmarks das funções mais usadas de database.py.
+
+Gera um catálogo sintético (gerar_dados.py) ou usa um banco existente, mede
+cada função chamada várias vezes e emite JSON com percentis de latência e
+vazão, para comparar uma execução com outra.
+
+Leituras são medidas sem o cache de leitura (limpo antes de cada chamada,
+fora do tempo medido); `listar_pecas[cache]` mede o acerto no cache. As
+escritas criam e depois excluem as próprias peças, então o banco volta ao
+estado inicial. `repreciar_catalogo[N]` recalcula o catálogo inteiro com N
+processos (--trabalhadores; 1 = sem processos extras), com no máximo
+--repeticoes-catalogo chamadas.
+
+Uso:
+    python benchmarks/suite.py --pecas 100000 --saida base.json
+    python benchmarks/suite.py --pecas 100000 --comparar base.json
+    python benchmarks/suite.py --db catalogo.db --desempenho
+
+Com --comparar, sai com código 1 se alguma p50 piorar mais que --limiar.
+"""
+import argparse
+import datetime
+import json
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+import gerar_dados  # noqa: E402
+
+
+def _percentil(ordenadas, p):
+    return ordenadas[min(len(ordenadas) - 1, int(p / 100 * len(ordenadas)))]
+
+
+def medir(func, repeticoes, tempo_max, preparar=None):
+    """Chama func(i) até `repeticoes` vezes ou `tempo_max` segundos.
+    preparar(i), se houver, roda antes de cada chamada, fora do tempo medido."""
+    tempos = []
+    limite = time.perf_counter() + tempo_max
+    for i in range(repeticoes):
+        if preparar:
+            preparar(i)
+        inicio = time.perf_counter()
+        func(i)
+        tempos.append(time.perf_counter() - inicio)
+        if time.perf_counter() > limite:
+            break
+    ordenadas = sorted(tempos)
+    resultado = {
+        "media_us": sum(tempos) / len(tempos) * 1e6,
+        "p50_us": _percentil(ordenadas, 50) * 1e6,
+        "p90_us": _percentil(ordenadas, 90) * 1e6,
+        "p99_us": _percentil(ordenadas, 99) * 1e6,
+        "max_us": ordenadas[-1] * 1e6,
+        "ops_s": len(tempos) / sum(tempos),
+    }
+    return {"chamadas": len(tempos), **{k: round(v, 1) for k, v in resultado.items()}}
+
+
+def _casos(rnd, repeticoes):
+    ids_pecas = [p[0] for p in db.listar_pecas()]
+    ids_materiais = [m[0] for m in db.listar_materiais()]
+    ids_tecidos = [t[0] for t in db.listar_tecidos()]
+    amostra = [rnd.choice(ids_pecas) for _ in range(repeticoes)]
+    sem_cache = lambda i: db.limpar_cache()  # noqa: E731
+    novas = []
+
+    def criar_peca(i):
+        novas.append(db.inserir_peca(f"Benchmark {time.time_ns()}-{i}", 1.0))
+
+    return [
+        ("listar_materiais", lambda i: db.listar_materiais(), sem_cache),
+        ("listar_tecidos", lambda i: db.listar_tecidos(), sem_cache),
+        ("listar_pecas", lambda i: db.listar_pecas(), sem_cache),
+        ("listar_pecas[cache]", lambda i: db.listar_pecas(), None),
+        ("get_peca", lambda i: db.get_peca(amostra[i]), sem_cache),
+        ("materiais_da_peca", lambda i: db.materiais_da_peca(amostra[i]), sem_cache),
+        ("compute_peca_cost", lambda i: db.compute_peca_cost(amostra[i]), sem_cache),
+        ("inserir_peca", lambda i: criar_peca(i), None),
+        ("adicionar_material_na_peca",
+         lambda i: db.adicionar_material_na_peca(novas[i], rnd.choice(ids_materiais), 1.5), None),
+        ("adicionar_tecido_na_peca",
+         lambda i: db.adicionar_tecido_na_peca(novas[i], rnd.choice(ids_tecidos), 800), None),
+        ("excluir_peca", lambda i: db.excluir_peca(novas[i]), None),
+    ]
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _casos_catalogo(trabalhadores):
+    # zera os preços fora do tempo medido: toda chamada regrava o catálogo
+    def zerar(i):
+        with db.conexao(escrita=True) as conn:
+            conn.execute("UPDATE pecas SET preco_sugerido=0")
+
+    return [(f"repreciar_catalogo[{n}]", lambda i, n=n: db.repreciar_catalogo(trabalhadores=n), zerar)
+            for n in trabalhadores]
+
+
+def rodar(repeticoes, tempo_max, seed, trabalhadores=(), repeticoes_catalogo=3):
+    rnd = random.Random(seed)
+    with db.conexao() as conn:
+        contagem = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                    for t in ("materiais", "tecidos", "pecas", "pecas_materiais", "pecas_tecidos")}
+    resultados = {}
+    for nome, func, preparar in _casos(rnd, repeticoes):
+        resultados[nome] = medir(func, repeticoes, tempo_max, preparar)
+        # as escritas seguintes usam as peças criadas: mesma quantidade de chamadas
+        if nome == "inserir_peca":
+            repeticoes = resultados[nome]["chamadas"]
+    for nome, func, preparar in _casos_catalogo(trabalhadores):
+        resultados[nome] = medir(func, repeticoes_catalogo, tempo_max, preparar)
+    return {
+        "meta": {
+            "data": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit_atual(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "plataforma": platform.platform(),
+            "seed": seed,
+            "linhas": contagem,
+        },
+        "resultados": resultados,
+    }
+
+
+def comparar(atual, anterior, limiar):
+    """Mostra a variação da p50 de cada função; retorna as que pioraram
+    mais que `limiar` (1.2 = 20% mais lenta)."""
+    piores = []
+    print(f"{'função':<28} {'p50 antes':>11} {'p50 agora':>11} {'razão':>7}", file=sys.stderr)
+    for nome, r in atual["resultados"].items():
+        antes = anterior["resultados"].get(nome)
+        if not antes:
+            continue
+        razao = r["p50_us"] / antes["p50_us"]
+        marca = "  <-- regressão" if razao > limiar else ""
+        print(f"{nome:<28} {antes['p50_us']:>11.1f} {r['p50_us']:>11.1f} {razao:>6.2f}x{marca}", file=sys.stderr)
+        if marca:
+            piores.append(nome)
+    return piores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pecas", type=int, default=1000, help="tamanho do catálogo gerado (padrão: 1000)")
+    parser.add_argument("--db", help="usa este banco em vez de gerar um catálogo")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    parser.add_argument("--tempo-max", type=float, default=5.0, help="segundos por função (padrão: 5)")
+    parser.add_argument("--desempenho", action="store_true", help="usa init_db(desempenho=True)")
+    parser.add_argument("--saida", help="grava o JSON neste arquivo (padrão: stdout)")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument("--limiar", type=float, default=1.2)
+    parser.add_argument("--trabalhadores", type=int, nargs="*", default=[1, 2],
+                        help="processos do repreciar_catalogo medido (padrão: 1 2; vazio = não mede)")
+    parser.add_argument("--repeticoes-catalogo", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.db:
+        db.configurar(args.db)
+    else:
+        db.configurar(Path(tempfile.mkdtemp()) / "suite.db")
+        gerar_dados.gerar(args.pecas, seed=args.seed)
+    db.init_db(desempenho=args.desempenho)
+
+    resultado = rodar(args.repeticoes, args.tempo_max, args.seed, args.trabalhadores, args.repeticoes_catalogo)
+    resultado["meta"]["desempenho"] = args.desempenho
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        Path(args.saida).write_text(texto + "\n", encoding="utf-8")
+    else:
+        print(texto)
+
+    if args.comparar:
+        anterior = json.loads(Path(args.comparar).read_text(encoding="utf-8"))
+        if comparar(resultado, anterior, args.limiar):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
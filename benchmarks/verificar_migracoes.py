@@ -0,0 +1,113 @@
+"""Verificação das migrações sobre um banco no formato original (sem
+PRAGMA user_version) com relações peça-material/peça-tecido duplicadas.
+
+Cria o banco com o schema da primeira versão, roda init_db e falha (código
+de saída 1) se as duplicatas não tiverem virado uma linha com a soma das
+quantidades, ou se o custo da peça tiver mudado.
+
+Uso: python benchmarks/verificar_migracoes.py
+"""
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+import database as db  # noqa: E402
+
+SCHEMA_ORIGINAL = """
+    CREATE TABLE materiais (
+        id_material INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome_material TEXT UNIQUE NOT NULL,
+        unidade TEXT NOT NULL,
+        quantidade_adquirida REAL NOT NULL,
+        custo_total REAL NOT NULL
+    );
+    CREATE TABLE tecidos (
+        id_tecido INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome_tecido TEXT UNIQUE NOT NULL,
+        comprimento_total REAL NOT NULL,
+        largura_total REAL NOT NULL,
+        custo_total REAL NOT NULL
+    );
+    CREATE TABLE configuracoes (
+        id INTEGER PRIMARY KEY,
+        valor_hora REAL NOT NULL,
+        margem_lucro REAL NOT NULL
+    );
+    CREATE TABLE pecas (
+        id_peca INTEGER PRIMARY KEY AUTOINCREMENT,
+        nome_peca TEXT UNIQUE NOT NULL,
+        tempo_producao_horas REAL NOT NULL,
+        preco_sugerido REAL DEFAULT 0
+    );
+    CREATE TABLE pecas_materiais (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        peca_id INTEGER NOT NULL,
+        material_id INTEGER NOT NULL,
+        quantidade_usada REAL NOT NULL
+    );
+    CREATE TABLE pecas_tecidos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        peca_id INTEGER NOT NULL,
+        tecido_id INTEGER NOT NULL,
+        area_usada_cm2 REAL NOT NULL
+    );
+
+    INSERT INTO materiais VALUES (1, 'Zíper', 'peças', 10, 20), (2, 'Botão', 'peças', 100, 10);
+    INSERT INTO tecidos VALUES (1, 'Florido', 100, 100, 50);
+    INSERT INTO configuracoes VALUES (1, 0, 0);
+    INSERT INTO pecas VALUES (1, 'Bolsa', 0, 0), (2, 'Estojo', 0, 0);
+    -- a Bolsa tem o zíper e o tecido em duas linhas cada (gravadas em duas vezes)
+    INSERT INTO pecas_materiais (peca_id, material_id, quantidade_usada)
+        VALUES (1, 1, 2), (1, 2, 4), (1, 1, 3), (2, 1, 1);
+    INSERT INTO pecas_tecidos (peca_id, tecido_id, area_usada_cm2)
+        VALUES (1, 1, 1000), (2, 1, 500), (1, 1, 2000);
+"""
+
+# Custos esperados: zíper 5 × R$ 2 + botão 4 × R$ 0,10; tecido 3000 cm² × R$ 0,005
+ESPERADO = {
+    1: {"materiais": {1: 5, 2: 4}, "tecidos": {1: 3000}, "custo_materiais": 10.4, "custo_tecidos": 15.0},
+    2: {"materiais": {1: 1}, "tecidos": {1: 500}, "custo_materiais": 2.0, "custo_tecidos": 2.5},
+}
+
+
+def main():
+    caminho = Path(tempfile.mkdtemp()) / "original.db"
+    conn = sqlite3.connect(caminho)
+    conn.executescript(SCHEMA_ORIGINAL)
+    conn.close()
+
+    db.configurar(caminho)
+    db.init_db()
+
+    falhas = 0
+    for peca_id, esperado in ESPERADO.items():
+        obtido = {
+            "materiais": {m[0]: m[1] for m in db.materiais_da_peca(peca_id)},
+            "tecidos": {t[0]: t[1] for t in db.tecidos_da_peca(peca_id)},
+        }
+        linhas = len(db.materiais_da_peca(peca_id)) + len(db.tecidos_da_peca(peca_id))
+        custos = db.compute_peca_cost(peca_id)
+        obtido["custo_materiais"] = round(custos["custo_materiais"], 6)
+        obtido["custo_tecidos"] = round(custos["custo_tecidos"], 6)
+
+        ok = obtido == esperado and linhas == len(esperado["materiais"]) + len(esperado["tecidos"])
+        falhas += not ok
+        print(f"[{'ok' if ok else 'FALHA'}] peça {peca_id}: {obtido} ({linhas} linha(s))")
+
+    with db.conexao() as conn:
+        versao = conn.execute("PRAGMA user_version").fetchone()[0]
+    if versao != db.SCHEMA_VERSION:
+        falhas += 1
+        print(f"[FALHA] user_version {versao}, esperado {db.SCHEMA_VERSION}")
+
+    if falhas:
+        print(f"{falhas} verificação(ões) falharam")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
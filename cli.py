@@ -0,0 +1,243 @@
+"""Linha de comando da Calculadora de Orçamento (sem Streamlit).
+
+Permite rodar tarefas de lote fora da interface, por exemplo via cron:
+
+    python cli.py reprice --all
+    python cli.py export pecas_precificadas --saida pecas.xlsx
+    python cli.py import materiais fornecedor.csv
+    python cli.py encaixe 12=50 15=20
+    python cli.py plano --arquivo pedidos.csv
+    python cli.py baixa --arquivo pedidos.csv --referencia "OP 42"
+    python cli.py produziveis
+    python cli.py stats
+
+Só depende da biblioteca padrão e dos módulos database, importacao,
+exportacao e producao (Parquet requer pyarrow e XLSX, openpyxl).
+"""
+import argparse
+import csv
+import sys
+from pathlib import Path
+
+import database as db
+import exportacao
+import importacao
+import producao
+
+# Tabelas contadas por `stats`
+TABELAS = ["materiais", "tecidos", "pecas", "pecas_materiais", "pecas_tecidos", "pecas_componentes",
+           "categorias", "movimentos_estoque"]
+
+
+def _progresso(feitas, total):
+    pct = feitas / total * 100 if total else 100
+    print(f"\r  {feitas}/{total} peças ({pct:.0f}%)", end="", file=sys.stderr, flush=True)
+
+
+def cmd_reprice(args):
+    if args.all:
+        total = db.repreciar_catalogo(lote=args.lote, progresso=_progresso,
+                                      trabalhadores=args.trabalhadores or None)
+        print(file=sys.stderr)
+    else:
+        total = db.repreciar_pecas(args.ids)
+    print(f"{total} peça(s) recalculada(s).")
+
+
+def cmd_export(args):
+    formato = args.formato or (Path(args.saida).suffix.lstrip(".").lower() if args.saida else "csv")
+    if formato not in exportacao.FORMATOS:
+        sys.exit(f"Formato desconhecido: {formato} (use --formato)")
+    if formato != "csv" and not args.saida:
+        sys.exit(f"Exportar {formato} requer --saida.")
+    try:
+        total = exportacao.exportar(args.tabela, args.saida or sys.stdout.buffer, formato,
+                                    busca=args.busca, lote=args.lote)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    print(f"{total} linha(s) exportada(s).", file=sys.stderr)
+
+
+def cmd_import(args):
+    def progresso(lidas):
+        print(f"\r  {lidas} linha(s) lida(s)", end="", file=sys.stderr, flush=True)
+
+    try:
+        relatorio = importacao.importar(args.tabela, args.arquivo, formato=args.formato,
+                                        tamanho_lote=args.lote, progresso=progresso)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    print(file=sys.stderr)
+    for linha, msg in relatorio["erros"]:
+        print(f"linha {linha}: {msg}", file=sys.stderr)
+    print(f"{relatorio['importados']} registro(s) importado(s), {len(relatorio['erros'])} erro(s).")
+
+
+def _pedidos(itens):
+    """[(peca_id, quantidade)] a partir de argumentos PECA_ID=QUANTIDADE."""
+    pedidos = []
+    for item in itens:
+        peca_id, _, quantidade = item.partition("=")
+        try:
+            pedidos.append((int(peca_id), float(quantidade or 1)))
+        except ValueError:
+            sys.exit(f"Use PECA_ID=QUANTIDADE: {item}")
+    return pedidos
+
+
+def cmd_encaixe(args):
+    consumo = db.consumo_tecidos(dict(_pedidos(args.pecas)), rotacionar=not args.sem_rotacao)
+    print(f"{'tecido':<24} {'cortes':>7} {'rolo (cm)':>10} {'desperdício':>12} {'R$ encaixe':>11} {'R$ área':>9}")
+    for c in sorted(consumo.values(), key=lambda c: c["nome_tecido"]):
+        print(f"{c['nome_tecido'][:24]:<24} {c['cortes']:>7} {c['comprimento_cm']:>10.1f} "
+              f"{c['desperdicio']:>11.1%} {c['custo_encaixe']:>11.2f} {c['custo_area']:>9.2f}")
+    _avisar_nao_cabem(consumo.values())
+
+
+def _avisar_nao_cabem(tecidos):
+    """Avisa quais peças têm moldes mais largos que o rolo (contados pela área)."""
+    nomes = None
+    for t in tecidos:
+        if t.get("nao_cabem"):
+            nomes = nomes or {p[0]: p[1] for p in db.listar_pecas()}
+            pecas = ", ".join(nomes.get(p, str(p)) for p in t["nao_cabem"])
+            print(f"Aviso: moldes de {pecas} não cabem na largura do rolo de {t['nome_tecido']} "
+                  f"({t['largura_rolo']:g} cm); contados pela área.", file=sys.stderr)
+
+
+def _carteira(args):
+    """Pedidos dos argumentos PECA_ID=QUANTIDADE e do --arquivo CSV."""
+    pedidos = _pedidos(args.pecas)
+    if args.arquivo:
+        with open(args.arquivo, newline="", encoding="utf-8-sig") as f:
+            try:
+                pedidos += [(int(r["peca_id"]), float(r["quantidade"])) for r in csv.DictReader(f)]
+            except (KeyError, ValueError) as e:
+                sys.exit(f"{args.arquivo}: esperadas as colunas peca_id e quantidade ({e})")
+    if not pedidos:
+        sys.exit("Informe PECA_ID=QUANTIDADE ou --arquivo.")
+    return pedidos
+
+
+def cmd_plano(args):
+    plano = producao.planejar(_carteira(args), encaixe=args.encaixe)
+    print(f"{'material':<28} {'necessário':>12} {'disponível':>11} {'falta':>10} {'custo R$':>11}")
+    for m in plano["materiais"]:
+        print(f"{m['nome_material'][:28]:<28} {m['necessario']:>12.2f} {m['disponivel']:>11.2f} "
+              f"{m['falta']:>10.2f} {m['custo']:>11.2f}  {m['unidade']}")
+    print(f"\n{'tecido':<28} {'rolo (cm)':>12} {'disponível':>11} {'falta':>10} {'custo R$':>11}")
+    for t in plano["tecidos"]:
+        print(f"{t['nome_tecido'][:28]:<28} {t['comprimento_cm']:>12.1f} {t['disponivel_cm']:>11.1f} "
+              f"{t['falta_cm']:>10.1f} {t['custo']:>11.2f}")
+    print(f"\ncusto total R$ {plano['custo_total']:.2f} ({len(plano['pecas'])} peça(s), subconjuntos incluídos)")
+    _avisar_nao_cabem(plano["tecidos"])
+    if plano["faltas"]:
+        print(f"{len(plano['faltas'])} item(ns) em falta.", file=sys.stderr)
+        sys.exit(2)
+
+
+def cmd_baixa(args):
+    try:
+        plano = producao.baixar_estoque(_carteira(args), args.referencia, encaixe=args.encaixe,
+                                        permitir_negativo=args.permitir_negativo)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"Consumo lançado: {len(plano['materiais'])} material(is), {len(plano['tecidos'])} tecido(s).")
+
+
+def cmd_produziveis(args):
+    nomes = {p[0]: p[1] for p in db.listar_pecas()}
+    linhas = sorted(((nomes.get(p), q, limite) for p, (q, limite) in db.pecas_produziveis().items()),
+                    key=lambda linha: (-linha[1], linha[0] or ""))
+    for nome, quantidade, limite in linhas:
+        if quantidade or args.todas:
+            print(f"{(nome or '')[:32]:<32} {quantidade:>8}  (limite: {limite})")
+
+
+def cmd_stats(args):
+    largura = max(len(t) for t in TABELAS)
+    with db.conexao() as conn:
+        for tabela in TABELAS:
+            total = conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0]
+            print(f"{tabela:<{largura}} {total:>10}")
+        minimo, media, maximo = conn.execute(
+            "SELECT MIN(preco_sugerido), AVG(preco_sugerido), MAX(preco_sugerido) FROM pecas"
+        ).fetchone()
+        versao = conn.execute("PRAGMA user_version").fetchone()[0]
+    regras = db.carregar_configuracoes()
+    print(f"{'regras de preço':<{largura}} R$ {regras['valor_hora']:.2f}/h | {regras['tipo_margem']} de {regras['margem']:g}% "
+          f"| tecido por {regras['custo_tecido']}")
+    if media is not None:
+        print(f"{'preço sugerido':<{largura}} mín R$ {minimo:.2f} | média R$ {media:.2f} | máx R$ {maximo:.2f}")
+    print(f"{'schema':<{largura}} v{versao}")
+    print(f"{'arquivo':<{largura}} {Path(db.DB_PATH).resolve()} ({Path(db.DB_PATH).stat().st_size / 1024:.0f} KiB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cli.py", description="Calculadora de Orçamento — tarefas de lote")
+    parser.add_argument("--db", help="caminho do banco (padrão: $CALCULA_ORCAMENTOS_DB ou database.db do projeto)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("reprice", help="recalcula o preço sugerido das peças")
+    grupo = p.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--all", action="store_true", help="todas as peças")
+    grupo.add_argument("--ids", type=int, nargs="+", help="ids das peças")
+    p.add_argument("--lote", type=int, default=2000, help="peças por transação (padrão: 2000)")
+    p.add_argument("--trabalhadores", type=int, default=1,
+                   help=f"com --all e a partir de {db.MINIMO_PARALELO} peças, processos calculando "
+                        "em paralelo; 0 = um por núcleo (padrão: 1)")
+    p.set_defaults(func=cmd_reprice)
+
+    p = sub.add_parser("export", help="exporta uma tabela em CSV, Parquet ou XLSX")
+    p.add_argument("tabela", choices=list(exportacao.EXPORTACOES))
+    p.add_argument("--saida", help="arquivo de saída (padrão: stdout, só CSV)")
+    p.add_argument("--formato", choices=list(exportacao.FORMATOS), help="padrão: pela extensão da saída ou csv")
+    p.add_argument("--busca", default="", help="filtra por trecho do nome")
+    p.add_argument("--lote", type=int, default=exportacao.LOTE,
+                   help=f"linhas lidas por vez (padrão: {exportacao.LOTE})")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("import", help="importa materiais ou tecidos de um CSV ou Parquet (upsert pelo nome)")
+    p.add_argument("tabela", choices=["materiais", "tecidos"])
+    p.add_argument("arquivo")
+    p.add_argument("--formato", choices=["csv", "parquet"], help="padrão: pela extensão do arquivo")
+    p.add_argument("--lote", type=int, default=importacao.TAMANHO_LOTE,
+                   help=f"linhas por transação (padrão: {importacao.TAMANHO_LOTE})")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("encaixe", help="consumo de tecido de um lote (cortes encaixados na largura do rolo)")
+    p.add_argument("pecas", nargs="+", metavar="PECA_ID=QUANTIDADE")
+    p.add_argument("--sem-rotacao", action="store_true", help="não gira os moldes (fio do tecido)")
+    p.set_defaults(func=cmd_encaixe)
+
+    p = sub.add_parser("plano", help="necessidade de materiais e tecidos de uma carteira de pedidos "
+                                    "(sai com código 2 se faltar algo)")
+    p.add_argument("pecas", nargs="*", metavar="PECA_ID=QUANTIDADE")
+    p.add_argument("--arquivo", help="CSV com as colunas peca_id e quantidade")
+    p.add_argument("--encaixe", action="store_true", help="comprimento de tecido pelo encaixe dos moldes")
+    p.set_defaults(func=cmd_plano)
+
+    p = sub.add_parser("baixa", help="lança no estoque o consumo de uma produção (uma transação)")
+    p.add_argument("pecas", nargs="*", metavar="PECA_ID=QUANTIDADE")
+    p.add_argument("--arquivo", help="CSV com as colunas peca_id e quantidade")
+    p.add_argument("--referencia", help="ordem de produção, pedido…")
+    p.add_argument("--encaixe", action="store_true", help="tecido pelo encaixe dos moldes")
+    p.add_argument("--permitir-negativo", action="store_true", help="lança mesmo se faltar estoque")
+    p.set_defaults(func=cmd_baixa)
+
+    p = sub.add_parser("produziveis", help="quantas unidades de cada peça o estoque permite produzir")
+    p.add_argument("--todas", action="store_true", help="inclui as peças que não podem ser produzidas")
+    p.set_defaults(func=cmd_produziveis)
+
+    p = sub.add_parser("stats", help="resumo do catálogo")
+    p.set_defaults(func=cmd_stats)
+
+    args = parser.parse_args(argv)
+    if args.db:
+        db.configurar(args.db)
+    db.init_db()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
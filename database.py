@@ -1,417 +1,2713 @@
+import copy
+import datetime
+import functools
+import inspect
+import json
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import random
 import sqlite3
+import threading
+import time
+import types
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
 from pathlib import Path
 
-DB_PATH = Path("database.db")
+from encaixe import cabe, encaixar
+
+# Caminho do banco: variável de ambiente CALCULA_ORCAMENTOS_DB, configurar()
+# ou, por padrão, database.db ao lado deste arquivo (independe do cwd)
+DB_PATH = Path(os.environ.get("CALCULA_ORCAMENTOS_DB") or Path(__file__).with_name("database.db"))
+
+# Conexões ociosas guardadas para reaproveitamento entre chamadas e reruns
+TAMANHO_POOL = 8
+_pool = queue.LifoQueue(maxsize=TAMANHO_POOL)
+_local = threading.local()
+
+# Perfil de desempenho (opt-in via init_db(desempenho=True)): aplicado a cada
+# conexão do pool. O journal WAL é persistente e fica gravado no arquivo.
+PRAGMAS_DESEMPENHO = {
+    "synchronous": "NORMAL",
+    "cache_size": -64000,         # 64 MB (valor negativo = KiB)
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 5000,         # ms esperando o lock antes de falhar
+    "temp_store": "MEMORY",
+}
+_perfil_desempenho = False
+
+# Retentativas de escrita quando o banco está bloqueado por outro escritor
+TENTATIVAS_ESCRITA = 6
+ESPERA_INICIAL_S = 0.02
+
 
 def get_connection():
+    """Abre uma conexão nova e avulsa. Prefira conexao(), que reaproveita
+    conexões do pool."""
+    _garantir_schema()
+    _contar("conexoes")
     return sqlite3.connect(DB_PATH)
 
 
+class _ConexaoPool(sqlite3.Connection):
+    # Se o trace callback da instrumentação está ligado nesta conexão
+    rastreando = False
+
+
+def _destino():
+    """(database, uri) para sqlite3.connect: os processos de
+    _repreciar_paralelo só leem, e abrem o banco só de leitura."""
+    if _somente_leitura:
+        return Path(DB_PATH).resolve().as_uri() + "?mode=ro", True
+    return DB_PATH, False
+
+
+def _abrir_conexao_pool():
+    # Sem transações implícitas: conexao() controla BEGIN/COMMIT.
+    # check_same_thread=False porque a conexão pode voltar ao pool e ser
+    # usada depois por outra thread (nunca por duas ao mesmo tempo).
+    _garantir_schema()
+    _contar("conexoes")
+    conn = sqlite3.connect(*_destino(), isolation_level=None, factory=_ConexaoPool,
+                           check_same_thread=False, cached_statements=256)
+    if _perfil_desempenho:
+        for pragma, valor in PRAGMAS_DESEMPENHO.items():
+            conn.execute(f"PRAGMA {pragma}={valor}")
+    return conn
+
+
+def _retirar_do_pool():
+    while True:
+        try:
+            caminho, conn = _pool.get_nowait()
+        except queue.Empty:
+            conn = _abrir_conexao_pool()
+            break
+        if caminho == DB_PATH:
+            break
+        # DB_PATH mudou desde que a conexão foi aberta
+        conn.close()
+    _configurar_rastreio(conn)
+    return conn
+
+
+def _devolver_ao_pool(conn):
+    try:
+        _pool.put_nowait((DB_PATH, conn))
+    except queue.Full:
+        conn.close()
+
+
+@contextmanager
+def conexao(escrita=False):
+    """Conexão do pool dentro de uma transação.
+
+    O bloco mais externo faz BEGIN e, ao sair, COMMIT (ou ROLLBACK se houver
+    exceção). Blocos aninhados na mesma thread reaproveitam a mesma conexão
+    e usam SAVEPOINT, então funções do módulo podem chamar umas às outras
+    sem abrir conexões nem transações extras.
+
+    Com escrita=True a transação já começa com o lock de escrita
+    (BEGIN IMMEDIATE), o que evita o erro de upgrade de lock no meio dela.
+    """
+    conn = getattr(_local, "conn", None)
+
+    if conn is None:
+        conn = _retirar_do_pool()
+        _local.conn, _local.nivel = conn, 1
+        _local.pendentes = set()
+        try:
+            conn.execute("BEGIN IMMEDIATE" if escrita else "BEGIN")
+            if escrita:
+                # o que outros gravaram antes deste lock invalida o cache
+                _verificar_escritas_externas()
+            yield conn
+            conn.execute("COMMIT")
+            if escrita:
+                # ... e o que esta transação gravou, não (_invalidar cuida)
+                _verificar_escritas_externas(absorver=True)
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        else:
+            _incrementar_versoes(_local.pendentes)
+        finally:
+            _local.conn, _local.nivel = None, 0
+            _local.pendentes = set()
+            _devolver_ao_pool(conn)
+        return
+
+    _local.nivel += 1
+    savepoint = f"sp_{_local.nivel}"
+    conn.execute(f"SAVEPOINT {savepoint}")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute(f"ROLLBACK TO {savepoint}")
+        conn.execute(f"RELEASE {savepoint}")
+        raise
+    else:
+        conn.execute(f"RELEASE {savepoint}")
+    finally:
+        _local.nivel -= 1
+
+
+def _banco_ocupado(erro):
+    msg = str(erro)
+    return "locked" in msg or "busy" in msg
+
+
+def _com_retentativa(func):
+    """Repete a escrita com backoff exponencial se o banco estiver bloqueado.
+
+    Só a chamada mais externa repete: dentro de uma transação já aberta o
+    erro sobe para quem a abriu.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        espera = ESPERA_INICIAL_S
+        for tentativa in range(TENTATIVAS_ESCRITA):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as erro:
+                aninhada = getattr(_local, "conn", None) is not None
+                if aninhada or not _banco_ocupado(erro) or tentativa == TENTATIVAS_ESCRITA - 1:
+                    raise
+                time.sleep(espera * random.uniform(0.5, 1.5))
+                espera *= 2
+    return wrapper
+
+
+def _escrita(*tabelas):
+    """Marca uma função de escrita: repete se o banco estiver bloqueado e,
+    ao final, invalida o cache de leitura das tabelas alteradas."""
+    def decorador(func):
+        @_com_retentativa
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            resultado = func(*args, **kwargs)
+            _invalidar(*tabelas)
+            return resultado
+        return wrapper
+    return decorador
+
+
+def fechar_conexoes():
+    """Fecha todas as conexões ociosas do pool (e a vigia do cache)."""
+    with _vigia_trava:
+        if _vigia["conn"] is not None:
+            _vigia["conn"].close()
+            _vigia.update(caminho=None, conn=None, data_version=None)
+    while True:
+        try:
+            _, conn = _pool.get_nowait()
+        except queue.Empty:
+            return
+        conn.close()
+
+
 # ===========================================
-# Inicialização do Banco de Dados
+# Cache de leitura (invalidado pelas escritas)
+# ===========================================
+# Cada tabela tem uma versão, incrementada pelas funções de escrita quando a
+# transação é confirmada. Leituras em cache guardam as versões das tabelas de
+# que dependem e só são reaproveitadas enquanto elas não mudarem. Escritas de
+# outros processos (CLI, scripts) são detectadas pelo PRAGMA data_version de
+# uma conexão vigia, que só lê esse PRAGMA: ele muda quando qualquer outra
+# conexão confirma uma transação, então as transações de escrita desta
+# aplicação atualizam a referência da vigia logo após o COMMIT.
+#
+# Os valores em cache são devolvidos congelados (listas viram tuplas e
+# dicionários, mappingproxy), para quem recebe não alterar o cache.
+TAMANHO_CACHE = 1024
+_cache = OrderedDict()
+_cache_trava = threading.Lock()
+_versoes_tabelas = {}
+_versao_externa = 0
+_cache_stats = {"hits": 0, "misses": 0}
+_vigia = {"caminho": None, "conn": None, "data_version": None}
+_vigia_trava = threading.Lock()
+
+
+def _incrementar_versoes(tabelas):
+    if not tabelas:
+        return
+    with _cache_trava:
+        for tabela in tabelas:
+            _versoes_tabelas[tabela] = _versoes_tabelas.get(tabela, 0) + 1
+
+
+def _invalidar(*tabelas):
+    if getattr(_local, "conn", None) is not None:
+        # dentro de uma transação: só vale depois do COMMIT do bloco externo
+        _local.pendentes.update(tabelas)
+    else:
+        _incrementar_versoes(tabelas)
+
+
+def _verificar_escritas_externas(absorver=False):
+    """Compara o PRAGMA data_version da vigia com o último visto; se mudou,
+    descarta o cache inteiro, ou só guarda o novo valor com absorver=True
+    (a mudança foi uma escrita desta aplicação, já invalidada por tabela)."""
+    global _versao_externa
+    with _vigia_trava:
+        if _vigia["caminho"] != DB_PATH:
+            if _vigia["conn"] is not None:
+                _vigia["conn"].close()
+            conn = sqlite3.connect(*_destino(), isolation_level=None, check_same_thread=False)
+            _vigia.update(caminho=DB_PATH, conn=conn, data_version=None)
+        try:
+            data_version = _vigia["conn"].execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.OperationalError:
+            # banco bloqueado (journal sem WAL): não dá para saber, trata como
+            # mudança; não pode falhar depois do COMMIT de quem chamou
+            data_version = None
+        if data_version is not None and data_version == _vigia["data_version"]:
+            return
+        # vigia nova (banco trocado) ou sem referência: o cache pode ser de
+        # antes de uma escrita externa
+        if not absorver or data_version is None or _vigia["data_version"] is None:
+            with _cache_trava:
+                _versao_externa += 1
+        _vigia["data_version"] = data_version
+
+
+def _congelar(valor):
+    if isinstance(valor, (list, tuple)):
+        return tuple(_congelar(v) for v in valor)
+    if isinstance(valor, dict):
+        return types.MappingProxyType({k: _congelar(v) for k, v in valor.items()})
+    return valor
+
+
+def _em_cache(*tabelas):
+    """Memoiza uma função de leitura que depende das tabelas informadas.
+    Fora de transação o resultado vem congelado (_congelar)."""
+    def decorador(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Dentro de uma transação a leitura precisa ver as escritas ainda
+            # não confirmadas: vai direto ao banco.
+            if getattr(_local, "conn", None) is not None:
+                return func(*args, **kwargs)
+
+            _verificar_escritas_externas()
+            chave = (func.__name__, DB_PATH, args, tuple(sorted(kwargs.items())))
+            with _cache_trava:
+                versao = (_versao_externa,) + tuple(_versoes_tabelas.get(t, 0) for t in tabelas)
+                item = _cache.get(chave)
+                if item is not None and item[0] == versao:
+                    _cache.move_to_end(chave)
+                    _cache_stats["hits"] += 1
+                    return item[1]
+                _cache_stats["misses"] += 1
+
+            valor = _congelar(func(*args, **kwargs))
+            with _cache_trava:
+                _cache[chave] = (versao, valor)
+                _cache.move_to_end(chave)
+                while len(_cache) > TAMANHO_CACHE:
+                    _cache.popitem(last=False)
+            return valor
+        return wrapper
+    return decorador
+
+
+def limpar_cache():
+    global _versao_externa
+    with _cache_trava:
+        _cache.clear()
+        _versao_externa += 1
+
+
+def estatisticas_cache():
+    """Contadores do cache de leitura: hits, misses e entradas guardadas."""
+    with _cache_trava:
+        return {**_cache_stats, "entradas": len(_cache)}
+
+
+# ===========================================
+# Instrumentação (contadores e consultas lentas)
+# ===========================================
+# Desligada por padrão e sem custo além de um teste por chamada.
+# iniciar_medicao() liga a medição só para a thread atual (no Streamlit, um
+# rerun); ativar_instrumentacao() acumula totais de todas as threads.
+# Toda função pública do módulo é envolvida por _instrumentar (fim do arquivo).
+log = logging.getLogger(__name__)
+CONSULTAS_LENTAS_GUARDADAS = 100
+_consultas_lentas = deque(maxlen=CONSULTAS_LENTAS_GUARDADAS)
+_instrumentacao = {"ativa": False, "lento_ms": None, "medicao": None}
+_instrumentacao_trava = threading.Lock()
+# Medições ligadas agora (threads + global): com zero, o wrapper só repassa
+_medindo = 0
+
+
+def _ajustar_medindo(delta):
+    global _medindo
+    with _instrumentacao_trava:
+        _medindo += delta
+
+
+def _nova_medicao():
+    # funcoes: {nome: {"chamadas", "tempo_s", "linhas"}}; consultas conta as
+    # instruções SQL executadas e conexoes as conexões abertas no SQLite
+    return {"funcoes": {}, "consultas": 0, "conexoes": 0, "lentas": []}
+
+
+def iniciar_medicao(lento_ms=None):
+    """Liga a medição nesta thread, com contadores zerados. Com lento_ms,
+    consultas que levarem pelo menos isso entram em "lentas" e no log."""
+    if getattr(_local, "medicao", None) is None:
+        _ajustar_medindo(1)
+    _local.medicao = _nova_medicao()
+    _local.lento_ms = lento_ms
+
+
+def medicao_atual():
+    """Cópia dos contadores da medição desta thread (None se desligada)."""
+    medicao = getattr(_local, "medicao", None)
+    return copy.deepcopy(medicao)
+
+
+def encerrar_medicao():
+    """Desliga a medição desta thread e devolve seus contadores."""
+    medicao = medicao_atual()
+    if medicao is not None:
+        _fechar_consulta()
+        _local.medicao = None
+        _ajustar_medindo(-1)
+    return medicao
+
+
+def ativar_instrumentacao(ativa=True, lento_ms=None):
+    """Liga (ou desliga) os totais globais, somados de todas as threads."""
+    global _medindo
+    with _instrumentacao_trava:
+        if ativa != _instrumentacao["ativa"]:
+            _medindo += 1 if ativa else -1
+        _instrumentacao["ativa"] = ativa
+        _instrumentacao["lento_ms"] = lento_ms
+        if ativa and _instrumentacao["medicao"] is None:
+            _instrumentacao["medicao"] = _nova_medicao()
+
+
+def estatisticas_instrumentacao():
+    """Totais globais desde ativar_instrumentacao() (None se nunca ativada)."""
+    with _instrumentacao_trava:
+        return copy.deepcopy(_instrumentacao["medicao"])
+
+
+def consultas_lentas():
+    """Últimas consultas lentas de todas as threads: [(sql, ms)]."""
+    return list(_consultas_lentas)
+
+
+def _medicoes():
+    medicao = getattr(_local, "medicao", None)
+    alvos = (medicao,) if medicao is not None else ()
+    if _instrumentacao["ativa"]:
+        alvos += (_instrumentacao["medicao"],)
+    return alvos
+
+
+def _somar(alvos, nome, duracao, linhas):
+    for medicao in alvos:
+        with _instrumentacao_trava:
+            f = medicao["funcoes"].setdefault(nome, {"chamadas": 0, "tempo_s": 0.0, "linhas": 0})
+            f["chamadas"] += 1
+            f["tempo_s"] += duracao
+            f["linhas"] += linhas
+
+
+def _contar(contador):
+    if not _medindo:
+        return
+    for medicao in _medicoes():
+        with _instrumentacao_trava:
+            medicao[contador] += 1
+
+
+def _contar_linhas(resultado):
+    # listas de linhas e dicionários {id: detalhamento} contam cada item;
+    # escalares (contagens, flags, ids) não são linhas
+    if isinstance(resultado, list):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        return len(resultado) if isinstance(next(iter(resultado.values()), None), dict) else 1
+    if resultado is None or isinstance(resultado, (bool, int, float, str)):
+        return 0
+    return 1
+
+
+def _limite_lento():
+    limites = [ms for ms in (getattr(_local, "lento_ms", None) if getattr(_local, "medicao", None) else None,
+                             _instrumentacao["lento_ms"] if _instrumentacao["ativa"] else None)
+               if ms is not None]
+    return min(limites) if limites else None
+
+
+def _rastrear(sql):
+    # trace callback: chamado pelo SQLite antes de cada instrução. Fazem parte
+    # da consulta em andamento, e não contam: os programas de triggers (que
+    # repetem o SQL da instrução ou vêm como comentário "--") e o SQL interno
+    # do FTS5 (que cita o schema como 'main').
+    consulta = getattr(_local, "consulta", None)
+    if sql.startswith("--") or "'main'." in sql or (consulta is not None and consulta[0] == sql):
+        return
+    _fechar_consulta()
+    _contar("consultas")
+    _local.consulta = (sql, time.perf_counter())
+
+
+def _fechar_consulta():
+    # O trace callback só avisa o início: a consulta termina quando começa a
+    # próxima ou quando a chamada instrumentada mais externa retorna (inclui
+    # o tempo de buscar as linhas).
+    consulta = getattr(_local, "consulta", None)
+    if consulta is None:
+        return
+    _local.consulta = None
+    limite = _limite_lento()
+    ms = (time.perf_counter() - consulta[1]) * 1000
+    if limite is None or ms < limite:
+        return
+    sql = " ".join(consulta[0].split())
+    log.warning("Consulta lenta (%.1f ms): %s", ms, sql)
+    _consultas_lentas.append((sql, ms))
+    medicao = getattr(_local, "medicao", None)
+    if medicao is not None:
+        medicao["lentas"].append((sql, ms))
+
+
+def _configurar_rastreio(conn):
+    rastrear = bool(_medindo and _medicoes())
+    if conn.rastreando != rastrear:
+        conn.set_trace_callback(_rastrear if rastrear else None)
+        conn.rastreando = rastrear
+
+
+def _instrumentar(func):
+    nome = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _medindo:
+            return func(*args, **kwargs)
+        alvos = _medicoes()
+        if not alvos:
+            return func(*args, **kwargs)
+        _local.profundidade = getattr(_local, "profundidade", 0) + 1
+        resultado = None
+        inicio = time.perf_counter()
+        try:
+            resultado = func(*args, **kwargs)
+            return resultado
+        finally:
+            duracao = time.perf_counter() - inicio
+            _local.profundidade -= 1
+            if _local.profundidade == 0:
+                _fechar_consulta()
+            _somar(alvos, nome, duracao, _contar_linhas(resultado))
+    return wrapper
+
+
 # ===========================================
-def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
+# Migrações versionadas (PRAGMA user_version)
+# ===========================================
+# Cada migração leva o banco da versão i para i+1. Migrações já publicadas
+# não devem ser alteradas: mudanças de schema entram como um novo item.
+def _migracao_indices_relacoes(cur):
+    # Junta as linhas duplicadas antes dos índices únicos: a mais recente
+    # fica com a soma das quantidades (o custo da peça não muda) e as demais
+    # são apagadas
+    for tabela, coluna_item, coluna_quantidade in (
+        ("pecas_materiais", "material_id", "quantidade_usada"),
+        ("pecas_tecidos", "tecido_id", "area_usada_cm2"),
+    ):
+        cur.execute(f"""
+            UPDATE {tabela} SET {coluna_quantidade} = d.total
+            FROM (
+                SELECT MAX(id) AS id, SUM({coluna_quantidade}) AS total
+                FROM {tabela} GROUP BY peca_id, {coluna_item} HAVING COUNT(*) > 1
+            ) d
+            WHERE {tabela}.id = d.id
+        """)
+        cur.execute(f"""
+            DELETE FROM {tabela} WHERE id NOT IN (
+                SELECT MAX(id) FROM {tabela} GROUP BY peca_id, {coluna_item}
+            )
+        """)
+
+    # (peca_id, x) únicos: também servem de índice para filtros por peca_id
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_pecas_materiais_peca_material
+        ON pecas_materiais (peca_id, material_id)
+    """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_pecas_tecidos_peca_tecido
+        ON pecas_tecidos (peca_id, tecido_id)
+    """)
 
-    # Tabela de materiais
+    # Índices reversos: quais peças usam um material/tecido
     cur.execute("""
-        CREATE TABLE IF NOT EXISTS materiais (
-            id_material INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome_material TEXT UNIQUE NOT NULL,
-            unidade TEXT NOT NULL,
+        CREATE INDEX IF NOT EXISTS ix_pecas_materiais_material
+        ON pecas_materiais (material_id)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS ix_pecas_tecidos_tecido
+        ON pecas_tecidos (tecido_id)
+    """)
+
+
+def _migracao_custos_unitarios(cur):
+    # Custo unitário materializado: o cálculo de preço lê direto, sem dividir
+    # por linha. NULLIF deixa NULL (custo zero) em registros antigos inválidos.
+    cur.execute("ALTER TABLE materiais ADD COLUMN custo_unitario REAL")
+    cur.execute("ALTER TABLE tecidos ADD COLUMN custo_cm2 REAL")
+    cur.execute("""
+        UPDATE materiais
+        SET custo_unitario = custo_total / NULLIF(quantidade_adquirida, 0)
+    """)
+    cur.execute("""
+        UPDATE tecidos
+        SET custo_cm2 = custo_total / NULLIF(comprimento_total * largura_total, 0)
+    """)
+
+    # Mantêm as colunas atualizadas em qualquer INSERT/UPDATE
+    for evento in ("INSERT", "UPDATE OF custo_total, quantidade_adquirida"):
+        sufixo = evento.split()[0].lower()
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tg_materiais_custo_unitario_{sufixo}
+            AFTER {evento} ON materiais
+            BEGIN
+                UPDATE materiais
+                SET custo_unitario = NEW.custo_total / NULLIF(NEW.quantidade_adquirida, 0)
+                WHERE id_material = NEW.id_material;
+            END
+        """)
+    for evento in ("INSERT", "UPDATE OF custo_total, comprimento_total, largura_total"):
+        sufixo = evento.split()[0].lower()
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tg_tecidos_custo_cm2_{sufixo}
+            AFTER {evento} ON tecidos
+            BEGIN
+                UPDATE tecidos
+                SET custo_cm2 = NEW.custo_total / NULLIF(NEW.comprimento_total * NEW.largura_total, 0)
+                WHERE id_tecido = NEW.id_tecido;
+            END
+        """)
+
+    # Rejeita quantidades/medidas zeradas também para quem escreve direto no banco
+    for evento in ("INSERT", "UPDATE"):
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tg_materiais_valida_{evento.lower()}
+            BEFORE {evento} ON materiais
+            WHEN NEW.quantidade_adquirida <= 0
+            BEGIN
+                SELECT RAISE(ABORT, 'quantidade_adquirida deve ser maior que zero');
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tg_tecidos_valida_{evento.lower()}
+            BEFORE {evento} ON tecidos
+            WHEN NEW.comprimento_total <= 0 OR NEW.largura_total <= 0
+            BEGIN
+                SELECT RAISE(ABORT, 'comprimento_total e largura_total devem ser maiores que zero');
+            END
+        """)
+
+
+# Índices de busca por nome: tabela FTS5 (trigram) de conteúdo externo
+# para cada cadastro, com rowid = id do registro
+_INDICES_BUSCA = {
+    "material": ("materiais", "id_material", "nome_material"),
+    "tecido": ("tecidos", "id_tecido", "nome_tecido"),
+    "peca": ("pecas", "id_peca", "nome_peca"),
+}
+
+
+def _migracao_busca_nomes(cur):
+    # trigram: busca por trecho do nome (como LIKE '%x%'), mas indexada
+    for tabela, id_col, nome_col in _INDICES_BUSCA.values():
+        fts = f"{tabela}_fts"
+        cur.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {nome_col}, content='{tabela}', content_rowid='{id_col}',
+                tokenize='trigram'
+            )
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tg_{fts}_insert AFTER INSERT ON {tabela}
+            BEGIN
+                INSERT INTO {fts} (rowid, {nome_col}) VALUES (NEW.{id_col}, NEW.{nome_col});
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tg_{fts}_delete AFTER DELETE ON {tabela}
+            BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {nome_col}) VALUES ('delete', OLD.{id_col}, OLD.{nome_col});
+            END
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tg_{fts}_update AFTER UPDATE OF {nome_col} ON {tabela}
+            BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {nome_col}) VALUES ('delete', OLD.{id_col}, OLD.{nome_col});
+                INSERT INTO {fts} (rowid, {nome_col}) VALUES (NEW.{id_col}, NEW.{nome_col});
+            END
+        """)
+        cur.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+# Histórico append-only de custos e preços, gravado por triggers na mesma
+# transação da alteração. registrado_em é o instante UTC em texto ISO
+# ('AAAA-MM-DD HH:MM:SS.SSS'), que ordena como data.
+_AGORA_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _migracao_historico(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS historico_materiais (
+            id INTEGER PRIMARY KEY,
+            material_id INTEGER NOT NULL,
+            registrado_em TEXT NOT NULL,
+            custo_total REAL NOT NULL,
             quantidade_adquirida REAL NOT NULL,
-            custo_total REAL NOT NULL
+            custo_unitario REAL
         )
     """)
-
-    # Tabela de tecidos
     cur.execute("""
-        CREATE TABLE IF NOT EXISTS tecidos (
-            id_tecido INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome_tecido TEXT UNIQUE NOT NULL,
+        CREATE TABLE IF NOT EXISTS historico_tecidos (
+            id INTEGER PRIMARY KEY,
+            tecido_id INTEGER NOT NULL,
+            registrado_em TEXT NOT NULL,
+            custo_total REAL NOT NULL,
             comprimento_total REAL NOT NULL,
             largura_total REAL NOT NULL,
-            custo_total REAL NOT NULL
+            custo_cm2 REAL
         )
     """)
-
-    # Tabela de mão de obra (somente 1 registro)
     cur.execute("""
-        CREATE TABLE IF NOT EXISTS configuracoes (
+        CREATE TABLE IF NOT EXISTS historico_precos (
             id INTEGER PRIMARY KEY,
-            valor_hora REAL NOT NULL,
-            margem_lucro REAL NOT NULL
+            peca_id INTEGER NOT NULL,
+            registrado_em TEXT NOT NULL,
+            preco_sugerido REAL
         )
     """)
+    # "valor em uma data" = última linha com registrado_em <= data: uma busca no índice
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_historico_materiais ON historico_materiais (material_id, registrado_em)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_historico_tecidos ON historico_tecidos (tecido_id, registrado_em)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_historico_precos ON historico_precos (peca_id, registrado_em)")
+
+    # custo_unitario/custo_cm2 são recalculados por trigger em todo INSERT e
+    # UPDATE de custo: basta observar essas colunas (OLD é NULL no INSERT)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tg_historico_materiais
+        AFTER UPDATE OF custo_unitario ON materiais
+        WHEN OLD.custo_unitario IS NOT NEW.custo_unitario
+        BEGIN
+            INSERT INTO historico_materiais
+                (material_id, registrado_em, custo_total, quantidade_adquirida, custo_unitario)
+            VALUES (NEW.id_material, {_AGORA_SQL}, NEW.custo_total, NEW.quantidade_adquirida, NEW.custo_unitario);
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tg_historico_tecidos
+        AFTER UPDATE OF custo_cm2 ON tecidos
+        WHEN OLD.custo_cm2 IS NOT NEW.custo_cm2
+        BEGIN
+            INSERT INTO historico_tecidos
+                (tecido_id, registrado_em, custo_total, comprimento_total, largura_total, custo_cm2)
+            VALUES (NEW.id_tecido, {_AGORA_SQL}, NEW.custo_total, NEW.comprimento_total,
+                    NEW.largura_total, NEW.custo_cm2);
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tg_historico_precos_insert AFTER INSERT ON pecas
+        BEGIN
+            INSERT INTO historico_precos (peca_id, registrado_em, preco_sugerido)
+            VALUES (NEW.id_peca, {_AGORA_SQL}, NEW.preco_sugerido);
+        END
+    """)
+    # Recalcular sem mudança (ou só com ruído de arredondamento) não grava
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS tg_historico_precos_update
+        AFTER UPDATE OF preco_sugerido ON pecas
+        WHEN OLD.preco_sugerido IS NULL OR NEW.preco_sugerido IS NULL
+             OR abs(NEW.preco_sugerido - OLD.preco_sugerido) > 1e-9
+        BEGIN
+            INSERT INTO historico_precos (peca_id, registrado_em, preco_sugerido)
+            VALUES (NEW.id_peca, {_AGORA_SQL}, NEW.preco_sugerido);
+        END
+    """)
 
-    # Tabela de peças
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS pecas (
-            id_peca INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome_peca TEXT UNIQUE NOT NULL,
-            tempo_producao_horas REAL NOT NULL,
-            preco_sugerido REAL DEFAULT 0
-        )
+    # Ponto de partida: os valores atuais
+    cur.execute(f"""
+        INSERT INTO historico_materiais
+            (material_id, registrado_em, custo_total, quantidade_adquirida, custo_unitario)
+        SELECT id_material, {_AGORA_SQL}, custo_total, quantidade_adquirida, custo_unitario FROM materiais
+    """)
+    cur.execute(f"""
+        INSERT INTO historico_tecidos
+            (tecido_id, registrado_em, custo_total, comprimento_total, largura_total, custo_cm2)
+        SELECT id_tecido, {_AGORA_SQL}, custo_total, comprimento_total, largura_total, custo_cm2 FROM tecidos
     """)
+    cur.execute(f"""
+        INSERT INTO historico_precos (peca_id, registrado_em, preco_sugerido)
+        SELECT id_peca, {_AGORA_SQL}, preco_sugerido FROM pecas
+    """)
+
 
-    # Tabela N-N: materiais usados em peças
+def _migracao_componentes(cur):
+    # Peças montadas a partir de outras peças (subconjuntos). Ciclos são
+    # barrados por _verificar_ciclo ao gravar: triggers não aceitam WITH RECURSIVE.
     cur.execute("""
-        CREATE TABLE IF NOT EXISTS pecas_materiais (
+        CREATE TABLE IF NOT EXISTS pecas_componentes (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             peca_id INTEGER NOT NULL,
-            material_id INTEGER NOT NULL,
-            quantidade_usada REAL NOT NULL,
+            componente_id INTEGER NOT NULL,
+            quantidade REAL NOT NULL CHECK (quantidade > 0),
             FOREIGN KEY (peca_id) REFERENCES pecas(id_peca),
-            FOREIGN KEY (material_id) REFERENCES materiais(id_material)
+            FOREIGN KEY (componente_id) REFERENCES pecas(id_peca),
+            CHECK (peca_id <> componente_id)
         )
     """)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_pecas_componentes_peca_componente
+        ON pecas_componentes (peca_id, componente_id)
+    """)
+    # Reverso: em quais peças um subconjunto é usado (propagação de preço)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS ix_pecas_componentes_componente
+        ON pecas_componentes (componente_id)
+    """)
+
+
+def _migracao_medidas_cortes(cur):
+    # Medidas do molde retangular de cada tecido na peça (e quantos cortes
+    # iguais), para o encaixe na largura do rolo. Relações antigas só têm a
+    # área e continuam custeadas por área.
+    cur.execute("PRAGMA table_info(pecas_tecidos)")
+    existentes = [c[1] for c in cur.fetchall()]
+    for coluna in ("comprimento_cm REAL", "largura_cm REAL", "cortes INTEGER NOT NULL DEFAULT 1"):
+        if coluna.split()[0] not in existentes:
+            cur.execute(f"ALTER TABLE pecas_tecidos ADD COLUMN {coluna}")
+
 
-    # Tabela N-N: tecidos usados em peças
+def _migracao_estoque(cur):
+    # Razão de estoque: só recebe INSERTs (correções são lançamentos de
+    # ajuste). Materiais na sua unidade; tecidos em cm de comprimento de rolo.
     cur.execute("""
-        CREATE TABLE IF NOT EXISTS pecas_tecidos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            peca_id INTEGER NOT NULL,
-            tecido_id INTEGER NOT NULL,
-            area_usada_cm2 REAL NOT NULL,
-            FOREIGN KEY (peca_id) REFERENCES pecas(id_peca),
-            FOREIGN KEY (tecido_id) REFERENCES tecidos(id_tecido)
+        CREATE TABLE IF NOT EXISTS movimentos_estoque (
+            id INTEGER PRIMARY KEY,
+            item_tipo TEXT NOT NULL CHECK (item_tipo IN ('material', 'tecido')),
+            item_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL CHECK (tipo IN ('compra', 'consumo', 'ajuste')),
+            quantidade REAL NOT NULL,
+            registrado_em TEXT NOT NULL,
+            referencia TEXT,
+            CHECK (tipo <> 'compra' OR quantidade > 0),
+            CHECK (tipo <> 'consumo' OR quantidade < 0)
+        )
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS ix_movimentos_estoque_item
+        ON movimentos_estoque (item_tipo, item_id, registrado_em)
+    """)
+    # Saldo corrente de cada item, mantido pelo trigger: consultar o estoque
+    # é uma busca pela chave, não uma soma sobre o razão
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS saldos_estoque (
+            item_tipo TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            saldo REAL NOT NULL,
+            PRIMARY KEY (item_tipo, item_id)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS tg_saldos_estoque AFTER INSERT ON movimentos_estoque
+        BEGIN
+            INSERT INTO saldos_estoque (item_tipo, item_id, saldo)
+            VALUES (NEW.item_tipo, NEW.item_id, NEW.quantidade)
+            ON CONFLICT (item_tipo, item_id) DO UPDATE SET saldo = saldo + excluded.saldo;
+        END
+    """)
+    for operacao in ("UPDATE", "DELETE"):
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS tg_movimentos_estoque_{operacao.lower()}
+            BEFORE {operacao} ON movimentos_estoque
+            BEGIN
+                SELECT RAISE(ABORT, 'Movimentos de estoque não podem ser alterados; lance um ajuste.');
+            END
+        """)
+
+
+def _migracao_regras_preco(cur):
+    # Regras de preço: a margem passa a ter tipo (markup sobre o custo ou
+    # margem sobre o preço; a configuração existente era um markup) e cada
+    # peça pode ter uma categoria com custos indiretos próprios.
+    cur.execute("PRAGMA table_info(configuracoes)")
+    if "tipo_margem" not in [c[1] for c in cur.fetchall()]:
+        cur.execute("""
+            ALTER TABLE configuracoes ADD COLUMN tipo_margem TEXT NOT NULL DEFAULT 'markup'
+            CHECK (tipo_margem IN ('markup', 'margem'))
+        """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS categorias (
+            nome TEXT PRIMARY KEY,
+            percentual_indireto REAL NOT NULL DEFAULT 0 CHECK (percentual_indireto >= 0),
+            valor_indireto REAL NOT NULL DEFAULT 0 CHECK (valor_indireto >= 0)
         )
     """)
-
-    # MIGRAÇÃO → adicionar preco_sugerido se não existir
     cur.execute("PRAGMA table_info(pecas)")
-    colunas = [c[1] for c in cur.fetchall()]
-    if "preco_sugerido" not in colunas:
-        cur.execute("ALTER TABLE pecas ADD COLUMN preco_sugerido REAL DEFAULT 0")
+    if "categoria" not in [c[1] for c in cur.fetchall()]:
+        cur.execute("ALTER TABLE pecas ADD COLUMN categoria TEXT REFERENCES categorias(nome)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_pecas_categoria ON pecas (categoria)")
 
-    conn.commit()
-    conn.close()
+
+def _migracao_tarefas(cur):
+    # Tarefas em segundo plano (tarefas.py): andamento e resultado ficam no
+    # banco para as páginas consultarem sem esperar a execução.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS tarefas (
+            id INTEGER PRIMARY KEY,
+            tipo TEXT NOT NULL,
+            parametros TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL DEFAULT 'pendente'
+                CHECK (status IN ('pendente', 'executando', 'concluida', 'erro')),
+            feitas INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            resultado TEXT,
+            erro TEXT,
+            processo INTEGER,
+            criada_em TEXT NOT NULL,
+            iniciada_em TEXT,
+            concluida_em TEXT
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_tarefas_status ON tarefas (status)")
+
+
+def _migracao_custo_tecido(cur):
+    # Como o tecido entra no preço gravado: pela área dos moldes ou pelo
+    # comprimento de rolo que o encaixe consome (compute_costs_bulk)
+    cur.execute("PRAGMA table_info(configuracoes)")
+    if "custo_tecido" not in [c[1] for c in cur.fetchall()]:
+        cur.execute("""
+            ALTER TABLE configuracoes ADD COLUMN custo_tecido TEXT NOT NULL DEFAULT 'area'
+            CHECK (custo_tecido IN ('area', 'encaixe'))
+        """)
+
+
+_MIGRACOES = [
+    _migracao_indices_relacoes,     # 1
+    _migracao_custos_unitarios,     # 2
+    _migracao_busca_nomes,          # 3
+    _migracao_historico,            # 4
+    _migracao_componentes,          # 5
+    _migracao_medidas_cortes,       # 6
+    _migracao_estoque,              # 7
+    _migracao_regras_preco,         # 8
+    _migracao_tarefas,              # 9
+    _migracao_custo_tecido,         # 10
+]
+SCHEMA_VERSION = len(_MIGRACOES)
+
+
+def _aplicar_migracoes(cur):
+    cur.execute("PRAGMA user_version")
+    versao = cur.fetchone()[0]
+    for numero, migracao in enumerate(_MIGRACOES[versao:], start=versao + 1):
+        migracao(cur)
+        cur.execute(f"PRAGMA user_version={numero}")
+
+
+# ===========================================
+# Inicialização do Banco de Dados
+# ===========================================
+_schemas_prontos = set()
+_caminhos_wal = set()
+_schema_trava = threading.Lock()
+
+
+def init_db(desempenho=False):
+    """Prepara o banco em DB_PATH: cria/migra o schema (uma vez por processo
+    e caminho) e, com desempenho=True, ativa o perfil de desempenho
+    (WAL + PRAGMAS_DESEMPENHO) para este processo.
+
+    Importar o módulo não toca no banco; se init_db() não for chamada, o
+    schema é garantido na primeira conexão.
+    """
+    global _perfil_desempenho
+    _garantir_schema()
+    if desempenho and not _perfil_desempenho:
+        _perfil_desempenho = True
+        # conexões já abertas não têm os PRAGMAs do perfil
+        fechar_conexoes()
+    if desempenho and DB_PATH not in _caminhos_wal:
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.close()
+        _caminhos_wal.add(DB_PATH)
+
+
+def configurar(caminho):
+    """Aponta o módulo para outro arquivo de banco."""
+    global DB_PATH
+    DB_PATH = Path(caminho)
+    fechar_conexoes()
+    limpar_cache()
+
+
+def _garantir_schema():
+    if DB_PATH in _schemas_prontos:
+        return
+    with _schema_trava:
+        if DB_PATH in _schemas_prontos:
+            return
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        try:
+            # caminho rápido: banco já na versão atual, nenhum DDL a rodar
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                _criar_schema(conn)
+        finally:
+            conn.close()
+        _schemas_prontos.add(DB_PATH)
+        limpar_cache()
+
+
+@_com_retentativa
+def _criar_schema(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cur = conn.cursor()
+
+        # Tabela de materiais
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS materiais (
+                id_material INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome_material TEXT UNIQUE NOT NULL,
+                unidade TEXT NOT NULL,
+                quantidade_adquirida REAL NOT NULL,
+                custo_total REAL NOT NULL
+            )
+        """)
+
+        # Tabela de tecidos
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS tecidos (
+                id_tecido INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome_tecido TEXT UNIQUE NOT NULL,
+                comprimento_total REAL NOT NULL,
+                largura_total REAL NOT NULL,
+                custo_total REAL NOT NULL
+            )
+        """)
+
+        # Tabela de mão de obra (somente 1 registro)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS configuracoes (
+                id INTEGER PRIMARY KEY,
+                valor_hora REAL NOT NULL,
+                margem_lucro REAL NOT NULL
+            )
+        """)
+
+        # Tabela de peças
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS pecas (
+                id_peca INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome_peca TEXT UNIQUE NOT NULL,
+                tempo_producao_horas REAL NOT NULL,
+                preco_sugerido REAL DEFAULT 0
+            )
+        """)
+
+        # Tabela N-N: materiais usados em peças
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS pecas_materiais (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                peca_id INTEGER NOT NULL,
+                material_id INTEGER NOT NULL,
+                quantidade_usada REAL NOT NULL,
+                FOREIGN KEY (peca_id) REFERENCES pecas(id_peca),
+                FOREIGN KEY (material_id) REFERENCES materiais(id_material)
+            )
+        """)
+
+        # Tabela N-N: tecidos usados em peças
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS pecas_tecidos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                peca_id INTEGER NOT NULL,
+                tecido_id INTEGER NOT NULL,
+                area_usada_cm2 REAL NOT NULL,
+                FOREIGN KEY (peca_id) REFERENCES pecas(id_peca),
+                FOREIGN KEY (tecido_id) REFERENCES tecidos(id_tecido)
+            )
+        """)
+
+        # MIGRAÇÃO → adicionar preco_sugerido se não existir
+        cur.execute("PRAGMA table_info(pecas)")
+        colunas = [c[1] for c in cur.fetchall()]
+        if "preco_sugerido" not in colunas:
+            cur.execute("ALTER TABLE pecas ADD COLUMN preco_sugerido REAL DEFAULT 0")
+
+        _aplicar_migracoes(cur)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
 
 
-init_db()
+# ===========================================
+#  BUSCA POR NOME
+# ===========================================
+def _escapar_like(texto):
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _termo_fts(busca):
+    # frase entre aspas: no trigram equivale a "contém este trecho"
+    return '"' + busca.replace('"', '""') + '"'
+
+
+@_em_cache("materiais", "tecidos", "pecas")
+def buscar(termo, tipo=None, limit=20):
+    """Busca por trecho do nome em materiais, tecidos e/ou peças.
+
+    tipo: "material", "tecido", "peca" ou None para todos.
+    Retorna [(tipo, id, nome)] do mais para o menos relevante (bm25).
+    Termos com menos de 3 caracteres são buscados como prefixo do nome.
+    """
+    termo = termo.strip()
+    if not termo:
+        return []
+    tipos = [tipo] if tipo else list(_INDICES_BUSCA)
+
+    consultas, params = [], []
+    for t in tipos:
+        tabela, id_col, nome_col = _INDICES_BUSCA[t]
+        if len(termo) >= 3:
+            consultas.append(f"""
+                SELECT '{t}', rowid, {nome_col}, rank
+                FROM {tabela}_fts WHERE {tabela}_fts MATCH ?
+            """)
+            params.append(_termo_fts(termo))
+        else:
+            consultas.append(f"""
+                SELECT '{t}', {id_col}, {nome_col}, length({nome_col})
+                FROM {tabela} WHERE {nome_col} LIKE ? ESCAPE '\\'
+            """)
+            params.append(_escapar_like(termo) + "%")
+
+    sql = " UNION ALL ".join(consultas) + " ORDER BY 4 LIMIT ?"
+    with conexao() as conn:
+        rows = conn.execute(sql, params + [limit]).fetchall()
+    return [r[:3] for r in rows]
 
 
 # ===========================================
 #  FUNÇÕES — MATERIAIS
 # ===========================================
 def nome_material_existe(nome):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM materiais WHERE nome_material=?", (nome,))
-    row = cur.fetchone()
-    conn.close()
+    with conexao() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM materiais WHERE nome_material=?", (nome,))
+        row = cur.fetchone()
     return row is not None
 
 
+@_em_cache("materiais")
 def listar_materiais():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id_material, nome_material, unidade, quantidade_adquirida, custo_total
-        FROM materiais
-        ORDER BY nome_material ASC
-    """)
-    rows = cur.fetchall()
-    conn.close()
+    with conexao() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id_material, nome_material, unidade, quantidade_adquirida, custo_total
+            FROM materiais
+            ORDER BY nome_material ASC
+        """)
+        rows = cur.fetchall()
     return rows
 
 
+# Unidades de compra dos materiais (as opções da página de Materiais)
+UNIDADES = ("metros", "centímetros", "quilogramas", "gramas", "mililitros", "litros", "peças")
+
+
+def _validar_material(unidade, qtd, custo):
+    if unidade not in UNIDADES:
+        raise ValueError(f"Unidade desconhecida: {unidade} (use {', '.join(UNIDADES)}).")
+    if qtd <= 0:
+        raise ValueError("A quantidade adquirida deve ser maior que zero.")
+    if custo < 0:
+        raise ValueError("O custo total não pode ser negativo.")
+
+
+def filtro_nome(tipo, busca):
+    """Cláusula WHERE de busca por trecho do nome (sem diferenciar
+    maiúsculas/minúsculas) e seus parâmetros, para `tipo` "material",
+    "tecido" ou "peca". Com 3+ caracteres usa o índice trigram; termos
+    menores não formam trigramas e caem no LIKE."""
+    if not busca:
+        return "", ()
+    tabela, id_col, nome_col = _INDICES_BUSCA[tipo]
+    if len(busca) >= 3:
+        return (f"WHERE {id_col} IN (SELECT rowid FROM {tabela}_fts WHERE {tabela}_fts MATCH ?)",
+                (_termo_fts(busca),))
+    return f"WHERE {nome_col} LIKE ? ESCAPE '\\'", (f"%{_escapar_like(busca)}%",)
+
+
+@_em_cache("materiais")
+def contar_materiais(busca=""):
+    where, params = filtro_nome("material", busca)
+    with conexao() as conn:
+        row = conn.execute(f"SELECT COUNT(*) FROM materiais {where}", params).fetchone()
+    return row[0]
+
+
+@_em_cache("materiais")
+def buscar_materiais(busca="", limite=None, offset=0):
+    """Materiais cujo nome contém `busca`, em ordem de nome, paginados no
+    próprio SQLite com LIMIT/OFFSET (limite=None traz todos)."""
+    where, params = filtro_nome("material", busca)
+    with conexao() as conn:
+        cur = conn.execute(f"""
+            SELECT id_material, nome_material, unidade, quantidade_adquirida, custo_total
+            FROM materiais
+            {where}
+            ORDER BY nome_material ASC
+            LIMIT ? OFFSET ?
+        """, params + (-1 if limite is None else limite, offset))
+        rows = cur.fetchall()
+    return rows
+
+
+@_escrita("materiais")
 def inserir_material(nome, unidade, qtd, custo):
-    conn = get_connection()
-    conn.execute("""
-        INSERT INTO materiais (nome_material, unidade, quantidade_adquirida, custo_total)
-        VALUES (?, ?, ?, ?)
-    """, (nome, unidade, qtd, custo))
-    conn.commit()
-    conn.close()
+    _validar_material(unidade, qtd, custo)
+    with conexao(escrita=True) as conn:
+        conn.execute("""
+            INSERT INTO materiais (nome_material, unidade, quantidade_adquirida, custo_total)
+            VALUES (?, ?, ?, ?)
+        """, (nome, unidade, qtd, custo))
 
 
+@_escrita("materiais", "pecas")
 def atualizar_material(id_material, nome, unidade, qtd, custo):
-    conn = get_connection()
-    conn.execute("""
-        UPDATE materiais SET nome_material=?, unidade=?, quantidade_adquirida=?, custo_total=?
-        WHERE id_material=?
-    """, (nome, unidade, qtd, custo, id_material))
-    conn.commit()
-    conn.close()
+    _validar_material(unidade, qtd, custo)
+    with conexao(escrita=True) as conn:
+        conn.execute("""
+            UPDATE materiais SET nome_material=?, unidade=?, quantidade_adquirida=?, custo_total=?
+            WHERE id_material=?
+        """, (nome, unidade, qtd, custo, id_material))
+        # Só as peças que usam este material ficam com preço desatualizado
+        repreciar_pecas(_pecas_que_usam(conn, "material", id_material))
 
 
+@_escrita("materiais", "pecas")
 def excluir_material(id_material):
-    conn = get_connection()
-    conn.execute("DELETE FROM materiais WHERE id_material=?", (id_material,))
-    conn.commit()
-    conn.close()
+    with conexao(escrita=True) as conn:
+        afetadas = _pecas_que_usam(conn, "material", id_material)
+        conn.execute("DELETE FROM materiais WHERE id_material=?", (id_material,))
+        repreciar_pecas(afetadas)
 
 
 # ===========================================
 #  FUNÇÕES — TECIDOS
 # ===========================================
 def nome_tecido_existe(nome):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM tecidos WHERE nome_tecido=?", (nome,))
-    row = cur.fetchone()
-    conn.close()
+    with conexao() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM tecidos WHERE nome_tecido=?", (nome,))
+        row = cur.fetchone()
     return row is not None
 
 
+@_em_cache("tecidos")
 def listar_tecidos():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id_tecido, nome_tecido, comprimento_total, largura_total, custo_total
-        FROM tecidos
-        ORDER BY nome_tecido ASC
-    """)
-    rows = cur.fetchall()
-    conn.close()
+    with conexao() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id_tecido, nome_tecido, comprimento_total, largura_total, custo_total
+            FROM tecidos
+            ORDER BY nome_tecido ASC
+        """)
+        rows = cur.fetchall()
     return rows
 
 
+def _validar_tecido(comp, larg, custo):
+    if comp <= 0 or larg <= 0:
+        raise ValueError("O comprimento e a largura devem ser maiores que zero.")
+    if custo < 0:
+        raise ValueError("O custo total não pode ser negativo.")
+
+
+@_escrita("tecidos")
 def inserir_tecido(nome, comp, larg, custo):
-    conn = get_connection()
-    conn.execute("""
-        INSERT INTO tecidos (nome_tecido, comprimento_total, largura_total, custo_total)
-        VALUES (?, ?, ?, ?)
-    """, (nome, comp, larg, custo))
-    conn.commit()
-    conn.close()
+    _validar_tecido(comp, larg, custo)
+    with conexao(escrita=True) as conn:
+        conn.execute("""
+            INSERT INTO tecidos (nome_tecido, comprimento_total, largura_total, custo_total)
+            VALUES (?, ?, ?, ?)
+        """, (nome, comp, larg, custo))
 
 
+@_escrita("tecidos", "pecas")
 def atualizar_tecido(id_tecido, nome, comp, larg, custo):
-    conn = get_connection()
-    conn.execute("""
-        UPDATE tecidos SET nome_tecido=?, comprimento_total=?, largura_total=?, custo_total=?
-        WHERE id_tecido=?
-    """, (nome, comp, larg, custo, id_tecido))
-    conn.commit()
-    conn.close()
+    _validar_tecido(comp, larg, custo)
+    with conexao(escrita=True) as conn:
+        conn.execute("""
+            UPDATE tecidos SET nome_tecido=?, comprimento_total=?, largura_total=?, custo_total=?
+            WHERE id_tecido=?
+        """, (nome, comp, larg, custo, id_tecido))
+        # Só as peças que usam este tecido ficam com preço desatualizado
+        repreciar_pecas(_pecas_que_usam(conn, "tecido", id_tecido))
 
 
+@_escrita("tecidos", "pecas")
 def excluir_tecido(id_tecido):
-    conn = get_connection()
-    conn.execute("DELETE FROM tecidos WHERE id_tecido=?", (id_tecido,))
-    conn.commit()
-    conn.close()
+    with conexao(escrita=True) as conn:
+        afetadas = _pecas_que_usam(conn, "tecido", id_tecido)
+        conn.execute("DELETE FROM tecidos WHERE id_tecido=?", (id_tecido,))
+        repreciar_pecas(afetadas)
 
 
 # ===========================================
 #  FUNÇÕES — MÃO DE OBRA
 # ===========================================
-def salvar_configuracoes(valor_hora, margem):
-    conn = get_connection()
-    conn.execute("DELETE FROM configuracoes")
-    conn.execute("""
-        INSERT INTO configuracoes (id, valor_hora, margem_lucro)
-        VALUES (1, ?, ?)
-    """, (valor_hora, margem))
-    conn.commit()
-    conn.close()
-
-
+# tipo_margem: "markup" = % sobre o custo; "margem" = % do preço de venda
+TIPOS_MARGEM = ("markup", "margem")
+# Vale sem configuração gravada e quando salvar_configuracoes não o recebe
+TIPO_MARGEM_PADRAO = "margem"
+# custo_tecido: "area" = área dos moldes × custo/cm²; "encaixe" = comprimento
+# de rolo consumido com os moldes encaixados na largura
+TIPOS_CUSTO_TECIDO = ("area", "encaixe")
+
+# Sem configuração gravada vale a regra original: preço = custo / 0,44
+_CONFIGURACAO_PADRAO = {"valor_hora": 0, "margem": 56.0, "tipo_margem": TIPO_MARGEM_PADRAO, "custo_tecido": "area"}
+
+
+@_escrita("configuracoes", "pecas")
+def salvar_configuracoes(valor_hora, margem, tipo_margem=TIPO_MARGEM_PADRAO, custo_tecido=None):
+    """Grava valor da hora e margem (e, se informado, o custo_tecido) e
+    recalcula o preço de todo o catálogo na mesma transação."""
+    if valor_hora < 0 or margem < 0:
+        raise ValueError("Valor da hora e margem não podem ser negativos.")
+    if tipo_margem not in TIPOS_MARGEM:
+        raise ValueError(f"Tipo de margem desconhecido: {tipo_margem}")
+    if tipo_margem == "margem" and margem >= 100:
+        raise ValueError("A margem sobre o preço de venda deve ser menor que 100%.")
+    if custo_tecido is not None and custo_tecido not in TIPOS_CUSTO_TECIDO:
+        raise ValueError(f"Custo de tecido desconhecido: {custo_tecido}")
+
+    with conexao(escrita=True) as conn:
+        if custo_tecido is None:
+            custo_tecido = carregar_configuracoes()["custo_tecido"]
+        conn.execute("DELETE FROM configuracoes")
+        conn.execute("""
+            INSERT INTO configuracoes (id, valor_hora, margem_lucro, tipo_margem, custo_tecido)
+            VALUES (1, ?, ?, ?, ?)
+        """, (valor_hora, margem, tipo_margem, custo_tecido))
+        repreciar_pecas()
+
+
+@_em_cache("configuracoes")
 def carregar_configuracoes():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT valor_hora, margem_lucro FROM configuracoes WHERE id=1")
-    row = cur.fetchone()
-    conn.close()
+    with conexao() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT valor_hora, margem_lucro, tipo_margem, custo_tecido FROM configuracoes WHERE id=1")
+        row = cur.fetchone()
     if row:
-        return {"valor_hora": row[0], "margem": row[1]}
-    return {"valor_hora": 0, "margem": 0}
+        return {"valor_hora": row[0], "margem": row[1], "tipo_margem": row[2], "custo_tecido": row[3]}
+    return dict(_CONFIGURACAO_PADRAO)
+
+
+# ===========================================
+#  FUNÇÕES — CATEGORIAS (custos indiretos)
+# ===========================================
+@_em_cache("categorias")
+def listar_categorias():
+    """[(nome, percentual_indireto, valor_indireto)] em ordem de nome."""
+    with conexao() as conn:
+        return conn.execute("""
+            SELECT nome, percentual_indireto, valor_indireto
+            FROM categorias ORDER BY nome
+        """).fetchall()
+
+
+@_escrita("categorias", "pecas")
+def salvar_categoria(nome, percentual_indireto=0.0, valor_indireto=0.0):
+    """Cria ou altera a categoria `nome`: custo indireto de
+    `percentual_indireto`% sobre o custo direto da peça mais `valor_indireto`
+    reais por peça. As peças da categoria (e os conjuntos que as usam) são
+    recalculadas na mesma transação."""
+    nome = nome.strip()
+    if not nome:
+        raise ValueError("O nome da categoria é obrigatório.")
+    if percentual_indireto < 0 or valor_indireto < 0:
+        raise ValueError("Custos indiretos não podem ser negativos.")
+
+    with conexao(escrita=True) as conn:
+        conn.execute("""
+            INSERT INTO categorias (nome, percentual_indireto, valor_indireto)
+            VALUES (?, ?, ?)
+            ON CONFLICT (nome) DO UPDATE SET
+                percentual_indireto = excluded.percentual_indireto,
+                valor_indireto = excluded.valor_indireto
+        """, (nome, percentual_indireto, valor_indireto))
+        repreciar_pecas(_pecas_da_categoria(conn, nome))
+
+
+@_escrita("categorias", "pecas")
+def excluir_categoria(nome):
+    """Exclui a categoria; as peças dela ficam sem categoria (sem custos
+    indiretos) e são recalculadas."""
+    with conexao(escrita=True) as conn:
+        afetadas = _pecas_da_categoria(conn, nome)
+        conn.execute("UPDATE pecas SET categoria=NULL WHERE categoria=?", (nome,))
+        conn.execute("DELETE FROM categorias WHERE nome=?", (nome,))
+        repreciar_pecas(afetadas)
+
+
+def _pecas_da_categoria(conn, nome):
+    return [r[0] for r in conn.execute("SELECT id_peca FROM pecas WHERE categoria=?", (nome,))]
+
+
+@_em_cache("configuracoes", "categorias")
+def regras_preco():
+    """Configuração de preço (carregar_configuracoes) e os custos indiretos
+    por categoria em "indiretos": {categoria: (percentual, valor_fixo)}.
+    Lida uma vez e mantida em cache até a próxima gravação."""
+    regras = dict(carregar_configuracoes())
+    regras["indiretos"] = {nome: (pct, fixo) for nome, pct, fixo in listar_categorias()}
+    return regras
 
 
 # ===========================================
 #  FUNÇÕES — PEÇAS
 # ===========================================
+@_em_cache("pecas")
 def listar_pecas():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id_peca, nome_peca, tempo_producao_horas, preco_sugerido
-        FROM pecas ORDER BY nome_peca ASC
-    """)
-    rows = cur.fetchall()
-    conn.close()
+    with conexao() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id_peca, nome_peca, tempo_producao_horas, preco_sugerido
+            FROM pecas ORDER BY nome_peca ASC
+        """)
+        rows = cur.fetchall()
     return rows
 
 
+@_em_cache("pecas")
 def get_peca(peca_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id_peca, nome_peca, tempo_producao_horas, preco_sugerido
-        FROM pecas WHERE id_peca=?
-    """, (peca_id,))
-    row = cur.fetchone()
-    conn.close()
+    with conexao() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id_peca, nome_peca, tempo_producao_horas, preco_sugerido, categoria
+            FROM pecas WHERE id_peca=?
+        """, (peca_id,))
+        row = cur.fetchone()
     if row:
         return {
             "id_peca": row[0],
             "nome_peca": row[1],
             "tempo_producao_horas": row[2],
-            "preco_sugerido": row[3]
+            "preco_sugerido": row[3],
+            "categoria": row[4]
         }
     return None
 
 
+@_escrita("pecas")
 def inserir_peca(nome, tempo):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO pecas (nome_peca, tempo_producao_horas)
-        VALUES (?, ?)
-    """, (nome, tempo))
-    conn.commit()
-    new_id = cur.lastrowid
-    conn.close()
+    with conexao(escrita=True) as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO pecas (nome_peca, tempo_producao_horas)
+            VALUES (?, ?)
+        """, (nome, tempo))
+        new_id = cur.lastrowid
     return new_id
 
 
+@_escrita("pecas")
 def atualizar_peca(peca_id, nome, tempo):
-    conn = get_connection()
-    conn.execute("""
-        UPDATE pecas
-        SET nome_peca=?, tempo_producao_horas=?
-        WHERE id_peca=?
-    """, (nome, tempo, peca_id))
-    conn.commit()
-    conn.close()
+    with conexao(escrita=True) as conn:
+        conn.execute("""
+            UPDATE pecas
+            SET nome_peca=?, tempo_producao_horas=?
+            WHERE id_peca=?
+        """, (nome, tempo, peca_id))
+        # as horas entram no custo pela mão de obra
+        repreciar_pecas([peca_id])
 
 
+@_escrita("pecas", "pecas_materiais", "pecas_tecidos", "pecas_componentes")
 def excluir_peca(peca_id):
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Apagar relações com materiais
-    cur.execute("DELETE FROM pecas_materiais WHERE peca_id=?", (peca_id,))
+    with conexao(escrita=True) as conn:
+        cur = conn.cursor()
+        afetadas = _ancestrais(conn, [peca_id])
 
-    # Apagar relações com tecidos
-    cur.execute("DELETE FROM pecas_tecidos WHERE peca_id=?", (peca_id,))
+        # Apagar relações com materiais
+        cur.execute("DELETE FROM pecas_materiais WHERE peca_id=?", (peca_id,))
 
-    # Apagar a peça
-    cur.execute("DELETE FROM pecas WHERE id_peca=?", (peca_id,))
+        # Apagar relações com tecidos
+        cur.execute("DELETE FROM pecas_tecidos WHERE peca_id=?", (peca_id,))
 
-    conn.commit()
-    conn.close()
+        # Apagar subconjuntos dela e o seu uso como subconjunto de outras
+        cur.execute("DELETE FROM pecas_componentes WHERE peca_id=? OR componente_id=?", (peca_id, peca_id))
 
+        # Apagar a peça
+        cur.execute("DELETE FROM pecas WHERE id_peca=?", (peca_id,))
 
+        # Conjuntos que usavam a peça ficam mais baratos
+        repreciar_pecas(afetadas)
 
 
+@_escrita("pecas")
 def salvar_preco_sugerido(peca_id, preco):
-    conn = get_connection()
-    conn.execute("""
-        UPDATE pecas SET preco_sugerido=? WHERE id_peca=?
-    """, (preco, peca_id))
-    conn.commit()
-    conn.close()
+    with conexao(escrita=True) as conn:
+        conn.execute("""
+            UPDATE pecas SET preco_sugerido=? WHERE id_peca=?
+        """, (preco, peca_id))
 
 
 # ===============================================
 # Relações N-N entre peças, materiais e tecidos
 # ===============================================
+@_em_cache("pecas_materiais", "materiais")
 def materiais_da_peca(peca_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT pm.material_id, pm.quantidade_usada, m.nome_material
-        FROM pecas_materiais pm
-        JOIN materiais m ON pm.material_id = m.id_material
-        WHERE pm.peca_id=?
-    """, (peca_id,))
-    rows = cur.fetchall()
-    conn.close()
+    with conexao() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT pm.material_id, pm.quantidade_usada, m.nome_material
+            FROM pecas_materiais pm
+            JOIN materiais m ON pm.material_id = m.id_material
+            WHERE pm.peca_id=?
+        """, (peca_id,))
+        rows = cur.fetchall()
     return rows
 
 
+@_em_cache("pecas_tecidos", "tecidos")
 def tecidos_da_peca(peca_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT pt.tecido_id, pt.area_usada_cm2, t.nome_tecido
-        FROM pecas_tecidos pt
-        JOIN tecidos t ON pt.tecido_id = t.id_tecido
-        WHERE pt.peca_id=?
-    """, (peca_id,))
-    rows = cur.fetchall()
-    conn.close()
+    """[(tecido_id, area_usada_cm2, nome_tecido, comprimento_cm, largura_cm, cortes)];
+    as medidas do molde são None em relações gravadas só com a área."""
+    with conexao() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT pt.tecido_id, pt.area_usada_cm2, t.nome_tecido, pt.comprimento_cm, pt.largura_cm, pt.cortes
+            FROM pecas_tecidos pt
+            JOIN tecidos t ON pt.tecido_id = t.id_tecido
+            WHERE pt.peca_id=?
+        """, (peca_id,))
+        rows = cur.fetchall()
     return rows
 
 
+@_em_cache("pecas_componentes", "pecas")
+def componentes_da_peca(peca_id):
+    """Subconjuntos usados diretamente na peça: [(componente_id, quantidade, nome_peca)]."""
+    with conexao() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT pc.componente_id, pc.quantidade, p.nome_peca
+            FROM pecas_componentes pc
+            JOIN pecas p ON pc.componente_id = p.id_peca
+            WHERE pc.peca_id=?
+        """, (peca_id,))
+        rows = cur.fetchall()
+    return rows
+
+
+@_escrita("pecas_materiais", "pecas_tecidos", "pecas_componentes")
 def limpar_relacoes_peca(peca_id):
-    conn = get_connection()
-    conn.execute("DELETE FROM pecas_materiais WHERE peca_id=?", (peca_id,))
-    conn.execute("DELETE FROM pecas_tecidos WHERE peca_id=?", (peca_id,))
-    conn.commit()
-    conn.close()
+    with conexao(escrita=True) as conn:
+        conn.execute("DELETE FROM pecas_materiais WHERE peca_id=?", (peca_id,))
+        conn.execute("DELETE FROM pecas_tecidos WHERE peca_id=?", (peca_id,))
+        conn.execute("DELETE FROM pecas_componentes WHERE peca_id=?", (peca_id,))
 
 
+@_escrita("pecas_materiais")
 def adicionar_material_na_peca(peca_id, material_id, qtd):
-    conn = get_connection()
-    conn.execute("""
-        INSERT INTO pecas_materiais (peca_id, material_id, quantidade_usada)
-        VALUES (?, ?, ?)
-    """, (peca_id, material_id, qtd))
-    conn.commit()
-    conn.close()
+    with conexao(escrita=True) as conn:
+        conn.execute("""
+            INSERT INTO pecas_materiais (peca_id, material_id, quantidade_usada)
+            VALUES (?, ?, ?)
+        """, (peca_id, material_id, qtd))
 
 
+@_escrita("pecas_tecidos")
 def adicionar_tecido_na_peca(peca_id, tecido_id, area):
-    conn = get_connection()
-    conn.execute("""
-        INSERT INTO pecas_tecidos (peca_id, tecido_id, area_usada_cm2)
-        VALUES (?, ?, ?)
-    """, (peca_id, tecido_id, area))
-    conn.commit()
-    conn.close()
+    with conexao(escrita=True) as conn:
+        conn.execute("""
+            INSERT INTO pecas_tecidos (peca_id, tecido_id, area_usada_cm2)
+            VALUES (?, ?, ?)
+        """, (peca_id, tecido_id, area))
+
+
+def _verificar_ciclo(conn, peca_id, componente_ids):
+    """ValueError se usar componente_ids na peça a tornaria componente de si
+    mesma (diretamente ou por algum subconjunto)."""
+    for lote in _lotes(componente_ids):
+        valores = ",".join(["(?)"] * len(lote))
+        ciclo = conn.execute(f"""
+            WITH RECURSIVE descendentes(id) AS (
+                VALUES {valores}
+                UNION
+                SELECT pc.componente_id
+                FROM pecas_componentes pc JOIN descendentes d ON pc.peca_id = d.id
+            )
+            SELECT 1 FROM descendentes WHERE id = ? LIMIT 1
+        """, (*lote, peca_id)).fetchone()
+        if ciclo:
+            raise ValueError("Uma peça não pode ser componente de si mesma (nem de um dos seus componentes).")
+
+
+@_escrita("pecas_componentes")
+def adicionar_componente_na_peca(peca_id, componente_id, qtd):
+    if qtd <= 0:
+        raise ValueError("A quantidade do componente deve ser maior que zero.")
+    with conexao(escrita=True) as conn:
+        _verificar_ciclo(conn, peca_id, [componente_id])
+        conn.execute("""
+            INSERT INTO pecas_componentes (peca_id, componente_id, quantidade)
+            VALUES (?, ?, ?)
+        """, (peca_id, componente_id, qtd))
 
 
 # ===============================================
 # Cálculo completo de custos e preço sugerido
 # ===============================================
-def compute_peca_cost(peca_id):
-    peca = get_peca(peca_id)
-    if not peca:
-        return None
-
-    # Carregar configs (mesmo que não sejam usadas)
-    cfg = carregar_configuracoes()
-    valor_hora = cfg["valor_hora"]   # ignorado pelo novo cálculo
-    margem = cfg["margem"]           # ignorado pelo novo cálculo
-
-    # Materiais e tecidos utilizados
-    materiais = materiais_da_peca(peca_id)
-    tecidos = tecidos_da_peca(peca_id)
-
-    custo_materiais = 0
-    custo_tecidos = 0
-
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Cálculo do custo dos materiais
-    for mid, qtd, nome in materiais:
-        cur.execute("SELECT custo_total, quantidade_adquirida FROM materiais WHERE id_material=?", (mid,))
-        ctotal, qadq = cur.fetchone()
-        custo_materiais += (ctotal / qadq) * qtd
-
-    # Cálculo do custo dos tecidos
-    for tid, area, nome in tecidos:
-        cur.execute("SELECT custo_total, comprimento_total, largura_total FROM tecidos WHERE id_tecido=?", (tid,))
-        ctotal, comp, larg = cur.fetchone()
-        area_total = comp * larg
-        custo_tecidos += (ctotal / area_total) * area
-
-    # 1️⃣ NOVA FÓRMULA — SEM MÃO DE OBRA
-    custo_total = custo_materiais + custo_tecidos
-
-    # 2️⃣ NOVA FÓRMULA — PREÇO SUGERIDO
-    preco_sugerido = custo_total / 0.44 if custo_total > 0 else 0
-
-    return {
-        "custo_materiais": custo_materiais,
-        "custo_tecidos": custo_tecidos,
-        "custo_mao_de_obra": 0,   # não usado mais, mantido para compatibilidade visual
-        "custo_total": custo_total,
-        "preco_sugerido": preco_sugerido,
-    }
+# Limite de parâmetros por consulta ao filtrar por lista de ids
+_LOTE_IDS = 500
+
+
+def _lotes(ids, tamanho=_LOTE_IDS):
+    ids = list(ids)
+    for i in range(0, len(ids), tamanho):
+        yield ids[i:i + tamanho]
+
+
+def fator_preco(regras):
+    """Preço sugerido = custo total × fator_preco(regras_preco())."""
+    if regras["tipo_margem"] == "margem":
+        return 1 / (1 - regras["margem"] / 100)
+    return 1 + regras["margem"] / 100
+
+
+def _preco_sugerido(custo_total, fator):
+    return custo_total * fator if custo_total > 0 else 0
+
+
+def _consultar_por_peca(cur, sql, peca_ids, params=()):
+    """Linhas de `sql` para todas as peças ou, em lotes, apenas para as
+    peças informadas ({filtro} vira o WHERE em pm.peca_id). `params` vêm
+    antes dos ids na consulta."""
+    if peca_ids is None:
+        yield from cur.execute(sql.format(filtro=""), params)
+        return
+
+    for lote in _lotes(peca_ids):
+        marcadores = ",".join("?" * len(lote))
+        yield from cur.execute(sql.format(filtro=f"WHERE pm.peca_id IN ({marcadores})"), (*params, *lote))
+
+
+def _somar_custos_por_peca(cur, sql, peca_ids, params=()):
+    """Executa uma consulta agregada (peca_id, custo) e retorna {peca_id: custo}."""
+    return dict(_consultar_por_peca(cur, sql, peca_ids, params))
+
+
+def _custos_tecidos_encaixe(cur, peca_ids, params, historico):
+    """Custo dos tecidos pelo comprimento de rolo consumido: os cortes de
+    cada tecido na peça são encaixados na largura do rolo (encaixe.py) e
+    paga-se comprimento × largura inteira. Relações sem medidas do molde, ou
+    cujo molde não cabe mais no rolo, ficam no custo por área."""
+    custo, _ = _CUSTO_TECIDO[historico]
+    encaixes, custos = {}, {}
+    for peca_id, area, comprimento, largura, cortes, custo_cm2, largura_rolo in _consultar_por_peca(cur, f"""
+        SELECT pm.peca_id, pm.area_usada_cm2, pm.comprimento_cm, pm.largura_cm, pm.cortes,
+               {custo}, t.largura_total
+        FROM pecas_tecidos pm
+        JOIN tecidos t ON pm.tecido_id = t.id_tecido
+        {{filtro}}
+    """, peca_ids, params):
+        area_consumida = area
+        if comprimento and largura and largura_rolo:
+            chave = (comprimento, largura, cortes, largura_rolo)
+            if chave not in encaixes:
+                try:
+                    encaixes[chave] = encaixar([(comprimento, largura)] * cortes, largura_rolo)["area_consumida"]
+                except ValueError:
+                    encaixes[chave] = None
+            area_consumida = encaixes[chave] or area
+        custos[peca_id] = custos.get(peca_id, 0) + area_consumida * (custo_cm2 or 0)
+    return custos
+
+
+def _instante(em):
+    """Normaliza `em` (date, datetime ou texto ISO) para o formato de
+    registrado_em. Uma data sem hora vale até o fim do dia."""
+    if isinstance(em, datetime.datetime):
+        return em.strftime("%Y-%m-%d %H:%M:%S.%f")[:23]
+    if isinstance(em, datetime.date):
+        return f"{em.isoformat()} 23:59:59.999"
+    return str(em)
+
+
+# Custo unitário vigente: o atual ou, com `em`, o do histórico naquela data
+# (última linha até a data, achada direto no índice (item_id, registrado_em))
+_CUSTO_MATERIAL = {
+    False: ("m.custo_unitario", "JOIN materiais m ON pm.material_id = m.id_material"),
+    True: ("""(SELECT h.custo_unitario FROM historico_materiais h
+               WHERE h.material_id = pm.material_id AND h.registrado_em <= ?
+               ORDER BY h.registrado_em DESC, h.id DESC LIMIT 1)""", ""),
+}
+_CUSTO_TECIDO = {
+    False: ("t.custo_cm2", "JOIN tecidos t ON pm.tecido_id = t.id_tecido"),
+    True: ("""(SELECT h.custo_cm2 FROM historico_tecidos h
+               WHERE h.tecido_id = pm.tecido_id AND h.registrado_em <= ?
+               ORDER BY h.registrado_em DESC, h.id DESC LIMIT 1)""", ""),
+}
+
+
+def _arestas_componentes(cur, peca_ids):
+    """Relações (peça, componente, quantidade) alcançáveis a partir de
+    peca_ids (todas, se None), consultando cada peça uma única vez."""
+    if peca_ids is None:
+        return cur.execute("SELECT peca_id, componente_id, quantidade FROM pecas_componentes").fetchall()
+
+    arestas, vistas, fronteira = [], set(peca_ids), list(peca_ids)
+    while fronteira:
+        proxima = []
+        for lote in _lotes(fronteira):
+            marcadores = ",".join("?" * len(lote))
+            cur.execute(f"""
+                SELECT peca_id, componente_id, quantidade
+                FROM pecas_componentes WHERE peca_id IN ({marcadores})
+            """, lote)
+            for aresta in cur.fetchall():
+                arestas.append(aresta)
+                if aresta[1] not in vistas:
+                    vistas.add(aresta[1])
+                    proxima.append(aresta[1])
+        fronteira = proxima
+    return arestas
+
+
+def _custos_componentes(custo_total, arestas, ids):
+    """Custo dos subconjuntos de cada peça: Σ quantidade × custo total do
+    componente, onde o custo total do componente inclui os seus próprios
+    subconjuntos. custo_total(peca_id, custo_componentes) dá o custo total
+    de uma peça a partir do custo dos seus subconjuntos.
+
+    Percorre a hierarquia em pós-ordem com memoização: cada peça é calculada
+    uma vez, mesmo quando aparece em vários conjuntos, então o custo é
+    linear em peças + relações. Retorna {peca_id: custo_componentes}.
+    """
+    filhos = {}
+    for pai, filho, qtd in arestas:
+        filhos.setdefault(pai, []).append((filho, qtd))
+
+    total, componentes = {}, {}
+    for raiz in ids:
+        if raiz in total:
+            continue
+        pilha, em_andamento = [(raiz, False)], set()
+        while pilha:
+            peca, expandida = pilha.pop()
+            if expandida:
+                componentes[peca] = sum(qtd * total[filho] for filho, qtd in filhos.get(peca, ()))
+                total[peca] = custo_total(peca, componentes[peca])
+                em_andamento.discard(peca)
+                continue
+            if peca in total:
+                continue
+            if peca in em_andamento:
+                raise ValueError(f"A composição da peça {peca} tem um ciclo.")
+            em_andamento.add(peca)
+            pilha.append((peca, True))
+            pilha.extend((filho, False) for filho, _ in filhos.get(peca, ()) if filho not in total)
+    return componentes
+
+
+def compute_costs_bulk(peca_ids=None, em=None, encaixe=None):
+    """Calcula o custo de várias peças (ou de todas, se peca_ids=None)
+    com poucas consultas agregadas, em vez de uma consulta por linha.
+
+    Peças com subconjuntos (pecas_componentes) somam o custo total de cada
+    componente × quantidade; cada subconjunto é calculado uma vez por chamada.
+
+    Com `em` (date, datetime ou texto 'AAAA-MM-DD[ HH:MM:SS]', UTC), usa os
+    custos de materiais e tecidos vigentes naquela data, segundo o
+    histórico; a composição das peças é a atual.
+
+    Com encaixe=True o tecido é custeado pelo comprimento de rolo que os
+    moldes consomem (encaixados na largura do rolo), não só pela área;
+    encaixe=None segue o custo_tecido das regras (o dos preços gravados).
+
+    Mão de obra, custos indiretos e margem seguem regras_preco() (as regras
+    atuais, também com `em`):
+
+        direto = materiais + tecidos + subconjuntos + horas × valor_hora
+        indireto = direto × percentual da categoria + valor fixo da categoria
+        custo_total = direto + indireto
+        preco_sugerido = custo_total × fator_preco(regras)
+
+    Retorna {peca_id: detalhamento} no mesmo formato de compute_peca_cost.
+    """
+    historico = em is not None
+    params = (_instante(em),) if historico else ()
+    # fora da transação, a leitura das regras vem do cache
+    regras = regras_preco()
+    if encaixe is None:
+        encaixe = regras["custo_tecido"] == "encaixe"
+    with conexao() as conn:
+        cur = conn.cursor()
+
+        if peca_ids is None:
+            cur.execute("SELECT id_peca FROM pecas")
+            ids = [r[0] for r in cur.fetchall()]
+        else:
+            ids = []
+            for lote in _lotes(set(peca_ids)):
+                marcadores = ",".join("?" * len(lote))
+                cur.execute(f"SELECT id_peca FROM pecas WHERE id_peca IN ({marcadores})", lote)
+                ids.extend(r[0] for r in cur.fetchall())
+            peca_ids = ids
+
+        # Subconjuntos: os custos próprios precisam cobrir toda a hierarquia
+        arestas = _arestas_componentes(cur, peca_ids)
+        if peca_ids is not None and arestas:
+            peca_ids = list(set(peca_ids).union(filho for _, filho, _ in arestas))
+
+        # Horas de produção e categoria (custos indiretos) de cada peça
+        dados_pecas = {peca_id: (horas, categoria) for peca_id, horas, categoria in _consultar_por_peca(cur, """
+            SELECT pm.peca_id, pm.tempo_producao_horas, pm.categoria
+            FROM (SELECT id_peca AS peca_id, tempo_producao_horas, categoria FROM pecas) pm
+            {filtro}
+        """, peca_ids)}
+
+        # Custo dos materiais: custo unitário materializado * quantidade usada
+        custo, join = _CUSTO_MATERIAL[historico]
+        custos_materiais = _somar_custos_por_peca(cur, f"""
+            SELECT pm.peca_id,
+                   SUM({custo} * pm.quantidade_usada)
+            FROM pecas_materiais pm
+            {join}
+            {{filtro}}
+            GROUP BY pm.peca_id
+        """, peca_ids, params)
+
+        # Custo dos tecidos: custo por cm² materializado * área usada
+        custo, join = _CUSTO_TECIDO[historico]
+        if encaixe:
+            custos_tecidos = _custos_tecidos_encaixe(cur, peca_ids, params, historico)
+        else:
+            custos_tecidos = _somar_custos_por_peca(cur, f"""
+                SELECT pm.peca_id,
+                       SUM({custo} * pm.area_usada_cm2)
+                FROM pecas_tecidos pm
+                {join}
+                {{filtro}}
+                GROUP BY pm.peca_id
+            """, peca_ids, params)
+
+    valor_hora, indiretos, fator = regras["valor_hora"], regras["indiretos"], fator_preco(regras)
+
+    def detalhar(peca_id, custo_componentes):
+        horas, categoria = dados_pecas.get(peca_id, (0, None))
+        custo_materiais = custos_materiais.get(peca_id) or 0
+        custo_tecidos = custos_tecidos.get(peca_id) or 0
+        custo_mao_de_obra = (horas or 0) * valor_hora
+        direto = custo_materiais + custo_tecidos + custo_componentes + custo_mao_de_obra
+        percentual, valor_fixo = indiretos.get(categoria, (0, 0))
+        custo_indireto = direto * percentual / 100 + valor_fixo
+        custo_total = direto + custo_indireto
+        return {
+            "custo_materiais": custo_materiais,
+            "custo_tecidos": custo_tecidos,
+            "custo_componentes": custo_componentes,
+            "custo_mao_de_obra": custo_mao_de_obra,
+            "custo_indireto": custo_indireto,
+            "custo_total": custo_total,
+            "preco_sugerido": _preco_sugerido(custo_total, fator),
+        }
+
+    custos_componentes = {}
+    if arestas:
+        custos_componentes = _custos_componentes(
+            lambda peca_id, componentes: detalhar(peca_id, componentes)["custo_total"], arestas, ids)
+    return {peca_id: detalhar(peca_id, custos_componentes.get(peca_id, 0)) for peca_id in ids}
+
+
+def compute_peca_cost(peca_id, em=None, encaixe=None):
+    return compute_costs_bulk([peca_id], em, encaixe).get(peca_id)
+
+
+# ===============================================
+# Consumo de tecido de um lote de produção
+# ===============================================
+def _explodir_quantidades(cur, pecas):
+    """Quantidade total de cada peça, incluindo os subconjuntos, para
+    produzir `pecas` ({peca_id: quantidade}). Cada peça é somada só depois
+    de todos os conjuntos que a usam (ordem topológica)."""
+    arestas = _arestas_componentes(cur, list(pecas))
+    filhos, pendentes = {}, {}
+    for pai, filho, qtd in arestas:
+        filhos.setdefault(pai, []).append((filho, qtd))
+        pendentes[filho] = pendentes.get(filho, 0) + 1
+
+    total = dict(pecas)
+    prontas = [p for p in total if not pendentes.get(p)]
+    while prontas:
+        peca = prontas.pop()
+        for filho, qtd in filhos.get(peca, ()):
+            total[filho] = total.get(filho, 0) + total[peca] * qtd
+            pendentes[filho] -= 1
+            if not pendentes[filho]:
+                prontas.append(filho)
+    return total
+
+
+def explodir_quantidades(pecas):
+    """Quantidade total de cada peça para produzir `pecas` ({peca_id:
+    quantidade}), somando as dos subconjuntos em todos os níveis."""
+    with conexao() as conn:
+        return _explodir_quantidades(conn.cursor(), pecas)
+
+
+def consumo_tecidos(pecas, rotacionar=True):
+    """Encaixa juntos, por tecido, todos os cortes de um lote de produção
+    ({peca_id: quantidade}, subconjuntos incluídos) e retorna
+    {tecido_id: consumo}, com consumo = {"nome_tecido", "largura_rolo",
+    "cortes", "comprimento_cm", "area_moldes", "desperdicio", "metodo",
+    "custo_encaixe", "custo_area"}.
+
+    custo_encaixe paga o comprimento de rolo consumido na largura inteira;
+    custo_area é o custo proporcional à área dos moldes. Relações sem
+    medidas do molde entram como uma faixa de área igual à usada, assim
+    como as de moldes que não cabem na largura do rolo; os ids dessas
+    peças ficam em consumo["nao_cabem"].
+    """
+    with conexao() as conn:
+        cur = conn.cursor()
+        quantidades = {p: q for p, q in _explodir_quantidades(cur, pecas).items() if q > 0}
+        cortes, sem_medidas, nao_cabem, tecidos = {}, {}, {}, {}
+        for peca_id, tid, area, comprimento, largura, n_cortes, nome, largura_rolo, custo_cm2 in _consultar_por_peca(
+            cur, """
+                SELECT pm.peca_id, pm.tecido_id, pm.area_usada_cm2, pm.comprimento_cm, pm.largura_cm,
+                       pm.cortes, t.nome_tecido, t.largura_total, t.custo_cm2
+                FROM pecas_tecidos pm
+                JOIN tecidos t ON pm.tecido_id = t.id_tecido
+                {filtro}
+            """, quantidades):
+            tecidos[tid] = (nome, largura_rolo, custo_cm2 or 0)
+            # fração de peça (ex.: 0,5 subconjunto por conjunto) ainda exige um corte inteiro
+            qtd = math.ceil(quantidades[peca_id] - 1e-9)
+            if comprimento and largura and cabe((comprimento, largura), largura_rolo, rotacionar):
+                cortes.setdefault(tid, []).extend([(comprimento, largura)] * (n_cortes * qtd))
+            else:
+                if comprimento and largura:
+                    nao_cabem.setdefault(tid, []).append(peca_id)
+                sem_medidas[tid] = sem_medidas.get(tid, 0) + area * qtd
+
+    resultado = {}
+    for tid, (nome, largura_rolo, custo_cm2) in tecidos.items():
+        encaixe = encaixar(cortes.get(tid, []), largura_rolo, rotacionar)
+        area_livre = sem_medidas.get(tid, 0)
+        comprimento = encaixe["comprimento"] + area_livre / largura_rolo
+        area_moldes = encaixe["area_moldes"] + area_livre
+        resultado[tid] = {
+            "nome_tecido": nome,
+            "largura_rolo": largura_rolo,
+            "cortes": len(cortes.get(tid, [])),
+            "comprimento_cm": comprimento,
+            "area_moldes": area_moldes,
+            "desperdicio": 1 - area_moldes / (comprimento * largura_rolo) if comprimento else 0.0,
+            "metodo": encaixe["metodo"],
+            "custo_encaixe": comprimento * largura_rolo * custo_cm2,
+            "custo_area": area_moldes * custo_cm2,
+            "nao_cabem": sorted(nao_cabem.get(tid, [])),
+        }
+    return resultado
+
+
+# ===============================================
+# Recálculo de preços (propagação de custos)
+# ===============================================
+_RELACOES = {
+    "material": ("pecas_materiais", "material_id"),
+    "tecido": ("pecas_tecidos", "tecido_id"),
+}
+
+
+def _pecas_que_usam(conn, tipo, item_id):
+    tabela, coluna = _RELACOES[tipo]
+    cur = conn.execute(f"SELECT DISTINCT peca_id FROM {tabela} WHERE {coluna}=?", (item_id,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def _ancestrais(conn, peca_ids):
+    """Peças que usam alguma de peca_ids como subconjunto, em qualquer nível."""
+    encontradas, fronteira = set(), list(peca_ids)
+    while fronteira:
+        proxima = []
+        for lote in _lotes(fronteira):
+            marcadores = ",".join("?" * len(lote))
+            cur = conn.execute(f"""
+                SELECT DISTINCT peca_id FROM pecas_componentes WHERE componente_id IN ({marcadores})
+            """, lote)
+            for (pai,) in cur.fetchall():
+                if pai not in encontradas:
+                    encontradas.add(pai)
+                    proxima.append(pai)
+        fronteira = proxima
+    return encontradas
+
+
+def _repreciar(conn, peca_ids, ancestrais):
+    """repreciar_pecas dentro da transação de `conn`; retorna os custos
+    (compute_costs_bulk) das peças gravadas."""
+    if peca_ids is not None and ancestrais:
+        peca_ids = set(peca_ids) | _ancestrais(conn, peca_ids)
+    # o tecido pela área ou pelo encaixe, conforme o custo_tecido das regras
+    custos = compute_costs_bulk(peca_ids, encaixe=None)
+    conn.executemany(
+        "UPDATE pecas SET preco_sugerido=? WHERE id_peca=?",
+        [(c["preco_sugerido"], peca_id) for peca_id, c in custos.items()],
+    )
+    return custos
+
+
+@_escrita("pecas")
+def repreciar_pecas(peca_ids=None, ancestrais=True):
+    """Recalcula e grava o preco_sugerido das peças informadas (ou de todas,
+    se peca_ids=None) num único lote. Com ancestrais=True inclui as peças
+    que usam alguma delas como subconjunto. Retorna quantas peças foram
+    gravadas."""
+    if peca_ids is not None and not peca_ids:
+        return 0
+
+    with conexao(escrita=True) as conn:
+        return len(_repreciar(conn, peca_ids, ancestrais))
+
+
+def repreciar_catalogo(lote=2000, progresso=None, trabalhadores=1):
+    """Recalcula o preço de todas as peças em lotes de `lote` peças, cada um
+    na sua transação, chamando progresso(feitas, total) após cada lote.
+
+    Com trabalhadores > 1 (None = um por núcleo) e pelo menos
+    MINIMO_PARALELO peças, o cálculo é dividido por faixas de id entre
+    processos (_repreciar_paralelo), sem segurar o lock de escrita, e
+    gravado no fim numa única transação.
+
+    Retorna o total de peças recalculadas."""
+    if trabalhadores is None:
+        trabalhadores = os.cpu_count() or 1
+
+    with conexao() as conn:
+        ids = [r[0] for r in conn.execute("SELECT id_peca FROM pecas ORDER BY id_peca")]
+    if trabalhadores > 1 and len(ids) >= MINIMO_PARALELO:
+        return _repreciar_paralelo(trabalhadores, progresso)
+
+    feitas = 0
+    for ids_lote in _lotes(ids, lote):
+        feitas += repreciar_pecas(ids_lote, ancestrais=False)
+        if progresso:
+            progresso(feitas, len(ids))
+    return feitas
+
+
+# Repreciamento em vários processos: cada um calcula os preços de faixas de
+# id com a sua própria conexão só de leitura, sem lock nenhum; o processo
+# principal junta os resultados e só então abre a transação de escrita,
+# que grava tudo com um único UPDATE a partir de uma tabela temporária.
+FAIXAS_POR_TRABALHADOR = 4
+# Abaixo disso subir os processos (spawn) custa mais que o cálculo inteiro
+# em série; ver benchmarks/bench_paralelo.py
+MINIMO_PARALELO = 50_000
+# Cálculos descartados por terem sido alterados custos no meio antes de
+# desistir e repreciar em lotes (repreciar_catalogo com 1 processo)
+TENTATIVAS_PARALELO = 3
+# Tabelas que entram no cálculo do preço sugerido
+_TABELAS_PRECO = ("materiais", "tecidos", "pecas", "pecas_materiais", "pecas_tecidos",
+                  "pecas_componentes", "configuracoes", "categorias")
+_somente_leitura = False
+
+
+def _iniciar_trabalhador(caminho, desempenho):
+    global DB_PATH, _somente_leitura, _perfil_desempenho
+    DB_PATH = Path(caminho)
+    _somente_leitura = True
+    _perfil_desempenho = desempenho
+    # o processo principal já migrou o schema
+    _schemas_prontos.add(DB_PATH)
+
+
+def _precos_da_faixa(primeiro, ultimo):
+    with conexao() as conn:
+        ids = [r[0] for r in conn.execute(
+            "SELECT id_peca FROM pecas WHERE id_peca BETWEEN ? AND ?", (primeiro, ultimo))]
+        custos = compute_costs_bulk(ids)
+    return [(peca_id, c["preco_sugerido"]) for peca_id, c in custos.items()]
+
+
+def _faixas(ids, quantidade):
+    """Divide `ids` (ordenados) em até `quantidade` faixas [primeiro, último]
+    com o mesmo número de peças."""
+    tamanho = max(1, math.ceil(len(ids) / quantidade))
+    return [(ids[i], ids[min(i + tamanho, len(ids)) - 1]) for i in range(0, len(ids), tamanho)]
+
+
+def _versao_precos():
+    """Muda quando uma tabela do preço é alterada por esta aplicação ou
+    quando outro processo confirma qualquer escrita no banco (PRAGMA
+    data_version da vigia, _verificar_escritas_externas)."""
+    _verificar_escritas_externas()
+    with _cache_trava:
+        return (_versao_externa,) + tuple(_versoes_tabelas.get(t, 0) for t in _TABELAS_PRECO)
+
+
+def _calcular_precos_paralelo(trabalhadores, progresso=None):
+    with conexao() as conn:
+        ids = [r[0] for r in conn.execute("SELECT id_peca FROM pecas ORDER BY id_peca")]
+    faixas = _faixas(ids, trabalhadores * FAIXAS_POR_TRABALHADOR)
+
+    # spawn: o processo filho não herda conexões abertas nem locks de threads
+    contexto = multiprocessing.get_context("spawn")
+    precos = []
+    with ProcessPoolExecutor(trabalhadores, mp_context=contexto, initializer=_iniciar_trabalhador,
+                             initargs=(str(DB_PATH), _perfil_desempenho)) as executor:
+        for futuro in as_completed([executor.submit(_precos_da_faixa, *f) for f in faixas]):
+            precos.extend(futuro.result())
+            if progresso:
+                progresso(len(precos), len(ids))
+    return precos
+
+
+@_escrita("pecas")
+def _gravar_precos(precos, versao):
+    """Grava os preços calculados por _calcular_precos_paralelo, desde que
+    nenhum custo tenha mudado desde `versao` (_versao_precos). Retorna False,
+    sem gravar nada, se mudou."""
+    with conexao(escrita=True) as conn:
+        # com o lock de escrita na mão, ninguém mais (nem outro processo)
+        # altera custos até o COMMIT
+        if _versao_precos() != versao:
+            return False
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS precos_novos "
+                     "(id_peca INTEGER PRIMARY KEY, preco REAL NOT NULL)")
+        try:
+            conn.executemany("INSERT INTO temp.precos_novos (id_peca, preco) VALUES (?, ?)", precos)
+            # só as peças cujo preço mudou são regravadas (e entram no histórico)
+            conn.execute("""
+                UPDATE pecas SET preco_sugerido = n.preco
+                FROM temp.precos_novos n
+                WHERE n.id_peca = pecas.id_peca AND pecas.preco_sugerido IS NOT n.preco
+            """)
+        finally:
+            # a conexão volta ao pool: não deixar os preços na tabela temporária
+            conn.execute("DELETE FROM temp.precos_novos")
+    return True
+
+
+def _repreciar_paralelo(trabalhadores, progresso=None):
+    if getattr(_local, "conn", None) is not None:
+        # os processos não enxergam o que esta transação ainda não confirmou
+        raise RuntimeError("O repreciamento paralelo não pode rodar dentro de uma transação.")
+
+    # Um custo alterado durante o cálculo torna os preços calculados velhos:
+    # calcula de novo. Escritas de outros processos contam sempre como
+    # alteração, mesmo em tabelas que não entram no preço.
+    for _ in range(TENTATIVAS_PARALELO):
+        versao = _versao_precos()
+        precos = _calcular_precos_paralelo(trabalhadores, progresso)
+        if _gravar_precos(precos, versao):
+            return len(precos)
+    log.warning("Custos alterados durante o repreciamento paralelo; repreciando em lotes.")
+    return repreciar_catalogo(progresso=progresso)
+
+
+# ===============================================
+# Histórico de custos e preços
+# ===============================================
+def _historico(tabela, coluna_id, colunas, item_id, desde, ate):
+    filtros, params = [f"{coluna_id}=?"], [item_id]
+    if desde is not None:
+        filtros.append("registrado_em >= ?")
+        # uma data sem hora vale desde o começo do dia
+        params.append(desde.isoformat() if type(desde) is datetime.date else _instante(desde))
+    if ate is not None:
+        filtros.append("registrado_em <= ?")
+        params.append(_instante(ate))
+    with conexao() as conn:
+        cur = conn.execute(f"""
+            SELECT registrado_em, {', '.join(colunas)}
+            FROM {tabela}
+            WHERE {' AND '.join(filtros)}
+            ORDER BY registrado_em, id
+        """, params)
+        return cur.fetchall()
+
+
+@_em_cache("materiais")
+def historico_material(material_id, desde=None, ate=None):
+    """[(registrado_em, custo_total, quantidade_adquirida, custo_unitario)]
+    em ordem cronológica, opcionalmente entre `desde` e `ate`."""
+    return _historico("historico_materiais", "material_id",
+                      ["custo_total", "quantidade_adquirida", "custo_unitario"], material_id, desde, ate)
+
+
+@_em_cache("tecidos")
+def historico_tecido(tecido_id, desde=None, ate=None):
+    """[(registrado_em, custo_total, comprimento_total, largura_total, custo_cm2)]."""
+    return _historico("historico_tecidos", "tecido_id",
+                      ["custo_total", "comprimento_total", "largura_total", "custo_cm2"], tecido_id, desde, ate)
+
+
+@_em_cache("pecas")
+def historico_preco(peca_id, desde=None, ate=None):
+    """Preços sugeridos gravados na peça: [(registrado_em, preco_sugerido)]."""
+    return _historico("historico_precos", "peca_id", ["preco_sugerido"], peca_id, desde, ate)
+
+
+@_em_cache("pecas", "materiais", "tecidos", "pecas_materiais", "pecas_tecidos", "pecas_componentes")
+def evolucao_custos(peca_id):
+    """Custo da peça (composição atual) recalculado em cada instante em que
+    mudou o custo de um dos seus materiais ou tecidos, inclusive os dos
+    subconjuntos: [(registrado_em, detalhamento)]."""
+    with conexao() as conn:
+        instantes = [r[0] for r in conn.execute("""
+            WITH RECURSIVE arvore(id) AS (
+                VALUES (?)
+                UNION
+                SELECT pc.componente_id FROM pecas_componentes pc JOIN arvore a ON pc.peca_id = a.id
+            )
+            SELECT h.registrado_em
+            FROM arvore a
+            JOIN pecas_materiais pm ON pm.peca_id = a.id
+            JOIN historico_materiais h ON h.material_id = pm.material_id
+            UNION
+            SELECT h.registrado_em
+            FROM arvore a
+            JOIN pecas_tecidos pt ON pt.peca_id = a.id
+            JOIN historico_tecidos h ON h.tecido_id = pt.tecido_id
+            ORDER BY 1
+        """, (peca_id,))]
+        return [(instante, compute_peca_cost(peca_id, instante)) for instante in instantes]
+
+
+# ===============================================
+# Salvamento completo da peça (uma transação)
+# ===============================================
+def _medidas_corte(uso):
+    """(area, comprimento, largura, cortes) a partir de uma área ou de
+    (comprimento, largura[, cortes])."""
+    if isinstance(uso, (int, float)):
+        return uso, None, None, 1
+    comprimento, largura, *resto = uso
+    cortes = int(resto[0]) if resto else 1
+    if comprimento <= 0 or largura <= 0 or cortes < 1:
+        raise ValueError("As medidas do molde e o número de cortes devem ser maiores que zero.")
+    return comprimento * largura * cortes, comprimento, largura, cortes
+
+
+def _verificar_largura_rolo(conn, tecidos):
+    """ValueError se algum molde não couber na largura do rolo em nenhuma orientação."""
+    com_medidas = {tid: uso for tid, uso in tecidos.items() if uso[1] is not None}
+    for lote in _lotes(com_medidas):
+        marcadores = ",".join("?" * len(lote))
+        cur = conn.execute(f"""
+            SELECT id_tecido, nome_tecido, largura_total FROM tecidos WHERE id_tecido IN ({marcadores})
+        """, lote)
+        for tid, nome, largura_rolo in cur.fetchall():
+            _, comprimento, largura, _ = com_medidas[tid]
+            if min(comprimento, largura) > largura_rolo:
+                raise ValueError(f"O molde {comprimento:g} × {largura:g} cm não cabe na largura "
+                                 f"do rolo de {nome} ({largura_rolo:g} cm).")
+
+
+@_escrita("pecas", "pecas_materiais", "pecas_tecidos", "pecas_componentes")
+def salvar_peca_completa(peca, materiais, tecidos, componentes=None):
+    """Salva a peça, seus materiais, tecidos e subconjuntos e o preço
+    sugerido (dela e das peças que a usam) numa única transação: ou tudo é
+    gravado, ou nada.
+
+    peca: {"id_peca": None para peça nova, "nome_peca", "tempo_producao_horas",
+    "categoria" (opcional; ausente mantém a atual, None tira a categoria)}
+    materiais: {material_id: quantidade_usada} ou pares equivalentes
+    tecidos: {tecido_id: area_usada_cm2 ou (comprimento_cm, largura_cm[, cortes])}
+    ou pares equivalentes; com as medidas, a área é comprimento × largura × cortes
+    componentes: {peca_id: quantidade} ou pares equivalentes; None mantém
+    os subconjuntos atuais
+
+    Retorna (peca_id, custos).
+    """
+    materiais = dict(materiais)
+    tecidos = {tid: _medidas_corte(uso) for tid, uso in dict(tecidos).items()}
+    if componentes is not None:
+        componentes = dict(componentes)
+        if any(qtd <= 0 for qtd in componentes.values()):
+            raise ValueError("A quantidade do componente deve ser maior que zero.")
+
+    with conexao(escrita=True) as conn:
+        cur = conn.cursor()
+        peca_id = peca.get("id_peca")
+
+        if peca.get("categoria") is not None:
+            cur.execute("SELECT 1 FROM categorias WHERE nome=?", (peca["categoria"],))
+            if cur.fetchone() is None:
+                raise ValueError(f"Categoria desconhecida: {peca['categoria']}")
+
+        if peca_id is None:
+            cur.execute("""
+                INSERT INTO pecas (nome_peca, tempo_producao_horas, categoria)
+                VALUES (?, ?, ?)
+            """, (peca["nome_peca"], peca["tempo_producao_horas"], peca.get("categoria")))
+            peca_id = cur.lastrowid
+        else:
+            cur.execute("""
+                UPDATE pecas
+                SET nome_peca=?, tempo_producao_horas=?
+                WHERE id_peca=?
+            """, (peca["nome_peca"], peca["tempo_producao_horas"], peca_id))
+            if "categoria" in peca:
+                cur.execute("UPDATE pecas SET categoria=? WHERE id_peca=?", (peca["categoria"], peca_id))
+
+        cur.execute("DELETE FROM pecas_materiais WHERE peca_id=?", (peca_id,))
+        cur.execute("DELETE FROM pecas_tecidos WHERE peca_id=?", (peca_id,))
+
+        cur.executemany("""
+            INSERT INTO pecas_materiais (peca_id, material_id, quantidade_usada)
+            VALUES (?, ?, ?)
+        """, [(peca_id, mid, qtd) for mid, qtd in materiais.items()])
+
+        _verificar_largura_rolo(conn, tecidos)
+        cur.executemany("""
+            INSERT INTO pecas_tecidos (peca_id, tecido_id, area_usada_cm2, comprimento_cm, largura_cm, cortes)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(peca_id, tid, *uso) for tid, uso in tecidos.items()])
+
+        if componentes is not None:
+            _verificar_ciclo(conn, peca_id, componentes)
+            cur.execute("DELETE FROM pecas_componentes WHERE peca_id=?", (peca_id,))
+            cur.executemany("""
+                INSERT INTO pecas_componentes (peca_id, componente_id, quantidade)
+                VALUES (?, ?, ?)
+            """, [(peca_id, cid, qtd) for cid, qtd in componentes.items()])
+
+        # a peça e os conjuntos que a usam
+        custos = _repreciar(conn, [peca_id], ancestrais=True)[peca_id]
+
+    return peca_id, custos
+
+
+# ===============================================
+# Estoque (razão de movimentos + saldos)
+# ===============================================
+TIPOS_MOVIMENTO = ("compra", "consumo", "ajuste")
+_ITENS_ESTOQUE = {
+    "material": ("materiais", "id_material", "nome_material"),
+    "tecido": ("tecidos", "id_tecido", "nome_tecido"),
+}
+
+
+def _movimento(item_tipo, item_id, tipo, quantidade, referencia=None):
+    """Valida um lançamento e devolve a linha com o sinal do razão: compra
+    soma, consumo (informado positivo) subtrai, ajuste vale com o sinal dado."""
+    if item_tipo not in _ITENS_ESTOQUE:
+        raise ValueError(f"Item de estoque desconhecido: {item_tipo}")
+    if tipo not in TIPOS_MOVIMENTO:
+        raise ValueError(f"Tipo de movimento desconhecido: {tipo}")
+    if tipo == "ajuste" and not quantidade:
+        raise ValueError("O ajuste não pode ser zero.")
+    if tipo != "ajuste" and quantidade <= 0:
+        raise ValueError("Compras e consumos são lançados com quantidade maior que zero.")
+    return item_tipo, item_id, tipo, -quantidade if tipo == "consumo" else quantidade, referencia
+
+
+@_escrita("movimentos_estoque", "saldos_estoque")
+def lancar_movimentos(movimentos):
+    """Lança [(item_tipo, item_id, tipo, quantidade[, referencia])] numa
+    única transação: todos ou nenhum. item_tipo é "material" ou "tecido" e
+    tipo é "compra", "consumo" ou "ajuste". Retorna quantos foram lançados."""
+    linhas = [_movimento(*m) for m in movimentos]
+    with conexao(escrita=True) as conn:
+        conn.executemany(f"""
+            INSERT INTO movimentos_estoque (item_tipo, item_id, tipo, quantidade, referencia, registrado_em)
+            VALUES (?, ?, ?, ?, ?, {_AGORA_SQL})
+        """, linhas)
+    return len(linhas)
+
+
+def lancar_movimento(item_tipo, item_id, tipo, quantidade, referencia=None):
+    return lancar_movimentos([(item_tipo, item_id, tipo, quantidade, referencia)])
+
+
+@_escrita("movimentos_estoque", "saldos_estoque")
+def abrir_estoque_pelas_compras():
+    """Lança como ajuste de saldo inicial a quantidade adquirida dos
+    materiais e o comprimento dos tecidos que ainda não têm saldo.
+    Retorna quantos itens foram abertos."""
+    with conexao(escrita=True) as conn:
+        total = 0
+        for item_tipo, quantidade in (("material", "quantidade_adquirida"), ("tecido", "comprimento_total")):
+            tabela, id_col, _ = _ITENS_ESTOQUE[item_tipo]
+            total += conn.execute(f"""
+                INSERT INTO movimentos_estoque (item_tipo, item_id, tipo, quantidade, referencia, registrado_em)
+                SELECT ?, {id_col}, 'ajuste', {quantidade}, 'saldo inicial', {_AGORA_SQL}
+                FROM {tabela}
+                WHERE {quantidade} > 0
+                  AND NOT EXISTS (SELECT 1 FROM saldos_estoque s WHERE s.item_tipo = ? AND s.item_id = {id_col})
+            """, (item_tipo, item_tipo)).rowcount
+    return total
+
+
+@_em_cache("saldos_estoque")
+def saldo_estoque(item_tipo, item_id):
+    with conexao() as conn:
+        row = conn.execute("SELECT saldo FROM saldos_estoque WHERE item_tipo=? AND item_id=?",
+                           (item_tipo, item_id)).fetchone()
+    return row[0] if row else 0.0
+
+
+@_em_cache("saldos_estoque", "materiais", "tecidos")
+def listar_estoque(item_tipo):
+    """[(item_id, nome, saldo)] de todos os materiais ou tecidos, em ordem de nome."""
+    tabela, id_col, nome_col = _ITENS_ESTOQUE[item_tipo]
+    with conexao() as conn:
+        return conn.execute(f"""
+            SELECT i.{id_col}, i.{nome_col}, COALESCE(s.saldo, 0)
+            FROM {tabela} i
+            LEFT JOIN saldos_estoque s ON s.item_tipo = ? AND s.item_id = i.{id_col}
+            ORDER BY i.{nome_col}
+        """, (item_tipo,)).fetchall()
+
+
+@_em_cache("movimentos_estoque")
+def extrato_estoque(item_tipo, item_id, limite=100):
+    """Últimos `limite` movimentos do item com o saldo após cada um:
+    [(registrado_em, tipo, quantidade, referencia, saldo)], do mais recente."""
+    with conexao() as conn:
+        return conn.execute("""
+            SELECT registrado_em, tipo, quantidade, referencia,
+                   SUM(quantidade) OVER (ORDER BY registrado_em, id)
+            FROM movimentos_estoque
+            WHERE item_tipo=? AND item_id=?
+            ORDER BY registrado_em DESC, id DESC
+            LIMIT ?
+        """, (item_tipo, item_id, limite)).fetchall()
+
+
+# Peças sem subconjuntos: o item que limita cada peça, numa consulta
+# agrupada por tipo de item que percorre o índice de peca_id da ficha
+# técnica. Com MIN(), o SQLite devolve as colunas soltas da linha do mínimo.
+_PRODUZIVEIS_SQL = {
+    "material": """
+        SELECT pm.peca_id, MIN(COALESCE(s.saldo, 0) / pm.quantidade_usada), pm.material_id
+        FROM pecas_materiais pm
+        LEFT JOIN saldos_estoque s ON s.item_tipo = 'material' AND s.item_id = pm.material_id
+        WHERE pm.quantidade_usada > 0
+        GROUP BY pm.peca_id
+    """,
+    "tecido": """
+        SELECT pm.peca_id, MIN(COALESCE(s.saldo, 0) * t.largura_total / pm.area_usada_cm2), pm.tecido_id
+        FROM pecas_tecidos pm
+        JOIN tecidos t ON t.id_tecido = pm.tecido_id
+        LEFT JOIN saldos_estoque s ON s.item_tipo = 'tecido' AND s.item_id = pm.tecido_id
+        WHERE pm.area_usada_cm2 > 0
+        GROUP BY pm.peca_id
+    """,
+}
+
+
+# Conjuntos: a árvore de cada um desce por pecas_componentes multiplicando
+# as quantidades (um subconjunto usado por dois caminhos aparece duas vezes
+# e soma as duas); a necessidade de cada item na árvore toda é comparada
+# com o saldo, lido uma vez por item. Tecido em cm de comprimento de rolo.
+_ARVORE_CONJUNTOS_SQL = """
+    WITH RECURSIVE arvore(conjunto, peca_id, quantidade) AS (
+        SELECT DISTINCT peca_id, peca_id, 1.0 FROM pecas_componentes
+        UNION ALL
+        SELECT a.conjunto, pc.componente_id, a.quantidade * pc.quantidade
+        FROM arvore a JOIN pecas_componentes pc ON pc.peca_id = a.peca_id
+    )
+"""
+_PRODUZIVEIS_CONJUNTOS_SQL = {
+    "material": _ARVORE_CONJUNTOS_SQL + """
+        SELECT n.conjunto, MIN(COALESCE(s.saldo, 0) / n.total), n.material_id
+        FROM (
+            SELECT a.conjunto, pm.material_id, SUM(pm.quantidade_usada * a.quantidade) AS total
+            FROM arvore a JOIN pecas_materiais pm ON pm.peca_id = a.peca_id
+            GROUP BY a.conjunto, pm.material_id
+        ) n
+        LEFT JOIN saldos_estoque s ON s.item_tipo = 'material' AND s.item_id = n.material_id
+        WHERE n.total > 0
+        GROUP BY n.conjunto
+    """,
+    "tecido": _ARVORE_CONJUNTOS_SQL + """
+        SELECT n.conjunto, MIN(COALESCE(s.saldo, 0) / n.total), n.tecido_id
+        FROM (
+            SELECT a.conjunto, pt.tecido_id, SUM(pt.area_usada_cm2 / t.largura_total * a.quantidade) AS total
+            FROM arvore a
+            JOIN pecas_tecidos pt ON pt.peca_id = a.peca_id
+            JOIN tecidos t ON t.id_tecido = pt.tecido_id
+            GROUP BY a.conjunto, pt.tecido_id
+        ) n
+        LEFT JOIN saldos_estoque s ON s.item_tipo = 'tecido' AND s.item_id = n.tecido_id
+        WHERE n.total > 0
+        GROUP BY n.conjunto
+    """,
+}
+
+
+@_em_cache("saldos_estoque", "materiais", "tecidos", "pecas", "pecas_materiais", "pecas_tecidos",
+           "pecas_componentes")
+def pecas_produziveis():
+    """Quantas unidades de cada peça o estoque atual permite produzir
+    (subconjuntos incluídos): {peca_id: (quantidade, nome do item que limita)}.
+    Peças sem ficha técnica ficam de fora."""
+    with conexao() as conn:
+        cur = conn.cursor()
+        nomes = {}
+        for item_tipo, (tabela, id_col, nome_col) in _ITENS_ESTOQUE.items():
+            nomes.update(((item_tipo, i), nome) for i, nome in cur.execute(f"SELECT {id_col}, {nome_col} FROM {tabela}"))
+
+        # a necessidade de um conjunto soma toda a árvore de subconjuntos,
+        # não só a ficha técnica própria
+        conjuntos = {r[0] for r in cur.execute("SELECT DISTINCT peca_id FROM pecas_componentes")}
+        limites = {}
+        for consultas, de_conjuntos in ((_PRODUZIVEIS_SQL, False), (_PRODUZIVEIS_CONJUNTOS_SQL, True)):
+            for item_tipo, sql in consultas.items():
+                for peca_id, maximo, item_id in cur.execute(sql):
+                    if (peca_id in conjuntos) != de_conjuntos or maximo is None:
+                        continue
+                    if peca_id not in limites or maximo < limites[peca_id][0]:
+                        limites[peca_id] = (maximo, (item_tipo, item_id))
+
+    return {peca_id: (max(0, math.floor(maximo + 1e-9)), nomes.get(chave))
+            for peca_id, (maximo, chave) in limites.items()}
+
+
+# ===============================================
+# Tarefas em segundo plano (executadas por tarefas.py)
+# ===============================================
+STATUS_ATIVOS = ("pendente", "executando")
+_COLUNAS_TAREFA = ("id", "tipo", "parametros", "status", "feitas", "total", "resultado", "erro",
+                   "criada_em", "iniciada_em", "concluida_em")
+
+
+def _tarefa(row):
+    tarefa = dict(zip(_COLUNAS_TAREFA, row))
+    tarefa["parametros"] = json.loads(tarefa["parametros"])
+    if tarefa["resultado"] is not None:
+        tarefa["resultado"] = json.loads(tarefa["resultado"])
+    return tarefa
+
+
+@_escrita("tarefas")
+def registrar_tarefa(tipo, parametros=None):
+    """Grava uma tarefa pendente deste processo e retorna o id. `parametros`
+    precisa ser serializável em JSON."""
+    with conexao(escrita=True) as conn:
+        cur = conn.execute(f"""
+            INSERT INTO tarefas (tipo, parametros, processo, criada_em)
+            VALUES (?, ?, ?, {_AGORA_SQL})
+        """, (tipo, json.dumps(parametros or {}), os.getpid()))
+        return cur.lastrowid
+
+
+@_escrita("tarefas")
+def iniciar_tarefa(tarefa_id):
+    with conexao(escrita=True) as conn:
+        conn.execute(f"""
+            UPDATE tarefas SET status='executando', iniciada_em={_AGORA_SQL}
+            WHERE id=?
+        """, (tarefa_id,))
+
+
+@_escrita("tarefas")
+def progresso_tarefa(tarefa_id, feitas, total=None):
+    """Atualiza o andamento; total=None mantém o total já gravado."""
+    with conexao(escrita=True) as conn:
+        conn.execute("UPDATE tarefas SET feitas=?, total=COALESCE(?, total) WHERE id=?",
+                     (feitas, total, tarefa_id))
+
+
+@_escrita("tarefas")
+def finalizar_tarefa(tarefa_id, resultado=None, erro=None):
+    """Marca a tarefa como concluída com `resultado` (serializável em JSON)
+    ou, com `erro`, como falha com a mensagem."""
+    with conexao(escrita=True) as conn:
+        conn.execute(f"""
+            UPDATE tarefas SET status=?, resultado=?, erro=?, concluida_em={_AGORA_SQL}
+            WHERE id=?
+        """, ("erro" if erro is not None else "concluida",
+              json.dumps(resultado) if resultado is not None else None, erro, tarefa_id))
+
+
+def _processo_ativo(pid):
+    """Se o processo `pid` ainda existe. O sinal 0 só verifica, não é entregue."""
+    if pid is None:
+        return False
+    if os.name == "nt":
+        # no Windows o sinal 0 é CTRL_C_EVENT: sem como verificar, vale o
+        # comportamento anterior (processo de outro pid = servidor que parou)
+        return pid == os.getpid()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True     # existe, mas é de outro usuário
+    return True
+
+
+@_escrita("tarefas")
+def interromper_tarefas_orfas():
+    """Marca como erro as tarefas ainda ativas cujo processo não existe mais
+    (o servidor que as executava parou); as de outros processos vivos, como
+    um segundo servidor no mesmo banco, continuam. Retorna quantas foram
+    marcadas."""
+    marcadores = ",".join("?" * len(STATUS_ATIVOS))
+    with conexao(escrita=True) as conn:
+        processos = [r[0] for r in conn.execute(
+            f"SELECT DISTINCT processo FROM tarefas WHERE status IN ({marcadores})", STATUS_ATIVOS)]
+        orfaos = [p for p in processos if not _processo_ativo(p)]
+        marcadas = 0
+        for processo in orfaos:
+            cur = conn.execute(f"""
+                UPDATE tarefas SET status='erro', erro='Interrompida: o processo que a executava terminou.',
+                                   concluida_em={_AGORA_SQL}
+                WHERE status IN ({marcadores}) AND processo IS ?
+            """, (*STATUS_ATIVOS, processo))
+            marcadas += cur.rowcount
+        return marcadas
+
+
+@_em_cache("tarefas")
+def obter_tarefa(tarefa_id):
+    """A tarefa como dict (parametros e resultado já decodificados) ou None."""
+    with conexao() as conn:
+        row = conn.execute(f"SELECT {', '.join(_COLUNAS_TAREFA)} FROM tarefas WHERE id=?",
+                           (tarefa_id,)).fetchone()
+    return _tarefa(row) if row else None
+
+
+@_em_cache("tarefas")
+def listar_tarefas(limite=20, tipo=None):
+    """As `limite` tarefas mais recentes (opcionalmente de um tipo)."""
+    where, params = ("WHERE tipo=?", (tipo,)) if tipo else ("", ())
+    with conexao() as conn:
+        rows = conn.execute(f"""
+            SELECT {', '.join(_COLUNAS_TAREFA)} FROM tarefas {where}
+            ORDER BY id DESC LIMIT ?
+        """, (*params, limite)).fetchall()
+    return [_tarefa(r) for r in rows]
+
+
+# ===============================================
+# Importação em lote (upsert por nome)
+# ===============================================
+def _upsert_em_lote(tipo, sql, registros, validar):
+    """Grava registros com INSERT ... ON CONFLICT(nome) DO UPDATE numa única
+    transação e recalcula as peças que usam os itens alterados.
+
+    Retorna [(indice, mensagem)] dos registros rejeitados.
+    """
+    erros, validos = [], []
+    for i, registro in enumerate(registros):
+        try:
+            if not str(registro[0]).strip():
+                raise ValueError("Nome é obrigatório.")
+            validar(registro)
+            validos.append((i, registro))
+        except ValueError as e:
+            erros.append((i, str(e)))
+
+    tabela_rel, coluna_rel = _RELACOES[tipo]
+    tabela, id_col, nome_col = _INDICES_BUSCA[tipo]
+
+    with conexao(escrita=True) as conn:
+        try:
+            with conexao():
+                conn.executemany(sql, [r for _, r in validos])
+        except sqlite3.IntegrityError:
+            # alguma linha violou uma regra do banco: grava uma a uma para
+            # apontar quais (cada uma no seu SAVEPOINT)
+            for i, registro in validos:
+                try:
+                    with conexao():
+                        conn.execute(sql, registro)
+                except sqlite3.IntegrityError as e:
+                    erros.append((i, str(e)))
+
+        afetadas = set()
+        for nomes in _lotes([r[0] for _, r in validos]):
+            marcadores = ",".join("?" * len(nomes))
+            cur = conn.execute(f"""
+                SELECT DISTINCT r.peca_id
+                FROM {tabela_rel} r
+                JOIN {tabela} i ON i.{id_col} = r.{coluna_rel}
+                WHERE i.{nome_col} IN ({marcadores})
+            """, nomes)
+            afetadas.update(row[0] for row in cur)
+        repreciar_pecas(sorted(afetadas))
+
+    return sorted(erros)
+
+
+@_escrita("materiais", "pecas")
+def upsert_materiais(registros):
+    """Insere ou atualiza (pelo nome) materiais em lote.
+
+    registros: sequência de (nome_material, unidade, quantidade_adquirida, custo_total).
+    Retorna [(indice, mensagem)] dos registros rejeitados.
+    """
+    return _upsert_em_lote("material", """
+        INSERT INTO materiais (nome_material, unidade, quantidade_adquirida, custo_total)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(nome_material) DO UPDATE SET
+            unidade = excluded.unidade,
+            quantidade_adquirida = excluded.quantidade_adquirida,
+            custo_total = excluded.custo_total
+    """, registros, lambda r: _validar_material(r[1], r[2], r[3]))
+
+
+@_escrita("tecidos", "pecas")
+def upsert_tecidos(registros):
+    """Insere ou atualiza (pelo nome) tecidos em lote.
+
+    registros: sequência de (nome_tecido, comprimento_total, largura_total, custo_total).
+    Retorna [(indice, mensagem)] dos registros rejeitados.
+    """
+    return _upsert_em_lote("tecido", """
+        INSERT INTO tecidos (nome_tecido, comprimento_total, largura_total, custo_total)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(nome_tecido) DO UPDATE SET
+            comprimento_total = excluded.comprimento_total,
+            largura_total = excluded.largura_total,
+            custo_total = excluded.custo_total
+    """, registros, lambda r: _validar_tecido(r[1], r[2], r[3]))
+
+
+# ===========================================
+# Instrumentação das funções públicas (manter no fim do arquivo)
+# ===========================================
+_NAO_INSTRUMENTAR = {
+    "conexao", "iniciar_medicao", "medicao_atual", "encerrar_medicao",
+    "ativar_instrumentacao", "estatisticas_instrumentacao", "consultas_lentas",
+}
+for _nome, _func in list(globals().items()):
+    if (inspect.isfunction(_func) and _func.__module__ == __name__
+            and not _nome.startswith("_") and _nome not in _NAO_INSTRUMENTAR):
+        globals()[_nome] = _instrumentar(_func)
+del _nome, _func
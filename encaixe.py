@@ -0,0 +1,178 @@
+"""Encaixe (nesting) de moldes retangulares na largura do rolo de tecido.
+
+O custo por área (área usada × custo por cm²) supõe que todo o tecido em
+volta dos moldes é aproveitado. Na prática os cortes precisam caber na
+largura do rolo, e o que se consome é um comprimento de rolo inteiro. Aqui
+os retângulos de corte são encaixados numa faixa de largura fixa (a largura
+do rolo) com duas heurísticas, e fica o resultado mais curto:
+
+- skyline (bottom-left): mantém o contorno superior do que já foi cortado
+  e põe cada molde na posição mais baixa (depois, mais à esquerda);
+- prateleiras (guilhotina, first-fit decreasing height): moldes em faixas
+  horizontais, cada uma da altura do seu primeiro molde.
+
+Os moldes podem ser girados 90° (sem fio do tecido a respeitar). Milhares
+de retângulos são encaixados em bem menos de um segundo
+(benchmarks/bench_encaixe.py).
+
+Coordenadas: x atravessa a largura do rolo (0 a `largura`), y corre ao
+longo do comprimento.
+
+Exemplo:
+
+    r = encaixar([(40, 60)] * 10 + [(20, 30)] * 25, largura=150)
+    r["comprimento"], r["desperdicio"]     # cm de rolo consumidos, fração perdida
+"""
+
+
+def _orientacoes(w, h, largura, rotacionar):
+    opcoes = [(w, h)]
+    if rotacionar and w != h:
+        opcoes.append((h, w))
+    return [(a, b) for a, b in opcoes if a <= largura]
+
+
+def cabe(molde, largura, rotacionar=True):
+    """Se o molde (comprimento, largura) cabe num rolo de largura `largura`
+    em alguma orientação; encaixar dá ValueError se algum não couber."""
+    return bool(_orientacoes(*molde, largura, rotacionar))
+
+
+def _skyline(retangulos, largura, rotacionar):
+    """Bottom-left sobre o contorno superior, em ordem decrescente do maior lado."""
+    ordem = sorted(range(len(retangulos)), key=lambda i: -max(retangulos[i]))
+    contorno = [[0.0, 0.0, float(largura)]]  # segmentos [x, y, largura]
+    posicoes = [None] * len(retangulos)
+    topo = 0.0
+
+    for i in ordem:
+        melhor = None
+        for w, h in _orientacoes(*retangulos[i], largura, rotacionar):
+            for j in range(len(contorno)):
+                x = contorno[j][0]
+                if x + w > largura + 1e-9:
+                    break
+                limite = melhor[0][0] if melhor else float("inf")
+                # altura da base: o ponto mais alto dos segmentos sob [x, x + w];
+                # desiste assim que passar da melhor posição já encontrada
+                y, coberto, k = 0.0, 0.0, j
+                while coberto < w - 1e-9 and y + h <= limite:
+                    y = max(y, contorno[k][1])
+                    coberto += contorno[k][2]
+                    k += 1
+                if y + h > limite:
+                    continue
+                chave = (y + h, x)
+                if melhor is None or chave < melhor[0]:
+                    melhor = (chave, j, x, y, w, h)
+        if melhor is None:
+            raise ValueError(f"O molde {retangulos[i][0]} × {retangulos[i][1]} não cabe na largura {largura}.")
+
+        _, j, x, y, w, h = melhor
+        posicoes[i] = (x, y, w, h)
+        topo = max(topo, y + h)
+
+        # o novo segmento cobre [x, x + w]; encurta ou remove os que ficaram embaixo
+        fim = x + w
+        contorno.insert(j, [x, y + h, w])
+        k = j + 1
+        while k < len(contorno) and contorno[k][0] < fim - 1e-9:
+            seg_fim = contorno[k][0] + contorno[k][2]
+            if seg_fim <= fim + 1e-9:
+                del contorno[k]
+            else:
+                contorno[k][2] = seg_fim - fim
+                contorno[k][0] = fim
+                break
+        # junta vizinhos na mesma altura
+        k = max(0, j - 1)
+        while k < len(contorno) - 1 and k <= j + 1:
+            if abs(contorno[k][1] - contorno[k + 1][1]) < 1e-9:
+                contorno[k][2] += contorno[k + 1][2]
+                del contorno[k + 1]
+            else:
+                k += 1
+
+    return topo, posicoes
+
+
+def _prateleiras(retangulos, largura, rotacionar):
+    """First-fit decreasing height: cada molde deitado (lado maior na
+    largura, se couber) na primeira prateleira com espaço."""
+    deitados = []
+    for w, h in retangulos:
+        opcoes = _orientacoes(w, h, largura, rotacionar)
+        if not opcoes:
+            raise ValueError(f"O molde {w} × {h} não cabe na largura {largura}.")
+        deitados.append(min(opcoes, key=lambda o: o[1]))
+
+    # Em ordem decrescente de altura, todo molde cabe na altura das prateleiras
+    # já abertas: basta achar a primeira com largura livre. A árvore guarda a
+    # maior largura livre de cada intervalo de prateleiras (busca em O(log n)).
+    ordem = sorted(range(len(retangulos)), key=lambda i: -deitados[i][1])
+    folhas = 1
+    while folhas < len(retangulos):
+        folhas *= 2
+    livre = [-1.0] * (2 * folhas)
+    alturas, posicoes = [], [None] * len(retangulos)
+    topo = 0.0
+    for i in ordem:
+        w, h = deitados[i]
+        if livre[1] + 1e-9 >= w:
+            no = 1
+            while no < folhas:
+                no = 2 * no if livre[2 * no] + 1e-9 >= w else 2 * no + 1
+            prateleira = no - folhas
+        else:
+            prateleira, no = len(alturas), len(alturas) + folhas
+            alturas.append(topo)
+            livre[no] = float(largura)
+            topo += h
+        posicoes[i] = (largura - livre[no], alturas[prateleira], w, h)
+        livre[no] -= w
+        while no > 1:
+            no //= 2
+            livre[no] = max(livre[2 * no], livre[2 * no + 1])
+    return topo, posicoes
+
+
+_HEURISTICAS = {"skyline": _skyline, "prateleiras": _prateleiras}
+
+
+def encaixar(retangulos, largura, rotacionar=True):
+    """Encaixa `retangulos` ([(comprimento, largura)] em cm) num rolo de
+    largura `largura` e retorna o melhor resultado entre as heurísticas:
+
+    {"comprimento": cm de rolo consumidos, "area_moldes", "area_consumida",
+     "desperdicio": fração de 0 a 1, "metodo": nome da heurística,
+     "posicoes": [(x, y, largura, comprimento)] na ordem de `retangulos`}
+
+    ValueError se algum molde não couber na largura em nenhuma orientação.
+    """
+    if largura <= 0:
+        raise ValueError("A largura do rolo deve ser maior que zero.")
+    retangulos = [(float(w), float(h)) for w, h in retangulos]
+    if any(w <= 0 or h <= 0 for w, h in retangulos):
+        raise ValueError("As medidas dos moldes devem ser maiores que zero.")
+
+    area_moldes = sum(w * h for w, h in retangulos)
+    if not retangulos:
+        return {"comprimento": 0.0, "area_moldes": 0.0, "area_consumida": 0.0,
+                "desperdicio": 0.0, "metodo": None, "posicoes": []}
+
+    melhor = None
+    for metodo, heuristica in _HEURISTICAS.items():
+        comprimento, posicoes = heuristica(retangulos, largura, rotacionar)
+        if melhor is None or comprimento < melhor[0] - 1e-9:
+            melhor = (comprimento, metodo, posicoes)
+
+    comprimento, metodo, posicoes = melhor
+    area_consumida = comprimento * largura
+    return {
+        "comprimento": comprimento,
+        "area_moldes": area_moldes,
+        "area_consumida": area_consumida,
+        "desperdicio": 1 - area_moldes / area_consumida,
+        "metodo": metodo,
+        "posicoes": posicoes,
+    }
@@ -0,0 +1,194 @@
+"""Exportação do catálogo em CSV, Parquet ou XLSX, lida do SQLite em blocos.
+
+As linhas saem do cursor com fetchmany(`lote`) e vão direto para o arquivo,
+então a memória usada não depende do tamanho da tabela. Toda a exportação
+roda numa única transação de leitura (retrato consistente do banco).
+
+Os cabeçalhos são os nomes das colunas do banco, então um CSV de materiais
+ou tecidos exportado aqui pode ser reimportado por importacao.py.
+
+Parquet depende do pacote opcional pyarrow e XLSX do openpyxl.
+"""
+import csv
+import importlib.util
+import io
+
+import database as db
+
+LOTE = 5000
+
+# nome: (tipo de busca por nome, [(coluna, tipo)], consulta com {where})
+EXPORTACOES = {
+    "materiais": ("material", [
+        ("id_material", "int"), ("nome_material", "str"), ("unidade", "str"),
+        ("quantidade_adquirida", "float"), ("custo_total", "float"), ("custo_unitario", "float"),
+    ], """
+        SELECT id_material, nome_material, unidade, quantidade_adquirida, custo_total, custo_unitario
+        FROM materiais {where} ORDER BY nome_material
+    """),
+    "tecidos": ("tecido", [
+        ("id_tecido", "int"), ("nome_tecido", "str"), ("comprimento_total", "float"),
+        ("largura_total", "float"), ("custo_total", "float"), ("custo_cm2", "float"),
+    ], """
+        SELECT id_tecido, nome_tecido, comprimento_total, largura_total, custo_total, custo_cm2
+        FROM tecidos {where} ORDER BY nome_tecido
+    """),
+    "pecas": ("peca", [
+        ("id_peca", "int"), ("nome_peca", "str"), ("tempo_producao_horas", "float"),
+        ("categoria", "str"), ("preco_sugerido", "float"),
+    ], """
+        SELECT id_peca, nome_peca, tempo_producao_horas, categoria, preco_sugerido
+        FROM pecas {where} ORDER BY nome_peca
+    """),
+    # Fichas técnicas (BOM): uma linha por componente, com o custo atual
+    "pecas_materiais": ("peca", [
+        ("id_peca", "int"), ("nome_peca", "str"), ("id_material", "int"), ("nome_material", "str"),
+        ("unidade", "str"), ("quantidade_usada", "float"), ("custo", "float"),
+    ], """
+        SELECT p.id_peca, p.nome_peca, m.id_material, m.nome_material, m.unidade,
+               pm.quantidade_usada, m.custo_unitario * pm.quantidade_usada
+        FROM pecas p
+        JOIN pecas_materiais pm ON pm.peca_id = p.id_peca
+        JOIN materiais m ON m.id_material = pm.material_id
+        {where} ORDER BY p.nome_peca, m.nome_material
+    """),
+    "pecas_tecidos": ("peca", [
+        ("id_peca", "int"), ("nome_peca", "str"), ("id_tecido", "int"), ("nome_tecido", "str"),
+        ("area_usada_cm2", "float"), ("comprimento_cm", "float"), ("largura_cm", "float"), ("cortes", "int"),
+        ("custo", "float"),
+    ], """
+        SELECT p.id_peca, p.nome_peca, t.id_tecido, t.nome_tecido,
+               pt.area_usada_cm2, pt.comprimento_cm, pt.largura_cm, pt.cortes, t.custo_cm2 * pt.area_usada_cm2
+        FROM pecas p
+        JOIN pecas_tecidos pt ON pt.peca_id = p.id_peca
+        JOIN tecidos t ON t.id_tecido = pt.tecido_id
+        {where} ORDER BY p.nome_peca, t.nome_tecido
+    """),
+    # Subconjuntos: peças usadas na montagem de outras
+    "pecas_componentes": ("peca", [
+        ("id_peca", "int"), ("nome_peca", "str"), ("id_componente", "int"), ("nome_componente", "str"),
+        ("quantidade", "float"),
+    ], """
+        SELECT p.id_peca, p.nome_peca, pc.componente_id,
+               (SELECT c.nome_peca FROM pecas c WHERE c.id_peca = pc.componente_id), pc.quantidade
+        FROM pecas p
+        JOIN pecas_componentes pc ON pc.peca_id = p.id_peca
+        {where} ORDER BY p.nome_peca, pc.componente_id
+    """),
+    # Peças com o detalhamento de custos calculado na hora (compute_costs_bulk)
+    "pecas_precificadas": ("peca", [
+        ("id_peca", "int"), ("nome_peca", "str"), ("tempo_producao_horas", "float"), ("categoria", "str"),
+        ("custo_materiais", "float"), ("custo_tecidos", "float"), ("custo_componentes", "float"),
+        ("custo_mao_de_obra", "float"), ("custo_indireto", "float"), ("custo_total", "float"),
+        ("preco_sugerido", "float"),
+    ], """
+        SELECT id_peca, nome_peca, tempo_producao_horas, categoria
+        FROM pecas {where} ORDER BY nome_peca
+    """),
+}
+_DETALHAMENTO = ["custo_materiais", "custo_tecidos", "custo_componentes", "custo_mao_de_obra", "custo_indireto",
+                 "custo_total", "preco_sugerido"]
+
+FORMATOS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet",
+            "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+_DEPENDENCIAS = {"parquet": "pyarrow", "xlsx": "openpyxl"}
+
+
+def formatos_disponiveis():
+    """Formatos cujo pacote opcional está instalado (csv sempre está)."""
+    return [f for f in FORMATOS if f not in _DEPENDENCIAS or importlib.util.find_spec(_DEPENDENCIAS[f])]
+
+
+def colunas(nome):
+    return [c for c, _ in EXPORTACOES[nome][1]]
+
+
+def _blocos(conn, nome, busca, lote):
+    tipo_busca, _, sql = EXPORTACOES[nome]
+    where, params = db.filtro_nome(tipo_busca, busca.strip())
+    cur = conn.execute(sql.format(where=where), params)
+    while True:
+        rows = cur.fetchmany(lote)
+        if not rows:
+            return
+        if nome == "pecas_precificadas":
+            custos = db.compute_costs_bulk([r[0] for r in rows])
+            rows = [r + tuple(custos[r[0]][k] for k in _DETALHAMENTO) for r in rows]
+        yield rows
+
+
+def _escrever_csv(destino, nome, blocos):
+    texto = io.TextIOWrapper(destino, encoding="utf-8", newline="")
+    escritor = csv.writer(texto)
+    escritor.writerow(colunas(nome))
+    for rows in blocos:
+        escritor.writerows(rows)
+    texto.flush()
+    texto.detach()  # não fecha o arquivo de quem chamou
+
+
+def _escrever_parquet(destino, nome, blocos):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Exportar Parquet requer o pacote pyarrow (pip install pyarrow).") from e
+    tipos = {"int": pa.int64(), "str": pa.string(), "float": pa.float64()}
+    esquema = pa.schema([(c, tipos[t]) for c, t in EXPORTACOES[nome][1]])
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        for rows in blocos:
+            escritor.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=campo.type) for col, campo in zip(zip(*rows), esquema)], schema=esquema
+            ))
+
+
+def _escrever_xlsx(destino, nome, blocos):
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise RuntimeError("Exportar XLSX requer o pacote openpyxl (pip install openpyxl).") from e
+    # write_only grava as linhas num arquivo temporário em vez de mantê-las na memória
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet(nome[:31])
+    planilha.append(colunas(nome))
+    for rows in blocos:
+        for row in rows:
+            planilha.append(row)
+    livro.save(destino)
+
+
+_ESCRITORES = {"csv": _escrever_csv, "parquet": _escrever_parquet, "xlsx": _escrever_xlsx}
+
+
+def exportar(nome, destino, formato="csv", busca="", lote=LOTE):
+    """Exporta `nome` (chave de EXPORTACOES) para `destino`, um caminho ou
+    arquivo binário aberto. `busca` filtra por trecho do nome como nas
+    páginas (nas fichas técnicas, pelo nome da peça).
+
+    Retorna o número de linhas exportadas.
+    """
+    if formato not in _ESCRITORES:
+        raise ValueError(f"Formato desconhecido: {formato}")
+    linhas = 0
+
+    def contar(blocos):
+        nonlocal linhas
+        for rows in blocos:
+            linhas += len(rows)
+            yield rows
+
+    with db.conexao() as conn:
+        blocos = contar(_blocos(conn, nome, busca, lote))
+        if formato == "csv" and not hasattr(destino, "write"):
+            with open(destino, "wb") as f:
+                _escrever_csv(f, nome, blocos)
+        else:
+            _ESCRITORES[formato](destino, nome, blocos)
+    return linhas
+
+
+def exportar_bytes(nome, formato="csv", busca=""):
+    """Conteúdo do arquivo exportado, para st.download_button."""
+    buf = io.BytesIO()
+    exportar(nome, buf, formato, busca)
+    return buf.getvalue()
@@ -0,0 +1,145 @@
+"""Importação em lote de listas de preço de fornecedores (CSV ou Parquet).
+
+O arquivo é lido em blocos de `tamanho_lote` linhas, então a memória usada
+não cresce com o tamanho do arquivo. Cada bloco é gravado com upsert pelo
+nome (database.upsert_materiais / upsert_tecidos) numa única transação, e as
+linhas rejeitadas entram no relatório com o número da linha no arquivo.
+
+Colunas aceitas (o cabeçalho exportado pela página de Materiais também serve):
+    materiais: nome_material, unidade, quantidade_adquirida, custo_total
+    tecidos:   nome_tecido, comprimento_total, largura_total, custo_total
+
+A unidade dos materiais deve ser uma de database.UNIDADES (as opções da
+página); linhas com outra unidade são rejeitadas.
+
+Parquet depende do pacote opcional pyarrow.
+"""
+import csv
+import io
+
+import database as db
+
+TAMANHO_LOTE = 5000
+
+_COLUNAS = {
+    "materiais": ["nome_material", "unidade", "quantidade_adquirida", "custo_total"],
+    "tecidos": ["nome_tecido", "comprimento_total", "largura_total", "custo_total"],
+}
+_TEXTO = {"nome_material", "nome_tecido", "unidade"}
+
+# Cabeçalhos alternativos (rótulos das páginas) -> coluna do banco
+_APELIDOS = {
+    "nome": None,  # nome_material ou nome_tecido, conforme o tipo
+    "unidade": "unidade",
+    "quantidade adquirida": "quantidade_adquirida",
+    "comprimento total (cm)": "comprimento_total",
+    "largura total (cm)": "largura_total",
+    "custo (r$)": "custo_total",
+}
+
+_UPSERT = {
+    "materiais": db.upsert_materiais,
+    "tecidos": db.upsert_tecidos,
+}
+
+
+def _numero(texto):
+    """Aceita 1234.5, 1234,5 e 1.234,5."""
+    if isinstance(texto, (int, float)):
+        return float(texto)
+    texto = str(texto).strip()
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    return float(texto)
+
+
+def _normalizar_cabecalho(tipo, nome):
+    chave = str(nome).strip().lower()
+    if chave in _COLUNAS[tipo]:
+        return chave
+    if chave in _APELIDOS:
+        return _APELIDOS[chave] or _COLUNAS[tipo][0]
+    return chave
+
+
+def _blocos_csv(arquivo, tamanho_lote):
+    if isinstance(arquivo, (str, bytes)) or hasattr(arquivo, "__fspath__"):
+        f = open(arquivo, newline="", encoding="utf-8-sig")
+    else:
+        # arquivo já aberto em modo binário (ex.: upload do Streamlit)
+        f = io.TextIOWrapper(arquivo, newline="", encoding="utf-8-sig")
+    with f:
+        # Planilhas em português costumam salvar CSV com ";"
+        cabecalho = f.readline()
+        f.seek(0)
+        leitor = csv.DictReader(f, delimiter=";" if cabecalho.count(";") > cabecalho.count(",") else ",")
+        bloco = []
+        for registro in leitor:
+            bloco.append(registro)
+            if len(bloco) >= tamanho_lote:
+                yield bloco
+                bloco = []
+        if bloco:
+            yield bloco
+
+
+def _blocos_parquet(arquivo, tamanho_lote):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Importar Parquet requer o pacote pyarrow (pip install pyarrow).") from e
+    for lote in pq.ParquetFile(arquivo).iter_batches(batch_size=tamanho_lote):
+        yield lote.to_pylist()
+
+
+def _formato(arquivo, formato):
+    if formato:
+        return formato
+    nome = str(getattr(arquivo, "name", arquivo)).lower()
+    return "parquet" if nome.endswith(".parquet") else "csv"
+
+
+def importar(tipo, arquivo, formato=None, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    """Importa "materiais" ou "tecidos" de um arquivo CSV/Parquet (caminho ou
+    arquivo binário aberto).
+
+    progresso(linhas_lidas) é chamado após cada bloco gravado.
+    Retorna {"importados": n, "erros": [(linha, mensagem)]}, onde linha é o
+    número da linha no arquivo (o cabeçalho é a linha 1).
+    """
+    colunas = _COLUNAS[tipo]
+    leitor = _blocos_parquet if _formato(arquivo, formato) == "parquet" else _blocos_csv
+
+    importados, lidas, erros = 0, 0, []
+    for bloco in leitor(arquivo, tamanho_lote):
+        registros, linhas = [], []
+        for n, bruto in enumerate(bloco, start=lidas + 2):
+            registro = {_normalizar_cabecalho(tipo, k): v for k, v in bruto.items() if k is not None}
+            try:
+                registros.append(tuple(
+                    str(registro[c]).strip() if c in _TEXTO else _numero(registro[c])
+                    for c in colunas
+                ))
+                linhas.append(n)
+            except KeyError as e:
+                erros.append((n, f"Coluna ausente: {e.args[0]}"))
+            except (TypeError, ValueError):
+                erros.append((n, "Valor numérico inválido."))
+
+        rejeitados = _UPSERT[tipo](registros)
+        erros.extend((linhas[i], msg) for i, msg in rejeitados)
+        importados += len(registros) - len(rejeitados)
+        lidas += len(bloco)
+        if progresso:
+            progresso(lidas)
+
+    erros.sort()
+    return {"importados": importados, "erros": erros}
+
+
+def importar_materiais(arquivo, formato=None, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    return importar("materiais", arquivo, formato, tamanho_lote, progresso)
+
+
+def importar_tecidos(arquivo, formato=None, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    return importar("tecidos", arquivo, formato, tamanho_lote, progresso)
@@ -1,10 +1,22 @@
 import streamlit as st
 import database as db
+import painel_tarefas
+import tarefas
 
 st.set_page_config(page_title="Mão de Obra - Calculadora de Orçamento", layout="wide")
 
-st.title("👷🏽‍♂️ Configuração de Mão de Obra")
-st.write("Defina o valor da sua hora trabalhada e a margem de lucro. Isso será usado automaticamente no cálculo do preço sugerido de cada peça.")
+st.title("👷🏽‍♂️ Mão de Obra e Regras de Preço")
+st.write("Defina o valor da sua hora trabalhada, a margem de lucro e os custos indiretos por categoria de peça. "
+         "Isso será usado automaticamente no cálculo do preço sugerido de cada peça.")
+
+ROTULOS_MARGEM = {
+    "markup": "Sobre o custo (markup): preço = custo × (1 + margem)",
+    "margem": "Sobre o preço de venda: preço = custo ÷ (1 − margem)",
+}
+ROTULOS_CUSTO_TECIDO = {
+    "area": "Pela área dos moldes (supõe aproveitamento total do rolo)",
+    "encaixe": "Pelo comprimento de rolo consumido no encaixe dos moldes",
+}
 
 # -----------------------------------------------------
 # Carregar configurações atuais
@@ -12,11 +24,14 @@ st.write("Defina o valor da sua hora trabalhada e a margem de lucro. Isso será
 cfg = db.carregar_configuracoes()
 valor_hora_atual = cfg["valor_hora"]
 margem_atual = cfg["margem"]
+tipo_atual = cfg["tipo_margem"]
+custo_tecido_atual = cfg["custo_tecido"]
 
 st.subheader("Valores Atuais")
-colA, colB = st.columns(2)
+colA, colB, colC = st.columns(3)
 colA.metric("Valor da Hora (R$)", f"R$ {valor_hora_atual:,.2f}")
 colB.metric("Margem de Lucro (%)", f"{margem_atual:.1f}%")
+colC.metric("Preço por R$ 1,00 de custo", f"R$ {db.fator_preco(cfg):.2f}")
 
 st.divider()
 
@@ -40,11 +55,83 @@ with st.form("form_mao_obra", clear_on_submit=False):
         value=float(margem_atual)
     )
 
+    novo_tipo = st.radio(
+        "A margem é calculada",
+        db.TIPOS_MARGEM,
+        index=db.TIPOS_MARGEM.index(tipo_atual),
+        format_func=ROTULOS_MARGEM.get
+    )
+
+    novo_custo_tecido = st.radio(
+        "O tecido entra no custo",
+        db.TIPOS_CUSTO_TECIDO,
+        index=db.TIPOS_CUSTO_TECIDO.index(custo_tecido_atual),
+        format_func=ROTULOS_CUSTO_TECIDO.get
+    )
+
     salvar = st.form_submit_button("Salvar Configurações")
 
 if salvar:
-    db.salvar_configuracoes(novo_valor_hora, nova_margem)
-    st.success("Configurações atualizadas com sucesso!")
+    if novo_tipo == "margem" and nova_margem >= 100:
+        st.error("A margem sobre o preço de venda deve ser menor que 100%.")
+        st.stop()
+    # grava e recalcula o preço de todas as peças em segundo plano (uma transação)
+    st.session_state.tarefa_configuracoes = tarefas.enviar(
+        "salvar_configuracoes", valor_hora=novo_valor_hora, margem=nova_margem, tipo_margem=novo_tipo,
+        custo_tecido=novo_custo_tecido
+    )
+    st.rerun()
+
+if painel_tarefas.acompanhar(
+    "tarefa_configuracoes",
+    lambda r: st.success(f"Configurações atualizadas e preço de {r['pecas']} peça(s) recalculado!"),
+):
+    st.caption("Recalculando o preço das peças; as páginas continuam disponíveis.")
+
+st.divider()
+
+# -----------------------------------------------------
+# Custos indiretos por categoria
+# -----------------------------------------------------
+st.subheader("🏷️ Categorias e custos indiretos")
+st.caption("Custos indiretos (aluguel, energia, embalagem…) somados ao custo direto das peças da categoria: "
+           "um percentual sobre materiais + tecidos + subconjuntos + mão de obra e um valor fixo por peça.")
+
+categorias = db.listar_categorias()
+if categorias:
+    st.dataframe(
+        [{"Categoria": nome, "Indireto (%)": pct, "Indireto fixo (R$)": fixo} for nome, pct, fixo in categorias],
+        hide_index=True,
+    )
+else:
+    st.info("Nenhuma categoria cadastrada ainda.")
+
+categorias_map = {c[0]: c for c in categorias}
+categoria_escolhida = st.selectbox("Categoria para editar", ["Nova categoria"] + list(categorias_map))
+atual = categorias_map.get(categoria_escolhida)
+
+with st.form("form_categoria"):
+    nome_categoria = st.text_input("Nome da categoria", value=atual[0] if atual else "",
+                                   disabled=atual is not None)
+    col1, col2 = st.columns(2)
+    percentual = col1.number_input("Indireto sobre o custo direto (%)", min_value=0.0, step=1.0,
+                                   value=float(atual[1]) if atual else 0.0)
+    valor_fixo = col2.number_input("Indireto fixo por peça (R$)", min_value=0.0, step=0.5,
+                                   value=float(atual[2]) if atual else 0.0)
+    salvar_categoria = st.form_submit_button("Salvar categoria")
+
+if salvar_categoria:
+    try:
+        db.salvar_categoria(atual[0] if atual else nome_categoria, percentual, valor_fixo)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    st.success("Categoria salva e peças da categoria recalculadas!")
+    st.rerun()
+
+if atual and st.button("🗑️ Excluir categoria"):
+    db.excluir_categoria(atual[0])
+    st.success("Categoria excluída; as peças dela ficaram sem categoria.")
     st.rerun()
 
 st.markdown("---")
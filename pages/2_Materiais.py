@@ -1,8 +1,11 @@
 import streamlit as st
 import pandas as pd
+import plotly.express as px
 import database as db
+import exportacao
+import painel_tarefas
+import tarefas
 from math import ceil
-from io import StringIO
 
 st.set_page_config(page_title="Materiais - Calculadora", layout="wide")
 st.title("🧱 Materiais")
@@ -11,14 +14,12 @@ st.write("Gerencie os materiais usados nas peças — cadastre, edite, exclua e
 # ---------------------------
 # Carregar e preparar dados
 # ---------------------------
-def carregar_df(busca: str = ""):
-    rows = db.listar_materiais()
-    if not rows:
-        return pd.DataFrame(columns=["ID", "Nome", "Unidade", "Quantidade adquirida", "Custo (R$)"])
-    df = pd.DataFrame(rows, columns=["ID", "Nome", "Unidade", "Quantidade adquirida", "Custo (R$)"])
-    if busca:
-        df = df[df["Nome"].str.contains(busca, case=False, na=False)]
-    return df.reset_index(drop=True)
+COLUNAS = ["ID", "Nome", "Unidade", "Quantidade adquirida", "Custo (R$)"]
+
+def carregar_df(busca: str = "", limite=None, offset=0):
+    # filtro e paginação são feitos no SQLite: só as linhas pedidas chegam aqui
+    rows = db.buscar_materiais(busca, limite, offset)
+    return pd.DataFrame(rows, columns=COLUNAS)
 
 # ---------------------------
 # Cabeçalho: pesquisa + export
@@ -32,24 +33,26 @@ with col_page:
     page_size = st.selectbox("Itens por página", options=[5, 10, 20, 50], index=1)
 
 with col_export:
-    # export irá considerar o filtro de busca atual
-    df_all = carregar_df(busca)
-    csv_buf = df_all.to_csv(index=False, sep=",", decimal=".")
-    st.download_button("Exportar CSV", data=csv_buf, file_name="materiais.csv", mime="text/csv")
+    # export irá considerar o filtro de busca atual; o arquivo é montado em segundo plano
+    formato = st.selectbox("Formato", exportacao.formatos_disponiveis(), key="formato_export")
+    if st.button("Exportar"):
+        st.session_state.tarefa_export_materiais = tarefas.enviar(
+            "exportar", nome="materiais", formato=formato, busca=busca)
+        st.rerun()
+    painel_tarefas.acompanhar("tarefa_export_materiais", painel_tarefas.baixar_exportacao)
 
 st.divider()
 
 # ---------------------------
 # Paginação
 # ---------------------------
-df = carregar_df(busca)
-total = len(df)
+total = db.contar_materiais(busca)
 pages = max(1, ceil(total / page_size))
 page_idx = st.number_input("Página", min_value=1, max_value=pages, value=1, step=1)
 
 start = (page_idx - 1) * page_size
 end = start + page_size
-df_page = df.iloc[start:end]
+df_page = carregar_df(busca, page_size, start)
 
 st.markdown(f"**Mostrando {start+1} — {min(end, total)} de {total} materiais**")
 
@@ -68,6 +71,28 @@ else:
 
 st.divider()
 
+# ---------------------------
+# Importação em lote
+# ---------------------------
+with st.expander("📥 Importar lista de fornecedor (CSV ou Parquet)"):
+    st.caption("Colunas: nome_material, unidade, quantidade_adquirida, custo_total "
+               "(o CSV exportado acima também serve). Materiais já cadastrados são atualizados pelo nome.")
+    arquivo = st.file_uploader("Arquivo", type=["csv", "parquet"], key="importar_materiais")
+    if arquivo is not None and st.button("Importar", key="botao_importar_materiais"):
+        # importa em segundo plano: a página continua utilizável
+        st.session_state.tarefa_importar_materiais = tarefas.enviar_importacao("materiais", arquivo)
+        st.rerun()
+
+    def mostrar_relatorio(relatorio):
+        st.success(f"{relatorio['importados']} material(is) importado(s).")
+        if relatorio["erros"]:
+            st.warning(f"{len(relatorio['erros'])} linha(s) rejeitada(s):")
+            st.dataframe(pd.DataFrame(relatorio["erros"], columns=["Linha", "Erro"]), hide_index=True)
+
+    painel_tarefas.acompanhar("tarefa_importar_materiais", mostrar_relatorio)
+
+st.divider()
+
 # ---------------------------
 # Formulário: novo material
 # ---------------------------
@@ -75,8 +100,8 @@ st.subheader("➕ Cadastrar novo material")
 
 with st.form("novo_material"):
     nome = st.text_input("Nome do material", key="novo_nome").strip()
-    unidade = st.selectbox("Unidade", ["metros", "centímetros", "quilogramas", "gramas", "mililitros", "litros", "peças"], key="novo_unidade")
-    quantidade = st.number_input("Quantidade adquirida", min_value=0.0, step=0.1, format="%.2f", key="novo_qtd")
+    unidade = st.selectbox("Unidade", db.UNIDADES, key="novo_unidade")
+    quantidade = st.number_input("Quantidade adquirida", min_value=0.01, step=0.1, format="%.2f", key="novo_qtd")
     custo = st.number_input("Custo total (R$)", min_value=0.0, step=0.1, format="%.2f", key="novo_custo")
     submit_novo = st.form_submit_button("Cadastrar material")
 
@@ -86,9 +111,13 @@ if submit_novo:
     elif db.nome_material_existe(nome):
         st.error("Já existe um material com esse nome.")
     else:
-        db.inserir_material(nome, unidade, quantidade, custo)
-        st.success("Material cadastrado com sucesso!")
-        st.experimental_rerun()
+        try:
+            db.inserir_material(nome, unidade, quantidade, custo)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.success("Material cadastrado com sucesso!")
+            st.experimental_rerun()
 
 st.divider()
 
@@ -97,10 +126,16 @@ st.divider()
 # ---------------------------
 st.subheader("✏️ Editar material")
 
-df_full = carregar_df("")  # lista completa para escolher
+# a lista de escolha vem de uma busca própria no banco (não só da página
+# mostrada acima), limitada a OPCOES_EDICAO nomes
+OPCOES_EDICAO = 50
+busca_edicao = st.text_input("Buscar material para editar", busca, key="busca_edicao")
+df_full = carregar_df(busca_edicao, OPCOES_EDICAO)
 if df_full.empty:
-    st.info("Cadastre materiais antes de editar.")
+    st.info("Nenhum material encontrado para editar.")
 else:
+    if db.contar_materiais(busca_edicao) > OPCOES_EDICAO:
+        st.caption(f"Mostrando os {OPCOES_EDICAO} primeiros em ordem de nome; refine a busca para ver outros.")
     nomes = {row["Nome"]: int(row["ID"]) for _, row in df_full.iterrows()}
     escolha = st.selectbox("Selecione material para editar", ["(nenhum)"] + list(nomes.keys()))
     if escolha != "(nenhum)":
@@ -109,10 +144,11 @@ else:
         row = df_full[df_full["ID"] == mid].iloc[0]
         with st.form("editar_material"):
             novo_nome = st.text_input("Nome", value=row["Nome"], key="edit_nome")
-            nova_unidade = st.selectbox("Unidade", ["metros", "centímetros", "quilogramas", "gramas", "mililitros", "litros", "peças"], index=[
-                "metros", "centímetros", "quilogramas", "gramas", "mililitros", "litros", "peças"
-            ].index(row["Unidade"]))
-            nova_qtd = st.number_input("Quantidade adquirida", min_value=0.0, step=0.1, value=float(row["Quantidade adquirida"]), format="%.2f")
+            # registros antigos podem ter uma unidade fora da lista: começa na primeira
+            nova_unidade = st.selectbox("Unidade", db.UNIDADES, index=db.UNIDADES.index(row["Unidade"])
+                                        if row["Unidade"] in db.UNIDADES else 0)
+            # Garantir valor mínimo válido (registros antigos podem ter quantidade zero)
+            nova_qtd = st.number_input("Quantidade adquirida", min_value=0.01, step=0.1, value=max(float(row["Quantidade adquirida"]), 0.01), format="%.2f")
             novo_custo = st.number_input("Custo total (R$)", min_value=0.0, step=0.1, value=float(row["Custo (R$)"]), format="%.2f")
             submit_edit = st.form_submit_button("Salvar alterações")
 
@@ -122,9 +158,13 @@ else:
             elif novo_nome != row["Nome"] and db.nome_material_existe(novo_nome):
                 st.error("Já existe outro material com esse nome.")
             else:
-                db.atualizar_material(mid, novo_nome, nova_unidade, nova_qtd, novo_custo)
-                st.success("Material atualizado com sucesso!")
-                st.experimental_rerun()
+                try:
+                    db.atualizar_material(mid, novo_nome, nova_unidade, nova_qtd, novo_custo)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.success("Material atualizado com sucesso!")
+                    st.experimental_rerun()
 
         if st.button("🗑 Excluir material"):
             confirm = st.confirm("Tem certeza que deseja excluir este material? (A exclusão pode afetar peças que usem este material.)")
@@ -133,6 +173,14 @@ else:
                 st.warning("Material excluído.")
                 st.experimental_rerun()
 
+        with st.expander("📈 Histórico de custo"):
+            historico = pd.DataFrame(db.historico_material(mid),
+                                     columns=["Data", "Custo (R$)", "Quantidade adquirida", "Custo unitário (R$)"])
+            fig = px.line(historico, x="Data", y="Custo unitário (R$)", line_shape="hv", markers=True,
+                          hover_data=["Custo (R$)", "Quantidade adquirida"])
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption("Datas em UTC. Cada ponto é uma alteração de custo.")
+
 st.divider()
 
 # ---------------------------
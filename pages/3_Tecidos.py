@@ -1,12 +1,17 @@
 import streamlit as st
 import pandas as pd
+import plotly.express as px
 from database import (
     listar_tecidos,
     inserir_tecido,
     atualizar_tecido,
     excluir_tecido,
-    nome_tecido_existe
+    nome_tecido_existe,
+    historico_tecido
 )
+from exportacao import formatos_disponiveis
+import painel_tarefas
+import tarefas
 
 st.set_page_config(page_title="Tecidos", layout="wide")
 
@@ -35,6 +40,37 @@ else:
     df_display = df.drop(columns=["ID"])
     st.dataframe(df_display, use_container_width=True, hide_index=True)
 
+    col_formato, col_botao = st.columns([1, 4])
+    formato = col_formato.selectbox("Formato", formatos_disponiveis(), key="formato_export")
+    # o arquivo é montado em segundo plano
+    if col_botao.button("Exportar"):
+        st.session_state.tarefa_export_tecidos = tarefas.enviar("exportar", nome="tecidos", formato=formato)
+        st.rerun()
+    with col_botao:
+        painel_tarefas.acompanhar("tarefa_export_tecidos", painel_tarefas.baixar_exportacao)
+
+st.divider()
+
+# ========================================================
+# 📥 Importação em lote
+# ========================================================
+with st.expander("📥 Importar lista de fornecedor (CSV ou Parquet)"):
+    st.caption("Colunas: nome_tecido, comprimento_total, largura_total, custo_total. "
+               "Tecidos já cadastrados são atualizados pelo nome.")
+    arquivo = st.file_uploader("Arquivo", type=["csv", "parquet"], key="importar_tecidos")
+    if arquivo is not None and st.button("Importar", key="botao_importar_tecidos"):
+        # importa em segundo plano: a página continua utilizável
+        st.session_state.tarefa_importar_tecidos = tarefas.enviar_importacao("tecidos", arquivo)
+        st.rerun()
+
+    def mostrar_relatorio(relatorio):
+        st.success(f"{relatorio['importados']} tecido(s) importado(s).")
+        if relatorio["erros"]:
+            st.warning(f"{len(relatorio['erros'])} linha(s) rejeitada(s):")
+            st.dataframe(pd.DataFrame(relatorio["erros"], columns=["Linha", "Erro"]), hide_index=True)
+
+    painel_tarefas.acompanhar("tarefa_importar_tecidos", mostrar_relatorio)
+
 st.divider()
 
 # ========================================================
@@ -143,6 +179,16 @@ else:
             st.success(f"Tecido **{novo_nome}** atualizado com sucesso! ✨")
             st.rerun()
 
+    with st.expander("📈 Histórico de custo"):
+        historico = pd.DataFrame(historico_tecido(id_t), columns=[
+            "Data", "Custo (R$)", "Comprimento total (cm)", "Largura total (cm)", "Custo por cm²"
+        ])
+        historico["Custo por m² (R$)"] = historico["Custo por cm²"] * 10_000
+        fig = px.line(historico, x="Data", y="Custo por m² (R$)", line_shape="hv", markers=True,
+                      hover_data=["Custo (R$)", "Comprimento total (cm)", "Largura total (cm)"])
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption("Datas em UTC. Cada ponto é uma alteração de custo.")
+
 st.divider()
 
 # ========================================================
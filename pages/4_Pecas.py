@@ -1,5 +1,11 @@
+from datetime import date
+
+import plotly.graph_objects as go
 import streamlit as st
 import database as db
+import exportacao
+import painel_tarefas
+import tarefas
 
 st.title("🧩 Peças")
 
@@ -17,13 +23,38 @@ if pecas:
 else:
     st.info("Nenhuma peça cadastrada ainda.")
 
+with st.expander("📤 Exportar peças"):
+    EXPORTS = {
+        "Peças com custos e preço": "pecas_precificadas",
+        "Fichas técnicas — materiais": "pecas_materiais",
+        "Fichas técnicas — tecidos": "pecas_tecidos",
+        "Fichas técnicas — subconjuntos": "pecas_componentes",
+    }
+    col_tipo, col_formato = st.columns([3, 1])
+    escolha = col_tipo.selectbox("Conteúdo", list(EXPORTS))
+    formato = col_formato.selectbox("Formato", exportacao.formatos_disponiveis())
+    # o arquivo é montado em segundo plano (peças precificadas recalculam o catálogo)
+    if st.button("Exportar"):
+        st.session_state.tarefa_export_pecas = tarefas.enviar("exportar", nome=EXPORTS[escolha], formato=formato)
+        st.rerun()
+    painel_tarefas.acompanhar("tarefa_export_pecas", painel_tarefas.baixar_exportacao)
+
 st.divider()
 st.subheader("➕ Cadastrar / ✏️ Editar Peça")
 
+pecas_por_nome = {p[1]: p for p in pecas}
+
+# Pesquisa (índice de busca por nome) para reduzir a lista de peças
+busca_peca = st.text_input("Pesquisar peça pelo nome", "")
+if busca_peca:
+    opcoes = [nome for _, _, nome in db.buscar(busca_peca, "peca", limit=50)]
+else:
+    opcoes = list(pecas_por_nome)
+
 # Selecionar peça para edição
 peca_escolhida = st.selectbox(
     "Selecione uma peça para editar ou escolha 'Nova peça'",
-    ["Nova peça"] + [p[1] for p in pecas]
+    ["Nova peça"] + opcoes
 )
 
 # ------------------------------------------
@@ -33,18 +64,20 @@ edit_mode = False
 
 if peca_escolhida != "Nova peça":
     edit_mode = True
-    peca_data = next(p for p in pecas if p[1] == peca_escolhida)
+    peca_data = pecas_por_nome[peca_escolhida]
     peca_id = peca_data[0]
 
     dados_peca = db.get_peca(peca_id)
     mats_usados = db.materiais_da_peca(peca_id)
     tec_usados = db.tecidos_da_peca(peca_id)
+    comp_usados = db.componentes_da_peca(peca_id)
 
 else:
     peca_id = None
     dados_peca = None
     mats_usados = []
     tec_usados = []
+    comp_usados = []
 
 # ------------------------------------------
 # Formulário de cadastro / edição
@@ -62,6 +95,16 @@ tempo = st.number_input(
     value=dados_peca["tempo_producao_horas"] if edit_mode else 1.0
 )
 
+# categoria: custos indiretos (página Mão de Obra e Preço)
+categorias = [c[0] for c in db.listar_categorias()]
+categoria_atual = dados_peca["categoria"] if edit_mode else None
+categoria = st.selectbox(
+    "Categoria",
+    [None] + categorias,
+    index=categorias.index(categoria_atual) + 1 if categoria_atual in categorias else 0,
+    format_func=lambda c: "Sem categoria" if c is None else c
+)
+
 # ----------------------------
 # Materiais usados
 # ----------------------------
@@ -101,29 +144,59 @@ area_tecs = {}
 for nome_tec in sel_tecs:
     t = tecidos_map[nome_tec]
     tid = t[0]
+    # medidas gravadas do molde (relações antigas só têm a área)
+    salvo = next((x for x in tec_usados if x[0] == tid), None)
 
-    st.write(f"📐 Medidas do tecido **{nome_tec}**:")
+    st.write(f"📐 Medidas do molde no tecido **{nome_tec}** (rolo de {t[3]:g} cm de largura):")
 
-    colA, colB = st.columns(2)
+    colA, colB, colC = st.columns(3)
 
     comp_usado = colA.number_input(
         "Comprimento usado (cm)",
         min_value=0.1,
-        value=1.0,
+        value=float(salvo[3]) if salvo and salvo[3] else 1.0,
         key=f"comp_{tid}"
     )
 
     larg_usado = colB.number_input(
         "Largura usada (cm)",
         min_value=0.1,
-        value=1.0,
+        value=float(salvo[4]) if salvo and salvo[4] else 1.0,
         key=f"larg_{tid}"
     )
 
-    area = comp_usado * larg_usado
-    area_tecs[tid] = area
+    cortes = colC.number_input(
+        "Cortes iguais",
+        min_value=1, step=1,
+        value=int(salvo[5]) if salvo else 1,
+        key=f"cortes_{tid}"
+    )
 
-    st.caption(f"➡ Área calculada: **{area:.2f} cm²**")
+    area_tecs[tid] = (comp_usado, larg_usado, cortes)
+
+    st.caption(f"➡ Área calculada: **{comp_usado * larg_usado * cortes:.2f} cm²**")
+
+# ----------------------------
+# Subconjuntos (outras peças)
+# ----------------------------
+st.write("### Subconjuntos")
+componentes_map = {p[1]: p for p in pecas if p[0] != peca_id}
+
+sel_comps = st.multiselect(
+    "Selecione as peças usadas na montagem",
+    list(componentes_map.keys()),
+    default=[c[2] for c in comp_usados if c[2] in componentes_map]
+)
+
+quant_comps = {}
+for nome_comp in sel_comps:
+    comp = componentes_map[nome_comp]
+    quant_comps[comp[0]] = st.number_input(
+        f"Qtd de {nome_comp}",
+        min_value=0.01, step=1.0,
+        value=next((x[1] for x in comp_usados if x[2] == nome_comp), 1.0),
+        key=f"comp_peca_{comp[0]}"
+    )
 
 # ------------------------------------------
 # Botões de ação
@@ -134,47 +207,34 @@ col1, col2, col3 = st.columns(3)
 if col1.button("💾 Salvar Peça"):
 
     # 1️⃣ validar nome duplicado
-    nomes_existentes = [p[1] for p in pecas]
-    if (not edit_mode and nome in nomes_existentes) or \
-       (edit_mode and nome in nomes_existentes and nome != dados_peca["nome_peca"]):
+    if (not edit_mode and nome in pecas_por_nome) or \
+       (edit_mode and nome in pecas_por_nome and nome != dados_peca["nome_peca"]):
         st.error("Já existe uma peça com este nome. Escolha outro nome.")
         st.stop()
 
-    if not edit_mode:
-        # Criar nova peça
-        novo_id = db.inserir_peca(nome, tempo)
-        db.limpar_relacoes_peca(novo_id)
-
-        for mid, qtd in quant_mats.items():
-            db.adicionar_material_na_peca(novo_id, mid, qtd)
-
-        for tid, area in area_tecs.items():
-            db.adicionar_tecido_na_peca(novo_id, tid, area)
-
-        custos = db.compute_peca_cost(novo_id)
-        db.salvar_preco_sugerido(novo_id, custos["preco_sugerido"])
-
-        st.success(f"Peça **{nome}** cadastrada com sucesso!")
-        st.markdown(f"### 💰 Preço sugerido: **R$ {custos['preco_sugerido']:.2f}**")
-        st.rerun()
-
-    else:
-        # Atualizar peça existente
-        db.atualizar_peca(peca_id, nome, tempo)
-        db.limpar_relacoes_peca(peca_id)
-
-        for mid, qtd in quant_mats.items():
-            db.adicionar_material_na_peca(peca_id, mid, qtd)
-
-        for tid, area in area_tecs.items():
-            db.adicionar_tecido_na_peca(peca_id, tid, area)
-
-        custos = db.compute_peca_cost(peca_id)
-        db.salvar_preco_sugerido(peca_id, custos["preco_sugerido"])
+    # 2️⃣ salvar peça, materiais, tecidos, subconjuntos e preço numa única transação
+    try:
+        _, custos = db.salvar_peca_completa(
+            {
+                "id_peca": peca_id if edit_mode else None,
+                "nome_peca": nome,
+                "tempo_producao_horas": tempo,
+                "categoria": categoria,
+            },
+            quant_mats,
+            area_tecs,
+            quant_comps,
+        )
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
 
+    if edit_mode:
         st.success(f"Peça **{nome}** atualizada com sucesso!")
-        st.markdown(f"### 💰 Preço sugerido: **R$ {custos['preco_sugerido']:.2f}**")
-        st.rerun()
+    else:
+        st.success(f"Peça **{nome}** cadastrada com sucesso!")
+    st.markdown(f"### 💰 Preço sugerido: **R$ {custos['preco_sugerido']:.2f}**")
+    st.rerun()
 
 # ------------------------------------------
 # EXCLUIR PEÇA (correção com session_state)
@@ -216,7 +276,11 @@ if edit_mode:
     if custos:
         st.write(f"**Materiais:** R$ {custos['custo_materiais']:.2f}")
         st.write(f"**Tecidos:** R$ {custos['custo_tecidos']:.2f}")
-       # st.write(f"**Mão de Obra:** R$ {custos['custo_mao_de_obra']:.2f}")
+        if custos["custo_componentes"]:
+            st.write(f"**Subconjuntos:** R$ {custos['custo_componentes']:.2f}")
+        st.write(f"**Mão de Obra:** R$ {custos['custo_mao_de_obra']:.2f}")
+        if custos["custo_indireto"]:
+            st.write(f"**Custos indiretos:** R$ {custos['custo_indireto']:.2f}")
         st.write(f"**Custo Total:** R$ {custos['custo_total']:.2f}")
 
         st.markdown(f"## 💰 **Preço Sugerido: R$ {custos['preco_sugerido']:.2f}**")
@@ -224,3 +288,47 @@ if edit_mode:
         if st.button("Salvar preço sugerido na peça"):
             db.salvar_preco_sugerido(peca_id, custos["preco_sugerido"])
             st.success("Preço sugerido atualizado!")
+
+    with st.expander("✂️ Encaixe no rolo de tecido"):
+        # o custo por área supõe aproveitamento total do rolo; aqui os moldes
+        # são encaixados na largura do rolo e paga-se o comprimento consumido
+        por_encaixe = db.compute_peca_cost(peca_id, encaixe=True)
+        if por_encaixe:
+            st.write(f"**Tecidos pelo encaixe (1 peça):** R$ {por_encaixe['custo_tecidos']:.2f} — "
+                     f"preço sugerido R$ {por_encaixe['preco_sugerido']:.2f}")
+
+        lote = st.number_input("Peças no lote de corte", min_value=1, step=1, value=10)
+        consumo = db.consumo_tecidos({peca_id: lote})
+        if consumo:
+            st.dataframe(
+                [{"Tecido": c["nome_tecido"], "Cortes": c["cortes"],
+                  "Rolo consumido (m)": round(c["comprimento_cm"] / 100, 2),
+                  "Desperdício": f"{c['desperdicio']:.1%}",
+                  "Custo pelo encaixe (R$)": round(c["custo_encaixe"], 2),
+                  "Custo por área (R$)": round(c["custo_area"], 2)}
+                 for c in consumo.values()],
+                hide_index=True,
+            )
+            st.caption("Inclui os tecidos dos subconjuntos. Moldes sem medidas entram pela área.")
+            for c in consumo.values():
+                if c["nao_cabem"]:
+                    st.warning(f"Há moldes que não cabem na largura do rolo de {c['nome_tecido']} "
+                               f"({c['largura_rolo']:g} cm); eles entram pela área.")
+
+    with st.expander("📈 Evolução do preço"):
+        # preço recalculado a cada mudança de custo dos componentes x preços gravados na peça
+        evolucao = db.evolucao_custos(peca_id)
+        gravados = db.historico_preco(peca_id)
+        fig = go.Figure()
+        fig.add_scatter(x=[d for d, _ in evolucao], y=[c["preco_sugerido"] for _, c in evolucao],
+                        name="Preço pelos custos da época", line_shape="hv", mode="lines+markers")
+        fig.add_scatter(x=[d for d, _ in gravados], y=[preco for _, preco in gravados],
+                        name="Preço gravado na peça", mode="markers")
+        fig.update_layout(yaxis_title="R$", legend={"orientation": "h"})
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption("Datas em UTC. O recálculo usa a composição atual da peça.")
+
+        data = st.date_input("Preço em", value=date.today())
+        custos_data = db.compute_peca_cost(peca_id, em=data)
+        st.write(f"Custo total em {data:%d/%m/%Y}: **R$ {custos_data['custo_total']:.2f}** — "
+                 f"preço sugerido: **R$ {custos_data['preco_sugerido']:.2f}**")
@@ -0,0 +1,108 @@
+import pandas as pd
+import streamlit as st
+import database as db
+import producao
+
+st.set_page_config(page_title="Produção - Calculadora de Orçamento", layout="wide")
+
+st.title("🏭 Planejamento de Produção")
+st.write("Informe quantas unidades de cada peça serão produzidas para ver quanto de cada "
+         "material e tecido é necessário, o custo e o que falta comprar.")
+
+pecas = db.listar_pecas()
+if not pecas:
+    st.info("Cadastre peças primeiro.")
+    st.stop()
+
+nomes = {p[1]: p[0] for p in pecas}
+
+# ---------------------------
+# Carteira de pedidos
+# ---------------------------
+st.subheader("📝 Pedidos")
+
+if "pedidos_producao" not in st.session_state:
+    st.session_state.pedidos_producao = pd.DataFrame({"Peça": pd.Series(dtype="str"),
+                                                      "Quantidade": pd.Series(dtype="float")})
+
+pedidos_df = st.data_editor(
+    st.session_state.pedidos_producao,
+    num_rows="dynamic",
+    use_container_width=True,
+    column_config={
+        "Peça": st.column_config.SelectboxColumn("Peça", options=list(nomes), required=True),
+        "Quantidade": st.column_config.NumberColumn("Quantidade", min_value=0, step=1, required=True),
+    },
+    key="editor_pedidos",
+)
+
+with st.expander("📥 Importar pedidos (CSV com peca_id e quantidade)"):
+    arquivo = st.file_uploader("Arquivo", type=["csv"], key="importar_pedidos")
+
+encaixe = st.checkbox("Calcular o tecido pelo encaixe dos moldes no rolo",
+                      help="Mais preciso (inclui as sobras de corte), mais lento em pedidos grandes.")
+
+if st.button("Planejar", type="primary"):
+    linhas = [(nomes[r["Peça"]], r["Quantidade"]) for _, r in pedidos_df.dropna().iterrows()]
+    if arquivo is not None:
+        lido = pd.read_csv(arquivo)
+        linhas += list(zip(lido["peca_id"].astype(int), lido["quantidade"]))
+    # guardado para a baixa no estoque no próximo rerun
+    st.session_state.linhas_producao = linhas
+
+linhas = st.session_state.get("linhas_producao")
+if linhas is not None:
+    if not linhas:
+        st.warning("Nenhum pedido informado.")
+        st.stop()
+
+    plano = producao.planejar(linhas, encaixe=encaixe)
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Custo dos materiais", f"R$ {plano['custo_materiais']:,.2f}")
+    col2.metric("Custo dos tecidos", f"R$ {plano['custo_tecidos']:,.2f}")
+    col3.metric("Custo total", f"R$ {plano['custo_total']:,.2f}")
+
+    if plano["faltas"]:
+        st.error(f"{len(plano['faltas'])} item(ns) em falta: " + ", ".join(plano["faltas"][:20])
+                 + ("…" if len(plano["faltas"]) > 20 else ""))
+    else:
+        st.success("Há material e tecido suficientes para todos os pedidos.")
+
+    st.subheader("🧱 Materiais")
+    st.dataframe(pd.DataFrame(plano["materiais"]).drop(columns=["id_material"]).rename(columns={
+        "nome_material": "Material", "unidade": "Unidade", "necessario": "Necessário",
+        "disponivel": "Adquirido", "falta": "Falta", "estoque": "Em estoque",
+        "falta_estoque": "Falta no estoque", "custo": "Custo (R$)",
+    }), hide_index=True, use_container_width=True)
+
+    st.subheader("🧵 Tecidos")
+    st.dataframe(pd.DataFrame(plano["tecidos"]).drop(columns=["id_tecido", "nao_cabem"], errors="ignore").rename(columns={
+        "nome_tecido": "Tecido", "largura_rolo": "Largura do rolo (cm)", "area_cm2": "Área dos moldes (cm²)",
+        "comprimento_cm": "Comprimento necessário (cm)", "disponivel_cm": "Comprimento do rolo (cm)",
+        "falta_cm": "Falta (cm)", "estoque_cm": "Em estoque (cm)", "falta_estoque_cm": "Falta no estoque (cm)",
+        "desperdicio": "Desperdício", "custo": "Custo (R$)",
+    }), hide_index=True, use_container_width=True)
+    sem_encaixe = [t["nome_tecido"] for t in plano["tecidos"] if t.get("nao_cabem")]
+    if sem_encaixe:
+        st.warning("Há moldes que não cabem na largura do rolo de: " + ", ".join(sem_encaixe)
+                   + ". Eles foram contados pela área.")
+    st.caption(f"{len(plano['pecas'])} peça(s) diferentes, subconjuntos incluídos.")
+
+    # ---------------------------
+    # Baixa no estoque
+    # ---------------------------
+    st.subheader("📦 Baixa no estoque")
+    col_ref, col_neg = st.columns([3, 2])
+    referencia = col_ref.text_input("Referência (ordem de produção, pedido…)")
+    permitir_negativo = col_neg.checkbox("Permitir saldo negativo")
+    if st.button("Dar baixa no estoque"):
+        try:
+            producao.baixar_estoque(linhas, referencia or None, encaixe=encaixe,
+                                    permitir_negativo=permitir_negativo)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.success("Consumo lançado no estoque.")
+            del st.session_state.linhas_producao
+            st.rerun()
@@ -0,0 +1,88 @@
+import pandas as pd
+import streamlit as st
+import database as db
+
+st.set_page_config(page_title="Estoque - Calculadora de Orçamento", layout="wide")
+
+st.title("📦 Estoque")
+st.write("Saldos de materiais e tecidos, lançamentos de compra e ajuste e as peças que "
+         "ainda podem ser produzidas com o que há em estoque.")
+
+ITENS = {"Materiais": "material", "Tecidos": "tecido"}
+
+# ---------------------------
+# Saldos
+# ---------------------------
+aba_materiais, aba_tecidos = st.tabs(list(ITENS))
+for aba, (rotulo, item_tipo) in zip((aba_materiais, aba_tecidos), ITENS.items()):
+    unidade = "Saldo" if item_tipo == "material" else "Saldo (cm de rolo)"
+    aba.dataframe(pd.DataFrame(db.listar_estoque(item_tipo), columns=["ID", "Nome", unidade]).drop(columns=["ID"]),
+                  hide_index=True, use_container_width=True)
+
+if st.button("Abrir estoque com as quantidades adquiridas",
+             help="Lança como saldo inicial a quantidade adquirida (materiais) e o comprimento do rolo "
+                  "(tecidos) dos itens que ainda não têm saldo."):
+    abertos = db.abrir_estoque_pelas_compras()
+    st.success(f"{abertos} item(ns) com saldo inicial lançado.")
+    st.rerun()
+
+st.divider()
+
+# ---------------------------
+# Lançamento
+# ---------------------------
+st.subheader("➕ Lançar movimento")
+
+col_item, col_nome = st.columns([1, 3])
+rotulo = col_item.radio("Item", list(ITENS), horizontal=True)
+item_tipo = ITENS[rotulo]
+itens = {nome: item_id for item_id, nome, _ in db.listar_estoque(item_tipo)}
+
+if not itens:
+    st.info(f"Cadastre {rotulo.lower()} primeiro.")
+else:
+    nome = col_nome.selectbox("Nome", list(itens))
+    with st.form("form_movimento"):
+        col_tipo, col_qtd = st.columns(2)
+        tipo = col_tipo.selectbox("Tipo", ["compra", "ajuste", "consumo"],
+                                  help="Ajuste aceita valores negativos (perdas, inventário).")
+        quantidade = col_qtd.number_input(
+            "Quantidade" if item_tipo == "material" else "Comprimento (cm)", step=1.0, format="%.2f"
+        )
+        referencia = st.text_input("Referência (nota fiscal, inventário…)")
+        enviar = st.form_submit_button("Lançar")
+
+    if enviar:
+        try:
+            db.lancar_movimento(item_tipo, itens[nome], tipo, quantidade, referencia or None)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.success("Movimento lançado.")
+            st.rerun()
+
+    with st.expander(f"📜 Extrato de {nome}"):
+        extrato = db.extrato_estoque(item_tipo, itens[nome])
+        st.dataframe(pd.DataFrame(extrato, columns=["Data", "Tipo", "Quantidade", "Referência", "Saldo"]),
+                     hide_index=True, use_container_width=True)
+        st.caption("Datas em UTC. Movimentos não são editados: corrija com um ajuste.")
+
+st.divider()
+
+# ---------------------------
+# Peças produzíveis
+# ---------------------------
+st.subheader("🧩 Peças produzíveis com o estoque atual")
+
+produziveis = db.pecas_produziveis()
+nomes_pecas = {p[0]: p[1] for p in db.listar_pecas()}
+df = pd.DataFrame(
+    [(nomes_pecas.get(peca_id), quantidade, limite) for peca_id, (quantidade, limite) in produziveis.items()],
+    columns=["Peça", "Unidades possíveis", "Item que limita"],
+).sort_values(["Unidades possíveis", "Peça"], ascending=[False, True])
+
+so_possiveis = st.checkbox("Só as que podem ser produzidas", value=True)
+if so_possiveis:
+    df = df[df["Unidades possíveis"] > 0]
+st.dataframe(df, hide_index=True, use_container_width=True)
+st.caption("Considera os subconjuntos de cada peça; tecidos pela área dos moldes na largura do rolo.")
@@ -0,0 +1,62 @@
+"""Acompanhamento, nas páginas, de uma tarefa em segundo plano (tarefas.py).
+
+A página guarda o id da tarefa em st.session_state[chave] e chama
+acompanhar(chave, mostrar_resultado) onde o resultado deve aparecer.
+Enquanto a tarefa roda, só um fragmento é reexecutado a cada segundo (o
+resto da página continua utilizável); ao terminar, a página é recarregada
+uma vez e mostrar_resultado(resultado) exibe o que a tarefa devolveu.
+"""
+from pathlib import Path
+
+import streamlit as st
+
+import database as db
+import exportacao
+
+
+@st.fragment(run_every=1.0)
+def _andamento(tarefa_id):
+    tarefa = db.obter_tarefa(tarefa_id)
+    if tarefa is None or tarefa["status"] not in db.STATUS_ATIVOS:
+        st.rerun()
+    if tarefa["status"] == "pendente":
+        st.info("⏳ Na fila…")
+    elif tarefa["total"]:
+        st.progress(min(1.0, tarefa["feitas"] / tarefa["total"]),
+                    text=f"⚙️ {tarefa['feitas']} de {tarefa['total']}")
+    else:
+        st.info(f"⚙️ Em andamento… {tarefa['feitas'] or ''}")
+
+
+def acompanhar(chave, mostrar_resultado):
+    """Mostra o andamento ou o desfecho da tarefa em st.session_state[chave].
+    Retorna True enquanto ela estiver na fila ou executando."""
+    tarefa_id = st.session_state.get(chave)
+    tarefa = db.obter_tarefa(tarefa_id) if tarefa_id is not None else None
+    if tarefa is None:
+        return False
+
+    if tarefa["status"] in db.STATUS_ATIVOS:
+        _andamento(tarefa_id)
+        return True
+
+    if tarefa["status"] == "erro":
+        st.error(f"A tarefa falhou: {tarefa['erro']}")
+    else:
+        mostrar_resultado(tarefa["resultado"])
+    if st.button("Fechar", key=f"fechar_{chave}"):
+        del st.session_state[chave]
+        st.rerun()
+    return False
+
+
+def baixar_exportacao(resultado):
+    """mostrar_resultado das tarefas "exportar": botão de download do arquivo gerado."""
+    arquivo = Path(resultado["arquivo"])
+    if not arquivo.exists():
+        st.warning("O arquivo exportado expirou; exporte novamente.")
+        return
+    # o nome gravado é <id único>_<nome>.<formato>
+    st.download_button(f"Baixar ({resultado['linhas']} linhas)", data=arquivo.read_bytes(),
+                       file_name=arquivo.name.split("_", 1)[1],
+                       mime=exportacao.FORMATOS[arquivo.suffix.lstrip(".")])
@@ -0,0 +1,170 @@
+"""Planejamento de produção: necessidade de materiais e tecidos de uma
+carteira de pedidos.
+
+Recebe as linhas do pedido [(peca_id, quantidade)], soma as quantidades
+dos subconjuntos (peças usadas em outras) e agrega a ficha técnica de todas
+as peças de uma vez: as quantidades vão para uma tabela temporária e uma
+consulta agrupada por material (e outra por tecido) faz a explosão, em vez
+de ler materiais_da_peca / tecidos_da_peca peça a peça.
+
+A necessidade é comparada com o que foi adquirido (quantidade_adquirida
+dos materiais, comprimento do rolo dos tecidos) para apontar faltas, e com
+o saldo em estoque; baixar_estoque lança o consumo de uma produção no
+razão de estoque numa única transação.
+
+Exemplo — 40 da peça 3 e 120 da peça 7:
+
+    plano = planejar([(3, 40), (7, 120)])
+    plano["custo_total"], [m["nome_material"] for m in plano["materiais"] if m["falta"]]
+"""
+import database as db
+
+
+def _agrupar_pedidos(pedidos):
+    quantidades = {}
+    for peca_id, quantidade in pedidos:
+        if quantidade < 0:
+            raise ValueError(f"Quantidade negativa para a peça {peca_id}.")
+        quantidades[int(peca_id)] = quantidades.get(int(peca_id), 0) + quantidade
+    return {p: q for p, q in quantidades.items() if q > 0}
+
+
+# A tabela temporária não tem estatísticas: CROSS JOIN fixa a ordem (pedido
+# por fora, índice de peca_id da ficha técnica por dentro) em vez de varrer
+# a ficha técnica inteira.
+def _materiais(conn):
+    cur = conn.execute("""
+        SELECT m.id_material, m.nome_material, m.unidade,
+               SUM(pm.quantidade_usada * pp.quantidade), m.quantidade_adquirida,
+               COALESCE(m.custo_unitario, 0), COALESCE(s.saldo, 0)
+        FROM temp.producao_pecas pp
+        CROSS JOIN pecas_materiais pm ON pm.peca_id = pp.peca_id
+        JOIN materiais m ON m.id_material = pm.material_id
+        LEFT JOIN saldos_estoque s ON s.item_tipo = 'material' AND s.item_id = m.id_material
+        GROUP BY m.id_material
+        ORDER BY m.nome_material
+    """)
+    return [{
+        "id_material": mid,
+        "nome_material": nome,
+        "unidade": unidade,
+        "necessario": necessario,
+        "disponivel": disponivel,
+        "falta": max(0.0, necessario - disponivel),
+        "estoque": estoque,
+        "falta_estoque": max(0.0, necessario - estoque),
+        "custo": necessario * custo_unitario,
+    } for mid, nome, unidade, necessario, disponivel, custo_unitario, estoque in cur]
+
+
+def _tecidos(conn):
+    cur = conn.execute("""
+        SELECT t.id_tecido, t.nome_tecido, t.comprimento_total, t.largura_total,
+               SUM(pt.area_usada_cm2 * pp.quantidade), COALESCE(t.custo_cm2, 0), COALESCE(s.saldo, 0)
+        FROM temp.producao_pecas pp
+        CROSS JOIN pecas_tecidos pt ON pt.peca_id = pp.peca_id
+        JOIN tecidos t ON t.id_tecido = pt.tecido_id
+        LEFT JOIN saldos_estoque s ON s.item_tipo = 'tecido' AND s.item_id = t.id_tecido
+        GROUP BY t.id_tecido
+        ORDER BY t.nome_tecido
+    """)
+    tecidos = []
+    for tid, nome, comprimento_rolo, largura_rolo, area, custo_cm2, estoque in cur:
+        # sem encaixe, o comprimento é o de uma faixa da largura do rolo com a mesma área
+        comprimento = area / largura_rolo if largura_rolo else 0.0
+        tecidos.append({
+            "id_tecido": tid,
+            "nome_tecido": nome,
+            "largura_rolo": largura_rolo,
+            "area_cm2": area,
+            "comprimento_cm": comprimento,
+            "disponivel_cm": comprimento_rolo,
+            "falta_cm": max(0.0, comprimento - comprimento_rolo),
+            "estoque_cm": estoque,
+            "falta_estoque_cm": max(0.0, comprimento - estoque),
+            "custo": area * custo_cm2,
+        })
+    return tecidos
+
+
+def planejar(pedidos, encaixe=False):
+    """Necessidade de materiais e tecidos para produzir `pedidos`
+    ([(peca_id, quantidade)] ou {peca_id: quantidade}; ids repetidos são
+    somados), incluindo os subconjuntos.
+
+    Com encaixe=True o comprimento de tecido é o dos moldes encaixados na
+    largura do rolo (database.consumo_tecidos), e o custo do tecido é o do
+    comprimento consumido; é mais lento com muitos cortes. Moldes mais
+    largos que o rolo entram pela área, e os ids das suas peças ficam em
+    "nao_cabem" do tecido.
+
+    Retorna {"pecas": {peca_id: quantidade com subconjuntos},
+    "materiais": [...], "tecidos": [...], "custo_materiais",
+    "custo_tecidos", "custo_total", "faltas": nomes dos itens em falta}.
+    Cada material e tecido traz também o saldo em estoque e a falta em
+    relação a ele (estoque/falta_estoque, estoque_cm/falta_estoque_cm).
+    """
+    if isinstance(pedidos, dict):
+        pedidos = pedidos.items()
+    pedidos = _agrupar_pedidos(pedidos)
+
+    with db.conexao() as conn:
+        quantidades = db.explodir_quantidades(pedidos)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS producao_pecas "
+                     "(peca_id INTEGER PRIMARY KEY, quantidade REAL NOT NULL)")
+        try:
+            conn.executemany("INSERT INTO temp.producao_pecas (peca_id, quantidade) VALUES (?, ?)",
+                             quantidades.items())
+            materiais = _materiais(conn)
+            tecidos = _tecidos(conn)
+        finally:
+            # a conexão volta ao pool: não deixar o pedido na tabela temporária
+            conn.execute("DELETE FROM temp.producao_pecas")
+
+        if encaixe and tecidos:
+            consumo = db.consumo_tecidos(pedidos)
+            for t in tecidos:
+                c = consumo[t["id_tecido"]]
+                t["comprimento_cm"] = c["comprimento_cm"]
+                t["falta_cm"] = max(0.0, c["comprimento_cm"] - t["disponivel_cm"])
+                t["falta_estoque_cm"] = max(0.0, c["comprimento_cm"] - t["estoque_cm"])
+                t["desperdicio"] = c["desperdicio"]
+                t["custo"] = c["custo_encaixe"]
+                t["nao_cabem"] = c["nao_cabem"]
+
+    custo_materiais = sum(m["custo"] for m in materiais)
+    custo_tecidos = sum(t["custo"] for t in tecidos)
+    return {
+        "pecas": quantidades,
+        "materiais": materiais,
+        "tecidos": tecidos,
+        "custo_materiais": custo_materiais,
+        "custo_tecidos": custo_tecidos,
+        "custo_total": custo_materiais + custo_tecidos,
+        "faltas": [m["nome_material"] for m in materiais if m["falta"] > 1e-9]
+        + [t["nome_tecido"] for t in tecidos if t["falta_cm"] > 1e-9],
+    }
+
+
+def baixar_estoque(pedidos, referencia=None, encaixe=False, permitir_negativo=False):
+    """Lança no razão de estoque o consumo de materiais e tecidos (em cm de
+    rolo) de uma produção, numa única transação com o planejamento: ou todo
+    o consumo é lançado, ou nada.
+
+    Sem permitir_negativo, ValueError se algum item ficar com saldo negativo.
+    Retorna o plano (planejar) usado na baixa.
+    """
+    with db.conexao(escrita=True):
+        plano = planejar(pedidos, encaixe=encaixe)
+        if not permitir_negativo:
+            faltas = [m["nome_material"] for m in plano["materiais"] if m["falta_estoque"] > 1e-9]
+            faltas += [t["nome_tecido"] for t in plano["tecidos"] if t["falta_estoque_cm"] > 1e-9]
+            if faltas:
+                raise ValueError("Estoque insuficiente: " + ", ".join(faltas))
+        db.lancar_movimentos(
+            [("material", m["id_material"], "consumo", m["necessario"], referencia)
+             for m in plano["materiais"] if m["necessario"] > 0]
+            + [("tecido", t["id_tecido"], "consumo", t["comprimento_cm"], referencia)
+               for t in plano["tecidos"] if t["comprimento_cm"] > 0]
+        )
+    return plano
@@ -0,0 +1,239 @@
+"""Custeio vetorizado (NumPy) para simulações de preço.
+
+Carrega a lista de materiais de todas as peças como duas matrizes esparsas
+(peças × materiais e peças × tecidos, em formato CSR) e os vetores de custo
+unitário. O custo de todas as peças sai de um produto matriz-vetor, e vários
+cenários de custo podem ser avaliados de uma vez (peças × cenários).
+
+Subconjuntos (peças usadas em outras) são somados nível a nível, das peças
+sem componentes até os conjuntos de topo: uma operação vetorizada por nível.
+Mão de obra, custos indiretos e margem seguem database.regras_preco(), como
+em compute_costs_bulk. O tecido é sempre custeado pela área: com
+custo_tecido = "encaixe" nas regras, os preços simulados não incluem a
+perda do encaixe que os preços gravados incluem.
+
+Exemplo — tecidos +12% e o material 7 dobrando de preço:
+
+    bom = carregar_bom()
+    fm = fatores(bom, "material", {7: 2.0})
+    ft = fatores(bom, "tecido", geral=1.12)
+    res = simular(bom, fm[None, :], ft[None, :])
+    res["preco_sugerido"][:, 0]     # novo preço de cada peça (bom["pecas"])
+"""
+import numpy as np
+
+import database as db
+
+# Limite de elementos do bloco temporário de custos (peças × cenários): os
+# cenários vão em blocos pequenos o bastante para a soma ficar no cache
+LIMITE_ELEMENTOS = 160_000
+
+
+def _csr(linhas, colunas, valores, n_linhas):
+    ordem = np.argsort(linhas, kind="stable")
+    linhas, colunas, valores = linhas[ordem], colunas[ordem], valores[ordem]
+    return {
+        "indptr": np.searchsorted(linhas, np.arange(n_linhas + 1)),
+        "colunas": colunas,
+        "valores": valores,
+        "n_linhas": n_linhas,
+    }
+
+
+def _carregar_relacao(cur, sql, ids_pecas, ids_itens):
+    rows = cur.execute(sql).fetchall()
+    if not rows:
+        vazio = np.array([], dtype=np.int64)
+        return _csr(vazio, vazio, np.array([], dtype=float), len(ids_pecas))
+    dados = np.array(rows, dtype=float)
+    linhas = np.searchsorted(ids_pecas, dados[:, 0].astype(np.int64))
+    colunas = np.searchsorted(ids_itens, dados[:, 1].astype(np.int64))
+    return _csr(linhas, colunas, dados[:, 2], len(ids_pecas))
+
+
+def _ids_e_custos(cur, sql):
+    rows = cur.execute(sql).fetchall()
+    if not rows:
+        return np.array([], dtype=np.int64), np.array([], dtype=float)
+    ids, custos = zip(*rows)
+    return np.array(ids, dtype=np.int64), np.array(custos, dtype=float)
+
+
+def _niveis(pais, filhos, n_pecas):
+    """Nível de cada peça na hierarquia: 0 para peças sem subconjuntos,
+    1 + o maior nível dos componentes para as demais."""
+    nivel = np.zeros(n_pecas, dtype=np.int64)
+    for _ in range(n_pecas):
+        anterior = nivel.copy()
+        np.maximum.at(nivel, pais, nivel[filhos] + 1)
+        if np.array_equal(nivel, anterior):
+            return nivel
+    raise ValueError("A composição das peças tem um ciclo.")
+
+
+def _carregar_componentes(cur, ids_pecas):
+    rows = cur.execute("""
+        SELECT pc.peca_id, pc.componente_id, pc.quantidade
+        FROM pecas_componentes pc
+        JOIN pecas p ON p.id_peca = pc.peca_id
+        JOIN pecas c ON c.id_peca = pc.componente_id
+    """).fetchall()
+    if not rows:
+        vazio = np.array([], dtype=np.int64)
+        return {"pais": vazio, "filhos": vazio, "quantidades": np.array([], dtype=float), "nivel": vazio,
+                "nivel_pecas": np.zeros(len(ids_pecas), dtype=np.int64)}
+    dados = np.array(rows, dtype=float)
+    pais = np.searchsorted(ids_pecas, dados[:, 0].astype(np.int64))
+    filhos = np.searchsorted(ids_pecas, dados[:, 1].astype(np.int64))
+    # nível da aresta = nível da peça montada; somar em ordem crescente de nível
+    nivel_pecas = _niveis(pais, filhos, len(ids_pecas))
+    nivel = nivel_pecas[pais]
+    ordem = np.argsort(nivel, kind="stable")
+    return {"pais": pais[ordem], "filhos": filhos[ordem], "quantidades": dados[ordem, 2],
+            "nivel": nivel[ordem], "nivel_pecas": nivel_pecas}
+
+
+def carregar_bom():
+    """Lê peças, custos unitários e as relações N-N do banco numa só
+    transação, com as regras de preço atuais. Os vetores seguem a ordem de
+    id de cada tabela."""
+    regras = db.regras_preco()
+    with db.conexao() as conn:
+        cur = conn.cursor()
+        dados_pecas = cur.execute(
+            "SELECT id_peca, tempo_producao_horas, categoria FROM pecas ORDER BY id_peca"
+        ).fetchall()
+        pecas = np.array([r[0] for r in dados_pecas], dtype=np.int64)
+        materiais, custo_materiais = _ids_e_custos(cur, """
+            SELECT id_material, COALESCE(custo_unitario, 0) FROM materiais ORDER BY id_material
+        """)
+        tecidos, custo_tecidos = _ids_e_custos(cur, """
+            SELECT id_tecido, COALESCE(custo_cm2, 0) FROM tecidos ORDER BY id_tecido
+        """)
+        # JOINs descartam relações órfãs (peça/item excluído)
+        bom_materiais = _carregar_relacao(cur, """
+            SELECT pm.peca_id, pm.material_id, pm.quantidade_usada
+            FROM pecas_materiais pm
+            JOIN pecas p ON p.id_peca = pm.peca_id
+            JOIN materiais m ON m.id_material = pm.material_id
+        """, pecas, materiais)
+        bom_tecidos = _carregar_relacao(cur, """
+            SELECT pt.peca_id, pt.tecido_id, pt.area_usada_cm2
+            FROM pecas_tecidos pt
+            JOIN pecas p ON p.id_peca = pt.peca_id
+            JOIN tecidos t ON t.id_tecido = pt.tecido_id
+        """, pecas, tecidos)
+        componentes = _carregar_componentes(cur, pecas)
+
+    # custos indiretos de cada peça pela categoria: (fração do custo direto, valor fixo)
+    indiretos = np.array([regras["indiretos"].get(categoria, (0, 0)) for _, _, categoria in dados_pecas],
+                         dtype=float).reshape(-1, 2)
+    return {
+        "pecas": pecas,
+        "materiais": materiais,
+        "tecidos": tecidos,
+        "custo_materiais": custo_materiais,
+        "custo_tecidos": custo_tecidos,
+        "bom_materiais": bom_materiais,
+        "bom_tecidos": bom_tecidos,
+        "componentes": componentes,
+        "mao_de_obra": np.array([horas or 0 for _, horas, _ in dados_pecas], dtype=float) * regras["valor_hora"],
+        "percentual_indireto": indiretos[:, 0] / 100,
+        "valor_indireto": indiretos[:, 1],
+        "fator_preco": db.fator_preco(regras),
+    }
+
+
+def _acumular_produto(m, custos, resultado):
+    """Soma em resultado (peças × cenários) o produto da matriz CSR
+    (peças × itens) por custos (itens × cenários).
+
+    Só as entradas não nulas da matriz são multiplicadas: o tempo cresce
+    com as entradas da BOM × cenários, não com peças × itens. As linhas vão
+    em ordem decrescente de número de itens, e a k-ésima entrada de todas
+    as linhas que a têm (um prefixo dessa ordem) é somada de uma vez.
+    """
+    if m["valores"].size == 0 or custos.shape[1] == 0:
+        return
+
+    contagem = np.diff(m["indptr"])
+    linhas = np.argsort(-contagem, kind="stable")
+    contagem = contagem[linhas]
+    # com_k[k]: quantas linhas têm mais de k entradas
+    com_k = np.searchsorted(-contagem, -np.arange(1, contagem[0] + 1), side="right")
+    inicios = m["indptr"][linhas]
+    entradas = [(n, m["colunas"][inicios[:n] + k], m["valores"][inicios[:n] + k, None])
+                for k, n in enumerate(com_k)]
+    linhas = linhas[:com_k[0]]
+
+    bloco = max(1, LIMITE_ELEMENTOS // linhas.size)
+    for c in range(0, custos.shape[1], bloco):
+        custos_bloco = np.ascontiguousarray(custos[:, c:c + bloco])
+        soma = np.zeros((linhas.size, custos_bloco.shape[1]))
+        parcela = np.empty_like(soma)
+        for n, colunas, valores in entradas:
+            np.take(custos_bloco, colunas, axis=0, out=parcela[:n])
+            parcela[:n] *= valores
+            soma[:n] += parcela[:n]
+        resultado[linhas, c:c + bloco] += soma
+
+
+def _somar_componentes(bom, custo_total):
+    """Completa custo_total (peças × cenários, com o custo direto próprio de
+    cada peça) nível a nível: as peças de um nível recebem o custo dos
+    subconjuntos (níveis menores, já com o custo total) e depois os custos
+    indiretos da categoria."""
+    c = bom["componentes"]
+    pct, fixo = bom["percentual_indireto"], bom["valor_indireto"]
+    nivel_pecas = c["nivel_pecas"]
+    ordem = np.argsort(nivel_pecas, kind="stable")
+    n_niveis = int(nivel_pecas.max()) + 1 if nivel_pecas.size else 0
+    limites_pecas = np.searchsorted(nivel_pecas[ordem], np.arange(n_niveis + 1))
+    limites_arestas = np.searchsorted(c["nivel"], np.arange(n_niveis + 1))
+    for n in range(n_niveis):
+        a, b = limites_arestas[n], limites_arestas[n + 1]
+        if a < b:
+            np.add.at(custo_total, c["pais"][a:b], c["quantidades"][a:b, None] * custo_total[c["filhos"][a:b]])
+        nivel = ordem[limites_pecas[n]:limites_pecas[n + 1]]
+        custo_total[nivel] = custo_total[nivel] * (1 + pct[nivel, None]) + fixo[nivel, None]
+
+
+def fatores(bom, tipo, ajustes=None, geral=1.0):
+    """Vetor de multiplicadores de custo para "material" ou "tecido":
+    `geral` para todos os itens e `ajustes` ({id: fator}) por item."""
+    ids = bom["materiais"] if tipo == "material" else bom["tecidos"]
+    vetor = np.full(ids.size, float(geral))
+    for item_id, fator in (ajustes or {}).items():
+        pos = np.searchsorted(ids, item_id)
+        if pos < ids.size and ids[pos] == item_id:
+            vetor[pos] = geral * fator
+    return vetor
+
+
+def simular(bom, fatores_materiais=None, fatores_tecidos=None):
+    """Custos e preços de todas as peças em vários cenários de uma vez.
+
+    fatores_materiais / fatores_tecidos: matrizes (cenários × itens) de
+    multiplicadores sobre o custo unitário atual; None = custos atuais.
+    Retorna {"custo_total", "preco_sugerido"}, cada um uma matriz
+    (peças × cenários) na ordem de bom["pecas"].
+    """
+    n_cenarios = max(
+        1,
+        len(fatores_materiais) if fatores_materiais is not None else 1,
+        len(fatores_tecidos) if fatores_tecidos is not None else 1,
+    )
+
+    def custos(base, fat):
+        if fat is None:
+            return np.repeat(base[:, None], n_cenarios, axis=1)
+        return base[:, None] * np.broadcast_to(np.asarray(fat, dtype=float), (n_cenarios, base.size)).T
+
+    custo_total = np.zeros((bom["pecas"].size, n_cenarios))
+    _acumular_produto(bom["bom_materiais"], custos(bom["custo_materiais"], fatores_materiais), custo_total)
+    _acumular_produto(bom["bom_tecidos"], custos(bom["custo_tecidos"], fatores_tecidos), custo_total)
+    custo_total += bom["mao_de_obra"][:, None]
+    _somar_componentes(bom, custo_total)
+
+    preco = np.where(custo_total > 0, custo_total * bom["fator_preco"], 0.0)
+    return {"custo_total": custo_total, "preco_sugerido": preco}
@@ -0,0 +1,146 @@
+"""Tarefas em segundo plano para operações longas das páginas.
+
+Recalcular o catálogo, importar uma lista de fornecedor ou exportar uma
+tabela grande dentro do rerun do Streamlit trava a sessão de quem clicou
+até o fim. Aqui a operação vai para um pool de threads e a página só
+guarda o id: o andamento, o resultado e o erro ficam na tabela `tarefas`
+(gravados pelas funções de database), e a página consulta com
+database.obter_tarefa a cada segundo sem bloquear.
+
+Arquivos (lista importada, arquivo exportado) passam por DIRETORIO, para
+os parâmetros e o resultado da tarefa caberem em JSON.
+
+Exemplo:
+
+    tarefa_id = tarefas.enviar("repreciar_catalogo")
+    db.obter_tarefa(tarefa_id)["status"]    # "pendente", "executando", "concluida" ou "erro"
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import database as db
+import exportacao
+import importacao
+
+# Tarefas executadas ao mesmo tempo; as demais esperam na fila do pool
+TRABALHADORES = 2
+DIRETORIO = Path(tempfile.gettempdir()) / "calcula_orcamentos_tarefas"
+# Arquivos de tarefas mais antigos que isto são apagados ao iniciar o pool
+VALIDADE_ARQUIVOS_S = 24 * 3600
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_trava = threading.Lock()
+
+
+def _repreciar_catalogo(progresso, trabalhadores=1):
+    total = db.repreciar_catalogo(progresso=progresso, trabalhadores=trabalhadores)
+    return {"pecas": total}
+
+
+def _salvar_configuracoes(progresso, valor_hora, margem, tipo_margem=db.TIPO_MARGEM_PADRAO, custo_tecido=None):
+    # uma transação só: o catálogo inteiro muda junto com a regra
+    db.salvar_configuracoes(valor_hora, margem, tipo_margem, custo_tecido)
+    return {"pecas": len(db.listar_pecas())}
+
+
+def _importar(progresso, tabela, arquivo, formato=None):
+    try:
+        return importacao.importar(tabela, arquivo, formato, progresso=lambda lidas: progresso(lidas, None))
+    finally:
+        os.remove(arquivo)
+
+
+def _exportar(progresso, nome, formato="csv", busca=""):
+    destino = _novo_arquivo(f"{nome}.{formato}")
+    linhas = exportacao.exportar(nome, destino, formato, busca)
+    return {"arquivo": str(destino), "linhas": linhas}
+
+
+# tipo: função(progresso, **parametros) -> resultado serializável em JSON;
+# progresso(feitas, total) grava o andamento (total=None se desconhecido)
+TIPOS = {
+    "repreciar_catalogo": _repreciar_catalogo,
+    "salvar_configuracoes": _salvar_configuracoes,
+    "importar": _importar,
+    "exportar": _exportar,
+}
+
+
+def _novo_arquivo(nome):
+    DIRETORIO.mkdir(parents=True, exist_ok=True)
+    return DIRETORIO / f"{uuid.uuid4().hex}_{nome}"
+
+
+def _limpar_arquivos_antigos():
+    if not DIRETORIO.exists():
+        return
+    limite = time.time() - VALIDADE_ARQUIVOS_S
+    for arquivo in DIRETORIO.iterdir():
+        if arquivo.stat().st_mtime < limite:
+            arquivo.unlink(missing_ok=True)
+
+
+def _obter_pool():
+    global _pool
+    with _pool_trava:
+        if _pool is None:
+            # tarefas deixadas ativas por um servidor que parou nunca terminariam
+            db.interromper_tarefas_orfas()
+            _limpar_arquivos_antigos()
+            _pool = ThreadPoolExecutor(max_workers=TRABALHADORES, thread_name_prefix="tarefa")
+        return _pool
+
+
+def _executar(tarefa_id, tipo, parametros):
+    db.iniciar_tarefa(tarefa_id)
+    try:
+        resultado = TIPOS[tipo](lambda feitas, total: db.progresso_tarefa(tarefa_id, feitas, total),
+                                **parametros)
+    except ValueError as erro:
+        # dado inválido: a mensagem basta para quem enviou
+        db.finalizar_tarefa(tarefa_id, erro=str(erro))
+    except Exception as erro:
+        logger.exception("Tarefa %s (%s) falhou", tarefa_id, tipo)
+        db.finalizar_tarefa(tarefa_id, erro=str(erro) or type(erro).__name__)
+    else:
+        db.finalizar_tarefa(tarefa_id, resultado)
+
+
+def enviar(tipo, **parametros):
+    """Registra a tarefa `tipo` (chave de TIPOS) e a põe na fila do pool.
+    Retorna o id, para acompanhar com database.obter_tarefa."""
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+    pool = _obter_pool()
+    tarefa_id = db.registrar_tarefa(tipo, parametros)
+    pool.submit(_executar, tarefa_id, tipo, parametros)
+    return tarefa_id
+
+
+def enviar_importacao(tabela, arquivo):
+    """Importa "materiais" ou "tecidos" de um arquivo enviado na página
+    (UploadedFile ou outro arquivo binário com .name) em segundo plano."""
+    nome = Path(getattr(arquivo, "name", "lista.csv")).name
+    caminho = _novo_arquivo(nome)
+    caminho.write_bytes(arquivo.getvalue() if hasattr(arquivo, "getvalue") else arquivo.read())
+    return enviar("importar", tabela=tabela, arquivo=str(caminho))
+
+
+def aguardar(tarefa_id, intervalo=0.2, tempo_max=None):
+    """Espera a tarefa terminar (scripts e testes) e retorna o seu estado final."""
+    inicio = time.monotonic()
+    while True:
+        tarefa = db.obter_tarefa(tarefa_id)
+        if tarefa is None or tarefa["status"] not in db.STATUS_ATIVOS:
+            return tarefa
+        if tempo_max is not None and time.monotonic() - inicio > tempo_max:
+            raise TimeoutError(f"A tarefa {tarefa_id} não terminou em {tempo_max} s.")
+        time.sleep(intervalo)